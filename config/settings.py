@@ -9,6 +9,42 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 RAW_DIR          = BASE_DIR / "data" / "raw"
 INTERMEDIATE_DIR = BASE_DIR / "data" / "intermediate"
 PROCESSED_DIR    = BASE_DIR / "data" / "processed"
+QC_DIR           = BASE_DIR / "data" / "qc_reports"
+
+# Intermediate facts: "parquet" (partitioned dataset, one partition per CIK) or "csv"
+INTERMEDIATE_FORMAT = "parquet"
+FACTS_DATASET_DIR   = INTERMEDIATE_DIR / "facts"
+
+# Results: "xlsx" (three-sheet workbook), or "parquet"/"csv" (tidy table for machines)
+OUTPUT_FORMAT       = "xlsx"
+
+# Cross-company panel (long format, partitioned by section and fiscal year)
+PANEL_DIR           = BASE_DIR / "data" / "panel"
+
+# Cross-company frames index over facts and panel (scripts/store/frames_index.py)
+FRAMES_DIR          = BASE_DIR / "data" / "frames"
+
+# Member indexes of bulk companyfacts.zip archives (scripts/extract/companyfacts_zip.py)
+ZIP_INDEX_DIR    = BASE_DIR / "data" / "cache" / "zip_index"
+
+# Persistent SBERT embedding cache (one subdirectory per model fingerprint)
+EMBED_CACHE_DIR  = BASE_DIR / "data" / "cache" / "embeddings"
+
+# Model fingerprints, reused while the model files' sizes and mtimes are unchanged
+MODEL_FP_CACHE   = BASE_DIR / "data" / "cache" / "model_fingerprints.json"
+
+# SBERT inference backend: "torch", "torch-int8", "onnx" or "onnx-int8"
+SBERT_BACKEND    = "torch"
+ONNX_EXPORT_DIR  = BASE_DIR / "data" / "cache" / "onnx"
+
+# ANN index over the mapping vocabulary (built by scripts/model/vector_index.py)
+VECTOR_INDEX_DIR = BASE_DIR / "data" / "cache" / "vector_index"
+
+# Resident matching service (scripts/service/match_service.py)
+MATCH_SERVICE_SOCKET = BASE_DIR / "data" / "cache" / "match_service.sock"
+
+# Per-stage pipeline metrics, one JSON line per CIK run (scripts/utils/stage_metrics.py)
+METRICS_PATH     = BASE_DIR / "data" / "metrics" / "pipeline_metrics.jsonl"
 
 # Mapping file
 MAPPING_PATH     = BASE_DIR / "config" / "standard_to_usgaap_mapping.json"
@@ -0,0 +1,233 @@
+# scripts/bench/run_bench.py
+
+"""
+Pipeline benchmark over synthetic companyfacts corpora.
+
+For each corpus size (number of CIKs) the harness generates the corpus once
+(cached under data/bench/corpus/<shape>/), then runs every CIK through the
+stages in-process and times them with StageRecorder:
+
+  extract     extract_usd_facts_from_file
+  clean       clean_dataframe
+  match       TagMatchEngine.match   (best row per standard term)
+  match_all   TagMatchEngine.match_all
+  qc          report_missing
+  save        save_results (xlsx)
+
+Outputs (QC reports, workbooks) go to a temporary directory. Each of the
+--repeat passes runs in a freshly spawned process, so its peak RSS belongs
+to that pass alone, and the fastest pass (total time per CIK) is kept as a
+whole. Per stage the harness reports wall time per CIK (mean and p95) and
+how much the stage raised the RSS high-water mark (--trace-memory adds
+tracemalloc allocation peaks); per corpus size, the pass's peak RSS. It then
+compares each stage's mean time per CIK and the pass's peak RSS against
+baseline.json and exits with status 1 on a regression of more than
+--tolerance (and more than MIN_DELTA, so millisecond stages do not fail on
+timer noise). Baselines are machine-specific: refresh them with
+--update-baseline on the machine that runs the check.
+
+Usage:
+  python scripts/bench/run_bench.py [--sizes 1 10 100] [--tolerance 0.5] [--update-baseline]
+"""
+
+import sys
+from pathlib import Path
+# Ensure project root is on sys.path so we can import our modules
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import multiprocessing
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+from config.settings import BASE_DIR, MAPPING_PATH
+from scripts.bench.synthetic_facts import add_generator_args, generator_kwargs, write_corpus
+
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+CORPUS_DIR = BASE_DIR / "data" / "bench" / "corpus"
+RESULTS_PATH = BASE_DIR / "data" / "bench" / "results.jsonl"
+
+STAGES = ("extract", "clean", "match", "match_all", "qc", "save")
+
+# Smallest absolute increase that counts as a regression, per metric
+MIN_DELTA = {"per_cik_s": 0.02, "peak_rss_mb": 16.0}
+
+
+def corpus_dir(shape: dict) -> Path:
+    """
+    Cache directory for a corpus shape (generator keyword arguments).
+    """
+    key = hashlib.sha256(json.dumps(shape, sort_keys=True).encode()).hexdigest()[:12]
+    return CORPUS_DIR / key
+
+
+def bench_size(paths: List[Path], trace_memory: bool = False) -> dict:
+    """
+    One pass: run every file in `paths` through the stages in this process.
+
+    returns: {"peak_rss_mb": the process's peak RSS after the pass,
+              "stages": {stage: seconds (total), per_cik_s (mean), p95_s,
+                         rows_out (total), rss_growth_mb (largest rise of the
+                         RSS high-water mark inside the stage), plus
+                         alloc_peak_mb with trace_memory}}
+    """
+    import numpy as np
+    from scripts.extract.parse_sec_json import extract_usd_facts_from_file
+    from scripts.clean.preprocess_terms import clean_dataframe
+    from scripts.model.tag_match_engine import TagMatchEngine
+    from scripts.store.log_qc_results import report_missing
+    from scripts.store.save_results import save_results
+    from scripts.utils.stage_metrics import StageRecorder, peak_rss_mb
+
+    engine = TagMatchEngine(str(MAPPING_PATH))
+    records = []
+    # the stages' own progress prints would drown the report
+    with tempfile.TemporaryDirectory(prefix="bench_") as out_dir, contextlib.redirect_stdout(io.StringIO()):
+        for path in paths:
+            cik = path.stem
+            rec = StageRecorder(cik, trace_memory=trace_memory)
+            with rec.stage("extract") as st:
+                facts = extract_usd_facts_from_file(str(path))
+                st["rows_out"] = len(facts)
+            with rec.stage("clean", rows_in=len(facts)) as st:
+                df_clean = clean_dataframe(facts)
+                st["rows_out"] = len(df_clean)
+            with rec.stage("match", rows_in=len(df_clean)) as st:
+                st["rows_out"] = len(engine.match(df_clean))
+            with rec.stage("match_all", rows_in=len(df_clean)) as st:
+                df_matched = engine.match_all(df_clean)
+                st["rows_out"] = len(df_matched)
+            with rec.stage("qc", rows_in=len(df_matched)) as st:
+                st["rows_out"] = len(report_missing(df_matched, str(MAPPING_PATH), cik, qc_dir=out_dir))
+            with rec.stage("save", rows_in=len(facts)) as st:
+                out_path = Path(out_dir) / f"{cik}_results.xlsx"
+                st["rows_out"] = len(save_results(df_matched, str(MAPPING_PATH), str(out_path), facts=facts))
+            records.append(rec.record())
+            rec.close()
+
+    summary = {}
+    for stage in STAGES:
+        rows = [s for r in records for s in r["stages"] if s["stage"] == stage]
+        seconds = np.array([s["seconds"] for s in rows])
+        summary[stage] = {
+            "seconds": round(float(seconds.sum()), 4),
+            "per_cik_s": round(float(seconds.mean()), 5),
+            "p95_s": round(float(np.percentile(seconds, 95)), 5),
+            "rows_out": int(sum(s["rows_out"] or 0 for s in rows)),
+            "rss_growth_mb": max(s["rss_growth_mb"] for s in rows),
+        }
+        if trace_memory:
+            summary[stage]["alloc_peak_mb"] = max(s["alloc_peak_mb"] for s in rows)
+    return {"peak_rss_mb": round(peak_rss_mb(), 1), "stages": summary}
+
+
+def run_passes(paths: List[Path], repeat: int, trace_memory: bool = False) -> dict:
+    """
+    Run `repeat` passes of bench_size, each in a new spawned process (a fresh
+    RSS high-water mark), and return the fastest one.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    passes = []
+    for _ in range(max(1, repeat)):
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+            passes.append(pool.submit(bench_size, paths, trace_memory).result())
+    return min(passes, key=lambda p: sum(s["per_cik_s"] for s in p["stages"].values()))
+
+
+def _regressed(metric: str, value: float, base: float, tolerance: float) -> bool:
+    return value > base * (1 + tolerance) and value - base > MIN_DELTA[metric]
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    """
+    Regressions of `results` against `baseline` (both {size: pass}, see
+    bench_size): a stage's mean seconds per CIK, or the pass's peak RSS, more
+    than `tolerance` (and MIN_DELTA) above baseline. Sizes or stages missing
+    from the baseline are not checked.
+    """
+    failures = []
+    for size, result in results.items():
+        base = baseline.get(size)
+        if not isinstance(base, dict):
+            continue
+        checks = [(f"{stage}: per_cik_s", "per_cik_s", stats["per_cik_s"],
+                   base.get("stages", {}).get(stage, {}).get("per_cik_s"))
+                  for stage, stats in result["stages"].items()]
+        checks.append(("run: peak_rss_mb", "peak_rss_mb", result["peak_rss_mb"], base.get("peak_rss_mb")))
+        for what, metric, value, ref in checks:
+            if ref and _regressed(metric, value, ref, tolerance):
+                failures.append(f"{size} CIKs / {what} {value:g} vs baseline {ref:g} (+{value / ref - 1:.0%})")
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic filers.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10],
+                        help="Corpus sizes in CIKs (up to 10000)")
+    parser.add_argument("--tolerance", type=float, default=0.5,
+                        help="Allowed slowdown / memory growth over the baseline (0.5 = 50%%)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Passes per size; each stage keeps its fastest pass")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH))
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Store these results as the new baseline instead of checking")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Also record tracemalloc allocation peaks (slower)")
+    add_generator_args(parser)
+    args = parser.parse_args()
+
+    shape = generator_kwargs(args)
+    results = {}
+    for size in sorted(set(args.sizes)):
+        start = time.perf_counter()
+        paths = write_corpus(corpus_dir(shape), max(args.sizes), **shape)[:size]
+        print(f"⏱  {size} CIKs (corpus ready in {time.perf_counter() - start:.1f}s)")
+        best = run_passes(paths, args.repeat, trace_memory=args.trace_memory)
+        results[str(size)] = best
+
+        print(f"   {'stage':<10} {'total s':>9} {'s/CIK':>9} {'p95 s':>9} {'rows out':>11} {'+RSS MB':>9}")
+        for stage, s in best["stages"].items():
+            print(f"   {stage:<10} {s['seconds']:>9.2f} {s['per_cik_s']:>9.4f} {s['p95_s']:>9.4f} "
+                  f"{s['rows_out']:>11,} {s['rss_growth_mb']:>9.1f}")
+        print(f"   peak RSS of the pass: {best['peak_rss_mb']:.1f} MB")
+
+    RESULTS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with RESULTS_PATH.open("a") as f:
+        f.write(json.dumps({"at": time.strftime("%Y-%m-%dT%H:%M:%S"), "shape": shape, "results": results}) + "\n")
+
+    baseline_path = Path(args.baseline)
+    if args.update_baseline:
+        baseline = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+        baseline.update({"shape": shape, **results})
+        baseline_path.write_text(json.dumps(baseline, indent=2) + "\n")
+        print(f"\n✅ Baseline updated at {baseline_path}")
+        return
+
+    if not baseline_path.exists():
+        print(f"\n⚠️  No baseline at {baseline_path}; run with --update-baseline to create one")
+        return
+    if args.trace_memory:
+        print("\n⚠️  tracemalloc slows every stage down; not comparing against the baseline")
+        return
+    baseline = json.loads(baseline_path.read_text())
+    if baseline.get("shape") != shape:
+        print(f"\n⚠️  Baseline was recorded for another corpus shape {baseline.get('shape')}; not comparing")
+        return
+    failures = compare(results, baseline, args.tolerance)
+    if failures:
+        print(f"\n❌ {len(failures)} regression(s) beyond {args.tolerance:.0%}:")
+        for line in failures:
+            print(f"   {line}")
+        sys.exit(1)
+    print(f"\n✅ No regressions beyond {args.tolerance:.0%} of the baseline")
+
+
+if __name__ == "__main__":
+    main()
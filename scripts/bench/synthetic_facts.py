@@ -0,0 +1,198 @@
+# scripts/bench/synthetic_facts.py
+
+"""
+Synthetic SEC companyfacts generator for benchmarks.
+
+Each company gets a fiscal-year-end month and a set of us-gaap tags: tags
+from the mapping (so direct matches happen), lightly renamed variants of
+them (fuzzy matches) and company-specific extension tags (no match). Every
+fiscal year produces what EDGAR files look like:
+
+  - a 10-K with the year's value plus `comparatives` prior years, all
+    carrying the filing's fy
+  - for quarterly tags, three 10-Qs with the quarter value, the
+    year-to-date value (Q2, Q3; flows only) and the prior-year comparative
+
+A share of tags (`dict_share`) uses the legacy dict-shaped units.USD
+({end: value}) instead of the list of fact objects. Generation is
+deterministic for a given seed.
+
+Usage:
+  python scripts/bench/synthetic_facts.py <out_dir> [--ciks 10] [--tags 400] [--years 12] ...
+"""
+
+import sys
+from pathlib import Path
+# Ensure project root is on sys.path so we can import our modules
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import argparse
+import calendar
+import datetime as dt
+import json
+import random
+import re
+from typing import List
+
+from config.settings import MAPPING_PATH
+
+
+_WORDS = ["Accrued", "Deferred", "Other", "Noncurrent", "Current", "Operating", "Segment",
+          "Income", "Expense", "Liabilities", "Assets", "Revenue", "Costs", "Lease",
+          "Tax", "Compensation", "Receivable", "Payable", "Investment", "Gain", "Loss",
+          "Amortization", "Depreciation", "Interest", "Dividends", "Capital", "Inventory"]
+
+
+def _month_end(year: int, month: int) -> dt.date:
+    return dt.date(year, month, calendar.monthrange(year, month)[1])
+
+
+def _shift_months(d: dt.date, months: int) -> dt.date:
+    total = d.year * 12 + d.month - 1 + months
+    return _month_end(total // 12, total % 12 + 1)
+
+
+def _label(tag: str) -> str:
+    return re.sub(r"(?<=[a-z0-9])(?=[A-Z])", " ", tag).capitalize()
+
+
+def mapping_tags(mapping_path=MAPPING_PATH) -> List[str]:
+    """
+    Distinct unqualified tags of the mapping JSON, in mapping order.
+    """
+    mapping = json.loads(Path(mapping_path).read_text())
+    return list(dict.fromkeys(str(t).split(":", 1)[-1] for section in mapping.values()
+                              for tags in section.values() for t in tags))
+
+
+def generate_companyfacts(cik: int,
+                          n_tags: int = 400,
+                          years: int = 12,
+                          last_fy: int = 2024,
+                          quarterly_share: float = 0.7,
+                          comparatives: int = 2,
+                          dict_share: float = 0.0,
+                          mapped_share: float = 0.3,
+                          seed: int = 0,
+                          vocabulary: List[str] = None) -> dict:
+    """
+    One synthetic companyfacts document.
+
+    - cik: numeric CIK (also seeds the company)
+    - n_tags: us-gaap tags reported by the company
+    - years: fiscal years of filings, ending with last_fy
+    - quarterly_share: share of tags also reported on 10-Qs
+    - comparatives: prior-year values repeated in each 10-K
+    - dict_share: share of tags with dict-shaped units.USD
+    - mapped_share: share of tags drawn from the mapping vocabulary; a third
+      as many again are renamed variants of mapping tags
+    - vocabulary: mapping tags to draw from (default: mapping_tags())
+    """
+    rng = random.Random(seed * 1_000_003 + cik)
+    vocabulary = vocabulary if vocabulary is not None else mapping_tags()
+
+    n_mapped = min(int(n_tags * mapped_share), len(vocabulary))
+    n_variant = min(n_tags - n_mapped, n_mapped // 3)
+    tags = rng.sample(vocabulary, n_mapped)
+    tags += [t.replace("Net", "") + "Total" for t in rng.sample(vocabulary, n_variant)]
+    while len(tags) < n_tags:
+        tags.append("".join(rng.sample(_WORDS, rng.randint(2, 4))) + str(rng.randint(1, 99)))
+
+    fye_month = rng.choice([3, 6, 9, 12, 12, 12])
+    first_fy = last_fy - years + 1
+
+    def fy_end(fy: int) -> dt.date:
+        return _month_end(fy, fye_month)
+
+    us_gaap = {}
+    for tag in dict.fromkeys(tags):
+        flow = rng.random() < 0.6
+        quarterly = rng.random() < quarterly_share
+        base = 10 ** rng.uniform(5, 11)
+        growth = rng.uniform(0.95, 1.15)
+        # at least one prior year: 10-Qs always carry the prior-year quarter
+        annual = {fy: round(base * growth ** (fy - first_fy) * rng.uniform(0.9, 1.1), -3)
+                  for fy in range(first_fy - max(comparatives, 1), last_fy + 1)}
+        quarters = {fy: [round(annual[fy] * rng.uniform(0.2, 0.3), -3) for _ in range(3)]
+                    for fy in annual}
+
+        if rng.random() < dict_share:
+            usd = {fy_end(fy).isoformat(): annual[fy] for fy in range(first_fy, last_fy + 1)}
+        else:
+            usd = []
+            for fy in range(first_fy, last_fy + 1):
+                end = fy_end(fy)
+                filed = (end + dt.timedelta(days=rng.randint(45, 75))).isoformat()
+                accn = f"{cik:010d}-{fy % 100:02d}-{rng.randint(0, 999999):06d}"
+                for back in range(comparatives + 1):
+                    prior_end = fy_end(fy - back)
+                    fact = {"end": prior_end.isoformat(), "val": annual[fy - back], "accn": accn,
+                            "fy": fy, "fp": "FY", "form": "10-K", "filed": filed}
+                    if flow:
+                        fact["start"] = (_shift_months(prior_end, -12) + dt.timedelta(days=1)).isoformat()
+                    usd.append(fact)
+
+                if not quarterly:
+                    continue
+                for q in range(3):
+                    q_end = _shift_months(end, 3 * (q + 1) - 12)
+                    q_filed = (q_end + dt.timedelta(days=rng.randint(30, 45))).isoformat()
+                    accn = f"{cik:010d}-{fy % 100:02d}-{rng.randint(0, 999999):06d}"
+                    meta = {"accn": accn, "fy": fy, "fp": f"Q{q + 1}", "form": "10-Q", "filed": q_filed}
+                    usd.append({"end": q_end.isoformat(), "val": quarters[fy][q], **meta})
+                    usd.append({"end": _shift_months(q_end, -12).isoformat(), "val": quarters[fy - 1][q], **meta})
+                    if flow and q > 0:
+                        usd.append({"end": q_end.isoformat(), "val": sum(quarters[fy][:q + 1]), **meta})
+
+        us_gaap[tag] = {"label": _label(tag), "description": f"Synthetic {_label(tag).lower()}",
+                        "units": {"USD": usd}}
+
+    return {"cik": cik, "entityName": f"Synthetic Company {cik}", "facts": {"us-gaap": us_gaap}}
+
+
+def write_corpus(out_dir, n_ciks: int, first_cik: int = 9_000_000, **kwargs) -> List[Path]:
+    """
+    Write `n_ciks` companyfacts files CIK{cik:010d}.json into out_dir (existing
+    files are kept, so a larger corpus extends a smaller one). Extra keyword
+    arguments go to generate_companyfacts. Returns the paths.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    vocabulary = kwargs.pop("vocabulary", None) or mapping_tags()
+    paths = []
+    for cik in range(first_cik, first_cik + n_ciks):
+        path = out_dir / f"CIK{cik:010d}.json"
+        if not path.exists():
+            doc = generate_companyfacts(cik, vocabulary=vocabulary, **kwargs)
+            tmp = path.with_name(f".{path.name}.tmp")
+            tmp.write_text(json.dumps(doc, separators=(",", ":")))
+            tmp.replace(path)
+        paths.append(path)
+    return paths
+
+
+def add_generator_args(parser: argparse.ArgumentParser) -> None:
+    """
+    Corpus-shape options shared by this CLI and the benchmark harness.
+    """
+    parser.add_argument("--tags", type=int, default=400, help="Tags per company")
+    parser.add_argument("--years", type=int, default=12, help="Fiscal years per company")
+    parser.add_argument("--quarterly-share", type=float, default=0.7, help="Share of tags on 10-Qs")
+    parser.add_argument("--comparatives", type=int, default=2, help="Prior years repeated per 10-K")
+    parser.add_argument("--dict-share", type=float, default=0.0, help="Share of dict-shaped units.USD")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def generator_kwargs(args) -> dict:
+    return {"n_tags": args.tags, "years": args.years, "quarterly_share": args.quarterly_share,
+            "comparatives": args.comparatives, "dict_share": args.dict_share, "seed": args.seed}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic SEC companyfacts JSON.")
+    parser.add_argument("out_dir")
+    parser.add_argument("--ciks", type=int, default=10, help="Companies to generate")
+    add_generator_args(parser)
+    args = parser.parse_args()
+    paths = write_corpus(args.out_dir, args.ciks, **generator_kwargs(args))
+    print(f"✅ {len(paths)} companyfacts files in {args.out_dir}")
@@ -1,7 +1,55 @@
 # scripts/clean/preprocess_terms.py
 
-import pandas as pd
 import re
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+
+_NON_ALNUM = re.compile(r"[^A-Za-z0-9]")
+
+# Normalized form of every tag/label seen by this process, shared across CIKs
+# (batch workers clean many filers that reuse the same us-gaap vocabulary).
+# Cleared when it reaches MEMO_MAX_ENTRIES so custom-tag churn cannot grow it
+# without bound.
+MEMO_MAX_ENTRIES = 500_000
+_memo: Dict[str, str] = {}
+
+
+def normalize_text(text: str) -> str:
+    """
+    Lowercase alphanumeric form of a tag or label: every other character
+    becomes a space, then surrounding whitespace is stripped.
+    """
+    return _NON_ALNUM.sub(" ", text).lower().strip()
+
+
+def _normalize_column(values: pd.Series) -> pd.Categorical:
+    """
+    normalize_text over a column, computed once per distinct value (the
+    categories of a categorical column) through the process-wide memo and
+    mapped back to the rows by code. Missing values stay missing.
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes = values.cat.codes.to_numpy()
+        uniques = values.cat.categories
+    else:
+        codes, uniques = pd.factorize(values)
+
+    if len(_memo) + len(uniques) > MEMO_MAX_ENTRIES:
+        _memo.clear()
+    cleaned = []
+    for text in map(str, uniques):
+        norm = _memo.get(text)
+        if norm is None:
+            norm = _memo[text] = normalize_text(text)
+        cleaned.append(norm)
+
+    # distinct raw values can normalize to the same string
+    clean_codes, categories = pd.factorize(np.array(cleaned, dtype=object))
+    row_codes = np.where(codes >= 0, clean_codes[np.maximum(codes, 0)], -1) if len(clean_codes) else codes
+    return pd.Categorical.from_codes(row_codes, categories=categories)
 
 
 def clean_dataframe(df: pd.DataFrame) -> pd.DataFrame:
@@ -12,30 +60,19 @@ def clean_dataframe(df: pd.DataFrame) -> pd.DataFrame:
     - tag_clean: lowercase alphanumeric only version of 'tag'
     - label_clean: lowercase alphanumeric only version of 'label'
 
+    Only distinct values are normalized, so cleaning time depends on the
+    vocabulary size rather than the row count; both columns are categorical.
+    The input frame is not modified and not copied (columns are shared).
+
     Returns a cleaned DataFrame.
     """
-    df_clean = df.copy()
-
-    # Normalize 'tag'
-    df_clean['tag_clean'] = (
-        df_clean['tag']
-        .astype(str)
-        .str.replace(r"[^A-Za-z0-9]", " ", regex=True)
-        .str.lower()
-        .str.strip()
-    )
-
-    # Normalize 'label'
-    df_clean['label_clean'] = (
-        df_clean['label']
-        .astype(str)
-        .str.replace(r"[^A-Za-z0-9]", " ", regex=True)
-        .str.lower()
-        .str.strip()
+    df_clean = df.assign(
+        tag_clean=_normalize_column(df['tag']),
+        label_clean=_normalize_column(df['label']),
     )
 
     # Ensure 'end' column is present
     if 'end' not in df_clean.columns and 'period_end' in df_clean.columns:
-        df_clean['end'] = df_clean['period_end']
+        df_clean = df_clean.assign(end=df_clean['period_end'])
 
     return df_clean
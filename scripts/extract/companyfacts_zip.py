@@ -0,0 +1,206 @@
+# scripts/extract/companyfacts_zip.py
+
+"""
+Random access to the SEC's bulk companyfacts.zip without unpacking it.
+
+The archive holds one CIK##########.json member per filer. Opening it with
+zipfile means parsing a central directory of every member, on every open,
+in every worker. Instead, the central directory is read once into a member
+index (CIK → local header offset, method, sizes, CRC-32) cached under
+data/cache/zip_index/, keyed by the archive's name, size and mtime. A member
+is then opened by seeking to its local header and inflating its data as a
+stream, so any worker can read any CIK with one seek, and nothing is ever
+written to disk.
+
+Usage:
+  python scripts/extract/companyfacts_zip.py index <companyfacts.zip>
+  python scripts/extract/companyfacts_zip.py ls <companyfacts.zip> [--glob 'CIK00003*.json']
+"""
+
+import sys
+from pathlib import Path
+# Ensure project root is on sys.path so we can import our modules
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import argparse
+import fnmatch
+import io
+import json
+import os
+import struct
+import zipfile
+import zlib
+from functools import lru_cache
+from typing import Dict, List
+
+from config.settings import ZIP_INDEX_DIR
+
+
+_LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")
+_LOCAL_MAGIC = b"PK\x03\x04"
+_CHUNK = 1 << 20
+
+
+def _index_path(zip_path: Path) -> Path:
+    st = zip_path.stat()
+    return Path(ZIP_INDEX_DIR) / f"{zip_path.stem}-{st.st_size}-{st.st_mtime_ns}.json"
+
+
+def build_member_index(zip_path) -> Dict[str, list]:
+    """
+    Read the archive's central directory once and cache
+    {cik: [member name, header offset, method, compressed size, size, crc]}
+    for every *.json member (CIK = member name without extension).
+    """
+    zip_path = Path(zip_path)
+    index = {}
+    with zipfile.ZipFile(zip_path) as zf:
+        for info in zf.infolist():
+            if info.is_dir() or not info.filename.endswith(".json"):
+                continue
+            if info.compress_type not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+                raise ValueError(f"{info.filename}: unsupported compression method {info.compress_type}")
+            cik = Path(info.filename).stem
+            index[cik] = [info.filename, info.header_offset, info.compress_type,
+                          info.compress_size, info.file_size, info.CRC]
+
+    path = _index_path(zip_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(index))
+    tmp.replace(path)
+    print(f"[companyfacts_zip] Indexed {len(index):,} members of {zip_path}")
+    return index
+
+
+@lru_cache(maxsize=4)
+def _cached_index(zip_path: str, index_path: str) -> Dict[str, list]:
+    path = Path(index_path)
+    if path.exists():
+        return json.loads(path.read_text())
+    return build_member_index(zip_path)
+
+
+def member_index(zip_path) -> Dict[str, list]:
+    """
+    The archive's member index, loaded once per process (built on first use,
+    rebuilt whenever the archive's size or mtime changes).
+    """
+    zip_path = Path(zip_path).resolve()
+    return _cached_index(str(zip_path), str(_index_path(zip_path)))
+
+
+def list_ciks(zip_path, pattern: str = None) -> List[str]:
+    """
+    CIKs in the archive, sorted, optionally filtered by a glob over member
+    names (e.g. "CIK00003*.json").
+    """
+    index = member_index(zip_path)
+    ciks = sorted(index)
+    if pattern:
+        ciks = [cik for cik in ciks if fnmatch.fnmatch(Path(index[cik][0]).name, pattern)]
+    return ciks
+
+
+def member_digest(zip_path, cik: str) -> str:
+    """
+    Content fingerprint of a member from the index (CRC-32 and size), usable
+    as the raw-input digest of the build manifest without reading the data.
+    """
+    name, _, _, _, size, crc = _entry(zip_path, cik)
+    return f"zip:{crc:08x}:{size}"
+
+
+def _entry(zip_path, cik: str) -> list:
+    try:
+        return member_index(zip_path)[cik]
+    except KeyError:
+        raise FileNotFoundError(f"{cik} is not in {zip_path}") from None
+
+
+class _MemberReader(io.RawIOBase):
+    """
+    Read-only stream over one member's data: inflated chunk by chunk from
+    the archive, CRC-checked at the end.
+    """
+
+    def __init__(self, f, method: int, compress_size: int, size: int, crc: int, name: str):
+        self._f = f
+        self._left = compress_size
+        self._inflate = zlib.decompressobj(-zlib.MAX_WBITS) if method == zipfile.ZIP_DEFLATED else None
+        self._pending = b""
+        self._size = size
+        self._crc_expected = crc
+        self._crc = 0
+        self._read = 0
+        self._name = name
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buf) -> int:
+        while not self._pending and (self._left > 0 or (self._inflate and not self._inflate.eof)):
+            raw = self._f.read(min(_CHUNK, self._left)) if self._left > 0 else b""
+            self._left -= len(raw)
+            if self._inflate is None:
+                self._pending = raw
+            else:
+                self._pending = self._inflate.decompress(raw) if raw else self._inflate.flush()
+            if not raw and not self._pending:
+                break
+        n = min(len(buf), len(self._pending))
+        if n:
+            buf[:n] = self._pending[:n]
+            self._crc = zlib.crc32(self._pending[:n], self._crc)
+            self._pending = self._pending[n:]
+            self._read += n
+        elif self._read != self._size or self._crc != self._crc_expected:
+            raise zipfile.BadZipFile(f"{self._name}: corrupt member (size or CRC-32 mismatch)")
+        return n
+
+    def close(self) -> None:
+        if not self.closed:
+            self._f.close()
+        super().close()
+
+
+def open_member(zip_path, cik: str) -> io.BufferedReader:
+    """
+    Binary stream over data of member `cik` (e.g. "CIK0000320193"), found
+    through the member index: one seek to its local header, then inflated as
+    it is read. Close it (or use it as a context manager) when done.
+    """
+    name, offset, method, compress_size, size, crc = _entry(zip_path, cik)
+    f = open(zip_path, "rb")
+    try:
+        f.seek(offset)
+        header = _LOCAL_HEADER.unpack(f.read(_LOCAL_HEADER.size))
+        if header[0] != _LOCAL_MAGIC:
+            raise zipfile.BadZipFile(f"{name}: bad local header at offset {offset}; rebuild the index")
+        name_len, extra_len = header[9], header[10]
+        f.seek(name_len + extra_len, os.SEEK_CUR)
+    except BaseException:
+        f.close()
+        raise
+    return io.BufferedReader(_MemberReader(f, method, compress_size, size, crc, name), buffer_size=_CHUNK)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Member index of the companyfacts.zip archive.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    ix = sub.add_parser("index", help="(Re)build the member index")
+    ix.add_argument("zip_path")
+    ls = sub.add_parser("ls", help="List the CIKs in the archive")
+    ls.add_argument("zip_path")
+    ls.add_argument("--glob", default=None)
+    args = parser.parse_args()
+
+    if args.cmd == "index":
+        build_member_index(args.zip_path)
+    else:
+        for cik in list_ciks(args.zip_path, args.glob):
+            print(cik)
+
+
+if __name__ == "__main__":
+    main()
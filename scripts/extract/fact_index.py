@@ -0,0 +1,174 @@
+# scripts/extract/fact_index.py
+
+import json
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+# One USD fact as it appears under facts → us-gaap → <tag> → units → USD
+Fact = namedtuple("Fact", ["tag", "val", "fy", "fp", "form", "filed", "end"])
+
+
+class FactIndex:
+    """
+    Index over the US-GAAP USD facts of one SEC companyfacts file, built in a
+    single pass so callers never rescan the raw JSON.
+
+    Lookups are keyed by tag, form, fp and period-end date:
+      - fy_total(tags, end):            10-K value at a fiscal-year end
+      - quarter_values(tags, lo, hi):   10-Q values per Q1–Q3 between two FY ends
+      - latest_by_fy(tags, form):       latest period end (and value) per fiscal year
+      - at_end(end) / value_at(tag, end): facts for a given period end
+
+    Tags may be given with or without the 'us-gaap:' namespace prefix.
+    """
+
+    def __init__(self, raw_facts: Dict):
+        self._facts = {}          # tag -> [Fact] in file order
+        self._by_form_end = {}    # (tag, form, end) -> [val] in file order
+        self._by_end = {}         # end -> [Fact] in file order
+        self._by_tag_fy = {}      # (tag, fy) -> [Fact]
+        self._first_at = {}       # (tag, end) -> first val reported
+        self._quarters = {}       # (tag, form, fp) -> ([end], [val]) sorted by end
+        self._latest = {}         # (tag, form, require_val) -> {fy: (end, val)}
+
+        for tag, metrics in raw_facts.items():
+            unit_data = (metrics or {}).get("units", {}).get("USD") or []
+            if isinstance(unit_data, dict):
+                # dict mapping end-date -> value, but lacks metadata
+                entries = [Fact(tag, val, None, None, None, None, end) for end, val in unit_data.items()]
+            else:
+                entries = [
+                    Fact(tag, e.get("val"), e.get("fy"), e.get("fp"), e.get("form"), e.get("filed"), e.get("end"))
+                    for e in unit_data
+                ]
+            self._facts[tag] = entries
+
+            quarters = {}
+            for f in entries:
+                self._by_form_end.setdefault((tag, f.form, f.end), []).append(f.val)
+                self._by_end.setdefault(f.end, []).append(f)
+                self._by_tag_fy.setdefault((tag, f.fy), []).append(f)
+                self._first_at.setdefault((tag, f.end), f.val)
+
+                if f.end and f.val is not None:
+                    quarters.setdefault((tag, f.form, f.fp), []).append((f.end, f.val))
+
+                if f.fy and f.end:
+                    fy = int(f.fy)
+                    keys = [(tag, f.form, False)]
+                    if f.val is not None:
+                        keys.append((tag, f.form, True))
+                    for key in keys:
+                        by_fy = self._latest.setdefault(key, {})
+                        # strict '>' keeps the first entry seen for a given end
+                        if fy not in by_fy or f.end > by_fy[fy][0]:
+                            by_fy[fy] = (f.end, f.val)
+
+            for key, pairs in quarters.items():
+                pairs.sort(key=lambda p: p[0])
+                self._quarters[key] = ([p[0] for p in pairs], [p[1] for p in pairs])
+
+    @classmethod
+    def from_sec_data(cls, sec_data: Dict) -> "FactIndex":
+        return cls(sec_data.get("facts", {}).get("us-gaap", {}))
+
+    @classmethod
+    def from_file(cls, filepath) -> "FactIndex":
+        """
+        Load data/raw/{cik}.json and index it; the raw dict is released afterwards.
+        """
+        return cls.from_sec_data(json.loads(Path(filepath).read_text()))
+
+    # ── tag resolution ───────────────────────────────────────────────────
+    def resolve(self, tag: str) -> Optional[str]:
+        """
+        Return the key under which `tag` is stored, trying the tag as given and
+        then without its namespace prefix. None if the filer never used it.
+        """
+        if self._facts.get(tag):
+            return tag
+        bare = tag.split(":", 1)[-1]
+        if self._facts.get(bare):
+            return bare
+        return None
+
+    def _resolved(self, tags: Iterable[str]) -> List[str]:
+        return [t for t in (self.resolve(tag) for tag in tags) if t is not None]
+
+    def tags(self) -> List[str]:
+        return list(self._facts.keys())
+
+    def __contains__(self, tag: str) -> bool:
+        return tag in self._facts
+
+    # ── queries ──────────────────────────────────────────────────────────
+    def facts(self, tag: str, fy: int = None) -> List[Fact]:
+        """
+        All facts for a tag (file order), optionally restricted to one fiscal year.
+        """
+        key = self.resolve(tag)
+        if key is None:
+            return []
+        if fy is None:
+            return self._facts[key]
+        return self._by_tag_fy.get((key, fy), [])
+
+    def fy_total(self, tags: Iterable[str], end: str, form: str = "10-K"):
+        """
+        Value reported on `form` for period `end`. When several tags carry a
+        value, the last tag (in the given order) wins; missing values are 0.
+        """
+        total = 0
+        for key in self._resolved(tags):
+            vals = self._by_form_end.get((key, form, end))
+            if vals:
+                total = vals[-1] or 0
+        return total
+
+    def quarter_values(self, tags: Iterable[str], prev_end: str, this_end: str,
+                       form: str = "10-Q", periods=("Q1", "Q2", "Q3")) -> Dict[str, list]:
+        """
+        Non-null values per fiscal period with prev_end < end < this_end.
+        """
+        buckets = {fp: [] for fp in periods}
+        for key in self._resolved(tags):
+            for fp in periods:
+                found = self._quarters.get((key, form, fp))
+                if not found:
+                    continue
+                ends, vals = found
+                lo = bisect_right(ends, prev_end)
+                hi = bisect_left(ends, this_end)
+                buckets[fp].extend(vals[lo:hi])
+        return buckets
+
+    def latest_by_fy(self, tags: Iterable[str], form: str,
+                     require_val: bool = False) -> Dict[int, Tuple[str, object]]:
+        """
+        Map fiscal year → (latest period end, its value) over the given tags.
+        Ties on the end date keep the first tag/entry encountered.
+        """
+        out = {}
+        for key in self._resolved(tags):
+            for fy, (end, val) in self._latest.get((key, form, require_val), {}).items():
+                if fy not in out or end > out[fy][0]:
+                    out[fy] = (end, val)
+        return out
+
+    def at_end(self, end: str) -> List[Fact]:
+        """
+        Every fact (any tag) whose period ends on `end`, in file order.
+        """
+        return self._by_end.get(end, [])
+
+    def value_at(self, tag: str, end: str):
+        """
+        First value reported for `tag` at period end `end`, or None.
+        """
+        key = self.resolve(tag)
+        if key is None:
+            return None
+        return self._first_at.get((key, end))
@@ -1,11 +1,29 @@
 # scripts/extract/parse_sec_json.py
 
 import json
+from array import array
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Iterator, Tuple
+import numpy as np
 import pandas as pd
 
 
+# Published dtypes of the frame returned by the extractors. Callers can rely
+# on these (e.g. no need to re-parse dates) and use apply_fact_schema() to
+# restore them on frames read back from text formats.
+FACT_SCHEMA = {
+    'tag':   'category',
+    'label': 'category',
+    'value': 'float64',
+    'fy':    'Int16',
+    'fp':    'category',
+    'form':  'category',
+    'filed': 'datetime64[ns]',
+    'end':   'datetime64[ns]',
+}
+COLUMNS = list(FACT_SCHEMA)
+
+
 def load_sec_json(filepath: str) -> Dict:
     """
     Load the raw SEC JSON file for a given CIK.
@@ -14,62 +32,228 @@ def load_sec_json(filepath: str) -> Dict:
         return json.load(f)
 
 
-def extract_usd_facts(sec_data: Dict) -> pd.DataFrame:
+def apply_fact_schema(df: pd.DataFrame) -> pd.DataFrame:
     """
-    Flatten the SEC JSON facts into a DataFrame of USD values per period.
+    Coerce an extracted-facts frame (e.g. re-read from CSV) to FACT_SCHEMA.
+    Columns outside the schema are left untouched.
+    """
+    out = {}
+    for col, dtype in FACT_SCHEMA.items():
+        if col not in df.columns:
+            continue
+        if dtype.startswith('datetime64'):
+            out[col] = pd.to_datetime(df[col], errors='coerce').astype(dtype)
+        elif dtype == 'Int16':
+            out[col] = pd.to_numeric(df[col], errors='coerce').astype(dtype)
+        else:
+            out[col] = df[col].astype(dtype)
+    return df.assign(**out)
 
-    Returns columns:
-      - tag: raw US-GAAP tag (unqualified)
-      - label: human-readable label
-      - value: numeric value
-      - fy: fiscal year
-      - fp: fiscal period (e.g., 'Q1')
-      - form: filing form (10-Q or 10-K)
-      - filed: filing date
-      - end: period-end date
-    """
-    rows = []
-    facts = sec_data.get("facts", {}).get("us-gaap", {})
 
-    for tag_full, metrics in facts.items():
+class _Codes:
+    """
+    Dictionary-encodes a column while it is being filled: each distinct value
+    is stored once and rows only hold an int32 code (-1 for missing).
+    """
+
+    __slots__ = ('lookup', 'uniques', 'codes')
+
+    def __init__(self):
+        self.lookup = {}
+        self.uniques = []
+        self.codes = array('i')
+
+    def code(self, value) -> int:
+        if value is None:
+            return -1
+        code = self.lookup.get(value)
+        if code is None:
+            code = self.lookup[value] = len(self.uniques)
+            self.uniques.append(value)
+        return code
+
+    def add(self, value) -> None:
+        self.codes.append(self.code(value))
+
+    def add_repeated(self, value, n: int) -> None:
+        self.codes.extend(array('i', [self.code(value)]) * n)
+
+    def _codes(self) -> np.ndarray:
+        return np.frombuffer(self.codes, dtype=np.int32) if self.codes else np.empty(0, dtype=np.int32)
+
+    def to_categorical(self) -> pd.Categorical:
+        return pd.Categorical.from_codes(self._codes(), categories=self.uniques)
+
+    def to_datetime(self) -> np.ndarray:
+        # parse each distinct date string once; the trailing NaT serves code -1
+        parsed = pd.to_datetime(pd.Series(self.uniques, dtype=object), errors='coerce')
+        lookup = np.append(parsed.to_numpy(dtype='datetime64[ns]'), np.datetime64('NaT', 'ns'))
+        return lookup.take(self._codes())
+
+
+class _FactColumns:
+    """
+    Typed column buffers filled one tag at a time, so facts are never
+    materialized as per-row dicts or object columns before the DataFrame is
+    built (see FACT_SCHEMA).
+    """
+
+    FY_MISSING = -1
+
+    def __init__(self):
+        self.tag = _Codes()
+        self.label = _Codes()
+        self.fp = _Codes()
+        self.form = _Codes()
+        self.filed = _Codes()
+        self.end = _Codes()
+        self.value = array('d')
+        self.fy = array('i')
+
+    def add_tag(self, tag_full: str, metrics: Dict) -> None:
         # unqualify tag name (strip namespace)
         tag = tag_full.split(':', 1)[-1]
         label = metrics.get('label', tag)
         unit_data = metrics.get('units', {}).get('USD', {})
+        nan = float('nan')
 
         # USD facts may be list of entries or dict mapping dates -> values
         if isinstance(unit_data, list):
-            for entry in unit_data:
-                val = entry.get('val')
-                end = entry.get('end')
-                fy = entry.get('fy')
-                fp = entry.get('fp')
-                form = entry.get('form')
-                filed = entry.get('filed')
-                rows.append({
-                    'tag': tag,
-                    'label': label,
-                    'value': val,
-                    'fy': fy,
-                    'fp': fp,
-                    'form': form,
-                    'filed': filed,
-                    'end': end
-                })
+            n = len(unit_data)
+            for e in unit_data:
+                val = e.get('val')
+                fy = e.get('fy')
+                self.value.append(nan if val is None else val)
+                self.fy.append(self.FY_MISSING if fy is None else fy)
+                self.fp.add(e.get('fp'))
+                self.form.add(e.get('form'))
+                self.filed.add(e.get('filed'))
+                self.end.add(e.get('end'))
         elif isinstance(unit_data, dict):
             # dict mapping end-date -> value, but lacks metadata
+            # (fy stays missing: the CIK fallback is not a fiscal year)
+            n = len(unit_data)
             for end, val in unit_data.items():
-                rows.append({
-                    'tag': tag,
-                    'label': label,
-                    'value': val,
-                    'fy': sec_data.get('cik'),  # fallback if missing
-                    'fp': None,
-                    'form': None,
-                    'filed': None,
-                    'end': end
-                })
+                self.value.append(nan if val is None else val)
+                self.end.add(end)
+            self.fy.extend(array('i', [self.FY_MISSING]) * n)
+            self.fp.add_repeated(None, n)
+            self.form.add_repeated(None, n)
+            self.filed.add_repeated(None, n)
+        else:
+            return
+
+        self.tag.add_repeated(tag, n)
+        self.label.add_repeated(label, n)
+
+    def to_frame(self) -> pd.DataFrame:
+        fy = np.frombuffer(self.fy, dtype=np.int32) if self.fy else np.empty(0, dtype=np.int32)
+        value = np.frombuffer(self.value, dtype=np.float64) if self.value else np.empty(0)
+        return pd.DataFrame({
+            'tag':   self.tag.to_categorical(),
+            'label': self.label.to_categorical(),
+            'value': value,
+            'fy':    pd.arrays.IntegerArray(fy.astype(np.int16), fy == self.FY_MISSING),
+            'fp':    self.fp.to_categorical(),
+            'form':  self.form.to_categorical(),
+            'filed': self.filed.to_datetime(),
+            'end':   self.end.to_datetime(),
+        }, columns=COLUMNS)
+
+
+def extract_usd_facts(sec_data: Dict) -> pd.DataFrame:
+    """
+    Flatten the SEC JSON facts into a DataFrame of USD values per period.
+
+    Returns columns (dtypes per FACT_SCHEMA):
+      - tag: raw US-GAAP tag (unqualified)      category
+      - label: human-readable label             category
+      - value: numeric value                    float64
+      - fy: fiscal year                         Int16 (nullable)
+      - fp: fiscal period (e.g., 'Q1')          category
+      - form: filing form (10-Q or 10-K)        category
+      - filed: filing date                      datetime64[ns]
+      - end: period-end date                    datetime64[ns]
+    """
+    buffers = _FactColumns()
+    facts = sec_data.get("facts", {}).get("us-gaap", {})
+
+    for tag_full, metrics in facts.items():
+        buffers.add_tag(tag_full, metrics)
 
     # Construct DataFrame
-    df = pd.DataFrame(rows)
-    return df
+    return buffers.to_frame()
+
+
+def _import_ijson():
+    try:
+        import ijson
+    except ImportError as e:
+        raise ImportError(
+            "Streaming extraction requires the 'ijson' package (pip install ijson)"
+        ) from e
+    return ijson
+
+
+def iter_us_gaap_facts(source) -> Iterator[Tuple[str, Dict]]:
+    """
+    Stream (tag, metrics) pairs from facts → us-gaap of a companyfacts file
+    without loading the whole document. Only one tag's metrics are held in
+    memory at a time.
+
+    - source: path to the JSON file, or a binary file object
+    """
+    ijson = _import_ijson()
+    if hasattr(source, 'read'):
+        yield from ijson.kvitems(source, 'facts.us-gaap', use_float=True)
+        return
+    with open(source, 'rb') as f:
+        yield from ijson.kvitems(f, 'facts.us-gaap', use_float=True)
+
+
+def extract_usd_facts_streaming(source) -> pd.DataFrame:
+    """
+    Streaming counterpart of extract_usd_facts: parses the companyfacts file
+    incrementally and appends each tag straight into column buffers, so peak
+    memory tracks the output frame rather than raw JSON + row dicts.
+
+    - source: path to the JSON file, or a binary file object
+    Returns the same columns and dtypes as extract_usd_facts.
+    """
+    if not hasattr(source, 'read'):
+        with open(source, 'rb') as f:
+            return extract_usd_facts_streaming(f)
+
+    buffers = _FactColumns()
+    for tag_full, metrics in iter_us_gaap_facts(source):
+        buffers.add_tag(tag_full, metrics)
+    return buffers.to_frame()
+
+
+def extract_usd_facts_from_file(filepath: str) -> pd.DataFrame:
+    """
+    Extract USD facts from a raw companyfacts file, streaming when ijson is
+    installed and falling back to load_sec_json + extract_usd_facts otherwise.
+    """
+    try:
+        _import_ijson()
+    except ImportError:
+        return extract_usd_facts(load_sec_json(filepath))
+    return extract_usd_facts_streaming(filepath)
+
+
+def extract_usd_facts_from_zip(zip_path: str, cik: str) -> pd.DataFrame:
+    """
+    Extract USD facts for `cik` straight from the SEC's bulk companyfacts.zip:
+    the member is located through the archive's member index and inflated as
+    it is parsed, so nothing is extracted to disk (see companyfacts_zip.py).
+    Streams with ijson when installed, like extract_usd_facts_from_file.
+    """
+    from scripts.extract.companyfacts_zip import open_member
+
+    with open_member(zip_path, cik) as f:
+        try:
+            _import_ijson()
+        except ImportError:
+            return extract_usd_facts(json.load(f))
+        return extract_usd_facts_streaming(f)
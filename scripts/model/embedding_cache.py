@@ -0,0 +1,204 @@
+# scripts/model/embedding_cache.py
+
+import json
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-writer use only
+    fcntl = None
+
+
+class EmbeddingCache:
+    """
+    Disk-backed cache of text embeddings for one model fingerprint, so labels
+    seen for any previous company never go through the model again.
+
+    Layout under <cache_dir>/<fingerprint>/:
+      - vectors.f32: float32 rows appended in write order, read via np.memmap
+      - index.tsv:   one "<row>\\t<normalized text>" line per cached vector
+      - meta.json:   embedding dimension
+
+    Lookups go through an in-memory LRU tier first, then the memory-mapped
+    matrix. Appends are serialized with a file lock so parallel batch workers
+    can share one cache. `stats` counts memory hits, disk hits and misses.
+    """
+
+    def __init__(self, cache_dir, fingerprint: str, lru_size: int = 50_000):
+        self.dir = Path(cache_dir) / fingerprint
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.vectors_path = self.dir / "vectors.f32"
+        self.index_path = self.dir / "index.tsv"
+        self.meta_path = self.dir / "meta.json"
+        self.lock_path = self.dir / ".lock"
+
+        self.lru_size = lru_size
+        self._lru = OrderedDict()
+        self._rows = {}
+        self._index_offset = 0
+        self._matrix = None
+        self.dim = None
+        if self.meta_path.exists():
+            self.dim = json.loads(self.meta_path.read_text())["dim"]
+
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0}
+        self._refresh()
+
+    @staticmethod
+    def normalize(text) -> str:
+        """
+        Cache key for a text: whitespace-collapsed and lowercased (the local
+        SBERT tokenizer lowercases, so case does not change the embedding).
+        """
+        return " ".join(str(text).split()).lower()
+
+    @property
+    def hit_rate(self) -> float:
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    # ── disk tier ────────────────────────────────────────────────────────
+    def _n_vectors(self) -> int:
+        if self.dim is None or not self.vectors_path.exists():
+            return 0
+        return self.vectors_path.stat().st_size // (4 * self.dim)
+
+    def _refresh(self) -> None:
+        """
+        Pick up index lines appended since the last read (possibly by other
+        processes). Rows whose vectors are not fully written yet are ignored.
+        """
+        if not self.index_path.exists():
+            return
+        n_vectors = self._n_vectors()
+        with self.index_path.open("r", encoding="utf-8") as f:
+            f.seek(self._index_offset)
+            while True:
+                line = f.readline()
+                if not line.endswith("\n"):
+                    break
+                row, text = line[:-1].split("\t", 1)
+                if int(row) >= n_vectors:
+                    break
+                self._rows[text] = int(row)
+                self._index_offset = f.tell()
+        self._matrix = None
+
+    def _disk_matrix(self) -> Optional[np.ndarray]:
+        n = self._n_vectors()
+        if n == 0:
+            return None
+        if self._matrix is None or self._matrix.shape[0] < n:
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(n, self.dim))
+        return self._matrix
+
+    # ── lookups ──────────────────────────────────────────────────────────
+    def _remember(self, key: str, vec: np.ndarray) -> None:
+        self._lru[key] = vec
+        self._lru.move_to_end(key)
+        if len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def get(self, text) -> Optional[np.ndarray]:
+        return self.get_many([text])[0]
+
+    def get_many(self, texts) -> List[Optional[np.ndarray]]:
+        """
+        Cached vectors for `texts` (None where missing), updating hit/miss stats.
+        """
+        keys = [self.normalize(t) for t in texts]
+        if any(k not in self._lru and k not in self._rows for k in keys):
+            self._refresh()
+        matrix = None
+        out = []
+        for key in keys:
+            vec = self._lru.get(key)
+            if vec is not None:
+                self._lru.move_to_end(key)
+                self.stats["memory_hits"] += 1
+            elif key in self._rows:
+                if matrix is None:
+                    matrix = self._disk_matrix()
+                vec = np.array(matrix[self._rows[key]])
+                self._remember(key, vec)
+                self.stats["disk_hits"] += 1
+            else:
+                self.stats["misses"] += 1
+            out.append(vec)
+        return out
+
+    def put_many(self, texts, vectors) -> None:
+        """
+        Append new vectors to disk (texts already cached are skipped).
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(texts):
+            raise ValueError("put_many expects one row per text")
+
+        with self.lock_path.open("w") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            if self.dim is None:
+                if self.meta_path.exists():
+                    self.dim = json.loads(self.meta_path.read_text())["dim"]
+                else:
+                    self.dim = int(vectors.shape[1])
+                    self.meta_path.write_text(json.dumps({"dim": self.dim}))
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dim {vectors.shape[1]} != cached dim {self.dim}")
+            self._refresh()
+
+            new_keys, new_rows = {}, []
+            for text, vec in zip(texts, vectors):
+                key = self.normalize(text)
+                if key in self._rows or key in new_keys:
+                    continue
+                new_keys[key] = len(new_rows)
+                new_rows.append(vec)
+            if not new_keys:
+                return
+
+            start = self._n_vectors()
+            row_bytes = 4 * self.dim
+            if self.vectors_path.exists() and self.vectors_path.stat().st_size != start * row_bytes:
+                # drop a partial row left by an interrupted writer
+                os.truncate(self.vectors_path, start * row_bytes)
+            with self.vectors_path.open("ab") as f:
+                f.write(np.ascontiguousarray(new_rows, dtype=np.float32).tobytes())
+            with self.index_path.open("a", encoding="utf-8") as f:
+                f.write("".join(f"{start + i}\t{key}\n" for i, key in enumerate(new_keys)))
+            self._refresh()
+
+        for key, vec in zip(new_keys, new_rows):
+            self._remember(key, np.array(vec))
+        self.stats["writes"] += len(new_keys)
+
+    def encode(self, texts, encode_fn: Callable[[list], np.ndarray]) -> np.ndarray:
+        """
+        Return a (len(texts), dim) float32 matrix, calling `encode_fn` only on
+        distinct texts that are not cached yet and caching its output.
+        """
+        texts = list(texts)
+        cached = self.get_many(texts)
+        # one representative text per missing cache key
+        missing = {}
+        for text, vec in zip(texts, cached):
+            if vec is None:
+                missing.setdefault(self.normalize(text), text)
+        if missing:
+            fresh = np.asarray(encode_fn(list(missing.values())), dtype=np.float32)
+            self.put_many(list(missing.values()), fresh)
+            by_key = dict(zip(missing, fresh))
+            cached = [v if v is not None else by_key[self.normalize(t)] for t, v in zip(texts, cached)]
+        if not cached:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        return np.vstack(cached).astype(np.float32, copy=False)
@@ -0,0 +1,268 @@
+# scripts/model/onnx_backend.py
+
+"""
+CPU inference backends for the SBERT encoder.
+
+  - torch       sentence-transformers in float32 (the default)
+  - torch-int8  the same model with every nn.Linear dynamically quantized to int8
+  - onnx        ONNX Runtime over an export of the full encoder
+                (transformer + pooling + normalize), float32
+  - onnx-int8   the ONNX export with int8 dynamically quantized weights
+
+ONNX exports are written once per model fingerprint to
+data/cache/onnx/<fingerprint>/ (model.onnx, model.int8.onnx, tokenizer.json,
+meta.json). Once exported, the ONNX backends need neither torch nor
+sentence-transformers at run time: tokenization uses the `tokenizers` package.
+
+Usage:
+  python scripts/model/onnx_backend.py bench [--n 2000] [--batch-size 64] [--backends torch onnx ...]
+"""
+
+import sys
+from pathlib import Path
+# Ensure project root is on sys.path so we can import our modules
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import argparse
+import json
+import time
+from typing import Dict, List
+
+import numpy as np
+
+
+BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+ONNX_FILES = {"onnx": "model.onnx", "onnx-int8": "model.int8.onnx"}
+OPSET = 17
+
+
+def _import_onnxruntime():
+    try:
+        import onnxruntime
+        from tokenizers import Tokenizer
+    except ImportError as e:
+        raise ImportError(
+            "The ONNX backend requires 'onnxruntime' and 'tokenizers' (pip install onnxruntime tokenizers)"
+        ) from e
+    return onnxruntime, Tokenizer
+
+
+def quantize_torch(model):
+    """
+    Dynamic int8 quantization of a SentenceTransformer's nn.Linear layers
+    (weights int8, activations quantized on the fly). CPU only.
+    """
+    import torch
+    return torch.ao.quantization.quantize_dynamic(model.to("cpu"), {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def export_onnx(st_model, out_dir, model_fp: str = None) -> Path:
+    """
+    Export a loaded SentenceTransformer to <out_dir>/model.onnx with dynamic
+    batch and sequence axes. The graph returns the final sentence embedding,
+    so pooling and normalization match the torch model whatever its modules.
+    model_fp (the exported model's fingerprint) is recorded in meta.json.
+    """
+    import torch
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    st_model = st_model.to("cpu").eval()
+    tokenizer = st_model.tokenizer
+    sample = tokenizer(["net sales", "total current assets"], padding=True, return_tensors="pt")
+    input_names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+
+    class _Encoder(torch.nn.Module):
+        def __init__(self, st):
+            super().__init__()
+            self.st = st
+
+        def forward(self, *inputs):
+            return self.st(dict(zip(input_names, inputs)))["sentence_embedding"]
+
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["sentence_embedding"] = {0: "batch"}
+    tmp = out_dir / ".model.onnx.tmp"
+    with torch.no_grad():
+        dim = _Encoder(st_model)(*(sample[name] for name in input_names)).shape[1]
+        torch.onnx.export(
+            _Encoder(st_model),
+            tuple(sample[name] for name in input_names),
+            str(tmp),
+            input_names=input_names,
+            output_names=["sentence_embedding"],
+            dynamic_axes=dynamic_axes,
+            opset_version=OPSET,
+            dynamo=False,
+        )
+    tmp.replace(out_dir / ONNX_FILES["onnx"])
+
+    tokenizer.backend_tokenizer.save(str(out_dir / "tokenizer.json"))
+    (out_dir / "meta.json").write_text(json.dumps({
+        "max_seq_length": int(st_model.max_seq_length),
+        "inputs": input_names,
+        "dim": int(dim),
+        "model_fp": model_fp,
+    }))
+    print(f"[onnx_backend] Exported ONNX model to {out_dir}")
+    return out_dir / ONNX_FILES["onnx"]
+
+
+def quantize_onnx(out_dir) -> Path:
+    """
+    Write <out_dir>/model.int8.onnx: dynamic int8 quantization of model.onnx.
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    out_dir = Path(out_dir)
+    target = out_dir / ONNX_FILES["onnx-int8"]
+    tmp = out_dir / ".model.int8.onnx.tmp"
+    quantize_dynamic(str(out_dir / ONNX_FILES["onnx"]), str(tmp), weight_type=QuantType.QInt8)
+    tmp.replace(target)
+    print(f"[onnx_backend] Quantized ONNX model written to {target}")
+    return target
+
+
+def export_fingerprint(out_dir):
+    """
+    Fingerprint of the model exported to out_dir (None if there is no
+    export, or it predates the fingerprint being recorded).
+    """
+    meta = Path(out_dir) / "meta.json"
+    if not (meta.exists() and (Path(out_dir) / ONNX_FILES["onnx"]).exists()):
+        return None
+    return json.loads(meta.read_text()).get("model_fp")
+
+
+def ensure_export(out_dir, backend: str, load_model, model_fp: str = None) -> Path:
+    """
+    Path of the ONNX file for `backend`, exporting (and quantizing) it first
+    if needed. `load_model` returns the SentenceTransformer to export and is
+    only called when no export of model `model_fp` exists yet.
+    """
+    out_dir = Path(out_dir)
+    path = out_dir / ONNX_FILES[backend]
+    fresh = export_fingerprint(out_dir) == model_fp
+    if path.exists() and fresh:
+        return path
+    if not fresh:
+        export_onnx(load_model(), out_dir, model_fp)
+    if backend == "onnx-int8":
+        quantize_onnx(out_dir)
+    return path
+
+
+class OnnxEncoder:
+    """
+    Sentence encoder running an exported model on ONNX Runtime (CPU).
+
+    - onnx_path: model.onnx or model.int8.onnx; tokenizer.json and meta.json
+                 are read from the same directory
+    - threads: intra-op threads (None = ONNX Runtime default, all cores)
+    """
+
+    def __init__(self, onnx_path, threads: int = None):
+        ort, Tokenizer = _import_onnxruntime()
+        onnx_path = Path(onnx_path)
+        meta = json.loads((onnx_path.parent / "meta.json").read_text())
+        self.inputs = meta["inputs"]
+        self.dim = meta["dim"]
+
+        self.tokenizer = Tokenizer.from_file(str(onnx_path.parent / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=meta["max_seq_length"])
+        self.tokenizer.enable_padding()
+
+        opts = ort.SessionOptions()
+        if threads:
+            opts.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(str(onnx_path), opts, providers=["CPUExecutionProvider"])
+
+    def encode(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        """
+        Encode texts into a float32 matrix (len(texts), dim). Texts are batched
+        by length, like sentence-transformers, to keep padding small.
+        """
+        texts = [str(t) for t in texts]
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        for start in range(0, len(texts), batch_size):
+            idx = order[start:start + batch_size]
+            enc = self.tokenizer.encode_batch([texts[i] for i in idx])
+            feeds = {
+                "input_ids": np.array([e.ids for e in enc], dtype=np.int64),
+                "attention_mask": np.array([e.attention_mask for e in enc], dtype=np.int64),
+                "token_type_ids": np.array([e.type_ids for e in enc], dtype=np.int64),
+            }
+            out[idx] = self.session.run(None, {name: feeds[name] for name in self.inputs})[0]
+        return out
+
+
+def parity(reference: np.ndarray, candidate: np.ndarray) -> Dict[str, float]:
+    """
+    Compare two embedding matrices row by row: cosine similarity (min/mean)
+    and the largest absolute difference.
+    """
+    ref = reference / np.maximum(np.linalg.norm(reference, axis=1, keepdims=True), 1e-12)
+    cand = candidate / np.maximum(np.linalg.norm(candidate, axis=1, keepdims=True), 1e-12)
+    cos = (ref * cand).sum(axis=1)
+    return {
+        "min_cosine": float(cos.min()),
+        "mean_cosine": float(cos.mean()),
+        "max_abs_diff": float(np.abs(reference - candidate).max()),
+    }
+
+
+def _sample_texts(n: int) -> List[str]:
+    """
+    Benchmark corpus: standard terms, mapped tags as words and, when
+    available, labels from the intermediate fact store.
+    """
+    from scripts.model.vector_index import vocabulary
+    texts = [item["text"] for item in vocabulary()]
+    return [texts[i % len(texts)] + ("" if i < len(texts) else f" {i}") for i in range(n)]
+
+
+def benchmark(backends=BACKENDS, n: int = 2000, batch_size: int = 64, model_dir: str = None) -> List[dict]:
+    """
+    Encode the same `n` texts with each backend, reporting throughput and
+    parity against the float32 torch embeddings. The embedding cache is
+    disabled so every text goes through the model.
+    """
+    from scripts.model.sbert_embedder import SBERTEmbedder
+
+    texts = _sample_texts(n)
+    reference = SBERTEmbedder(model_dir=model_dir, cache_dir=None, backend="torch").encode(texts, batch_size)
+
+    rows = []
+    for backend in backends:
+        embedder = SBERTEmbedder(model_dir=model_dir, cache_dir=None, backend=backend)
+        embedder.encode(texts[:batch_size], batch_size)  # warm-up
+        start = time.perf_counter()
+        emb = embedder.encode(texts, batch_size)
+        elapsed = time.perf_counter() - start
+        rows.append({"backend": backend, "seconds": elapsed, "texts_per_s": len(texts) / elapsed,
+                     **parity(reference, emb)})
+
+    print(f"\n{'backend':<12} {'texts/s':>10} {'speedup':>8} {'min cos':>9} {'mean cos':>9} {'max |Δ|':>9}")
+    base = next((r["texts_per_s"] for r in rows if r["backend"] == "torch"), rows[0]["texts_per_s"])
+    for r in rows:
+        print(f"{r['backend']:<12} {r['texts_per_s']:>10.0f} {r['texts_per_s'] / base:>7.2f}x "
+              f"{r['min_cosine']:>9.4f} {r['mean_cosine']:>9.4f} {r['max_abs_diff']:>9.4f}")
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the SBERT CPU inference backends.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("bench", help="Throughput and parity against torch float32")
+    b.add_argument("--n", type=int, default=2000, help="Texts to encode")
+    b.add_argument("--batch-size", type=int, default=64)
+    b.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    b.add_argument("--model-dir", default=None)
+    args = parser.parse_args()
+
+    benchmark(args.backends, n=args.n, batch_size=args.batch_size, model_dir=args.model_dir)
+
+
+if __name__ == "__main__":
+    main()
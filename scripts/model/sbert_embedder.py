@@ -1,9 +1,85 @@
 # scripts/model/sbert_embedder.py
 
-from sentence_transformers import SentenceTransformer, util
-import torch
+import hashlib
+import json
+import os
+import numpy as np
 from pathlib import Path
 
+from config.settings import EMBED_CACHE_DIR, MODEL_FP_CACHE, SBERT_BACKEND
+from scripts.model.embedding_cache import EmbeddingCache
+from scripts.model.onnx_backend import BACKENDS
+
+
+DEFAULT_HF_MODEL = 'all-MiniLM-L6-v2'
+
+_fingerprints = {}
+
+
+def _file_stats(model_dir: Path) -> list:
+    """
+    [relative path, size, mtime_ns] of every file in a model directory, sorted.
+    """
+    stats = []
+    for path in sorted(p for p in Path(model_dir).rglob('*') if p.is_file() and p.name != '.DS_Store'):
+        st = path.stat()
+        stats.append([str(path.relative_to(model_dir)), st.st_size, st.st_mtime_ns])
+    return stats
+
+
+def model_fingerprint(model_dir: Path = None, cache_path=MODEL_FP_CACHE) -> str:
+    """
+    Identify a model by content: the hash of every file in a local model
+    directory, or of the HuggingFace checkpoint name. Cached embeddings are
+    only reused for the exact same weights and tokenizer.
+
+    Hashing the weights is slow, so the digest is kept per process and in
+    `cache_path` (None disables it), and reused while every file's size and
+    mtime are unchanged.
+    """
+    if model_dir is None:
+        return hashlib.sha256(DEFAULT_HF_MODEL.encode()).hexdigest()[:16]
+
+    model_dir = Path(model_dir).resolve()
+    stats = _file_stats(model_dir)
+    key = (str(model_dir), json.dumps(stats))
+    if key in _fingerprints:
+        return _fingerprints[key]
+
+    cache = {}
+    if cache_path is not None and Path(cache_path).exists():
+        try:
+            cache = json.loads(Path(cache_path).read_text())
+        except ValueError:
+            cache = {}
+    rec = cache.get(str(model_dir))
+    if rec and rec.get('files') == stats:
+        _fingerprints[key] = rec['fingerprint']
+        return rec['fingerprint']
+
+    h = hashlib.sha256()
+    for rel, _, _ in stats:
+        h.update(rel.encode())
+        with (model_dir / rel).open('rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+    fingerprint = h.hexdigest()[:16]
+    _fingerprints[key] = fingerprint
+
+    if cache_path is not None:
+        cache[str(model_dir)] = {'files': stats, 'fingerprint': fingerprint}
+        cache_path = Path(cache_path)
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cache_path.with_name(f".{cache_path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(cache))
+        tmp.replace(cache_path)
+    return fingerprint
+
+
+class _CacheSwitched(Exception):
+    """Raised when a lazy model load fell back to another model mid-encode."""
+
+
 class SBERTEmbedder:
     """
     A simple SBERT wrapper to encode terms and perform semantic matching.
@@ -11,30 +87,161 @@ class SBERTEmbedder:
     - model_dir: directory containing a fine-tuned SBERT model,
                  or None to attempt loading a local ./models/sbert_trained folder,
                  or fallback to a pretrained HuggingFace checkpoint.
+    - cache_dir: root of the persistent embedding cache (None disables it)
+    - backend: 'torch' (float32), 'torch-int8', 'onnx' or 'onnx-int8'
+               (see scripts/model/onnx_backend.py); quantized backends get
+               their own embedding cache
+
+    Nothing heavy happens at construction: torch / sentence-transformers (or
+    ONNX Runtime) are imported and the model is loaded on the first encode
+    that misses the embedding cache.
     """
-    def __init__(self, model_dir: str = None):
+    def __init__(self, model_dir: str = None, cache_dir: str = EMBED_CACHE_DIR,
+                 backend: str = SBERT_BACKEND):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown SBERT backend '{backend}', expected one of {BACKENDS}")
+        self.backend = backend
+
         # Determine default local path: project_root/models/sbert_trained
         default_dir = Path(__file__).resolve().parents[1].parent / 'models' / 'sbert_trained'
         chosen_dir = Path(model_dir) if model_dir else default_dir
         print(f"[SBERTEmbedder] Project root: {default_dir.parent}")
         print(f"[SBERTEmbedder] Trying to load from: {chosen_dir}")
 
-        # Attempt to load local model
+        self._chosen_dir = chosen_dir
+        self._model = None
+        self._onnx = None
+        local_dir = chosen_dir if (chosen_dir / 'config.json').exists() else None
+        self._set_fingerprint(model_fingerprint(local_dir), cache_dir)
+
+    def _set_fingerprint(self, model_fp: str, cache_dir) -> None:
+        # float32 torch keeps the bare model fingerprint so existing caches stay valid
+        self._model_fp = model_fp
+        self._cache_dir = cache_dir
+        self.fingerprint = model_fp if self.backend == 'torch' else f"{model_fp}-{self.backend}"
+        self.cache = EmbeddingCache(cache_dir, self.fingerprint) if cache_dir else None
+
+    @property
+    def model(self):
+        """
+        The SentenceTransformer (torch backends), loaded on first access.
+        """
+        if self._model is None and not self.backend.startswith('onnx'):
+            import torch
+            from scripts.model.onnx_backend import quantize_torch
+
+            model, loaded_dir = self._load_model(self._chosen_dir)
+            if model_fingerprint(loaded_dir) != self._model_fp:
+                # fell back to the HF model: keep its embeddings apart
+                self._set_fingerprint(model_fingerprint(loaded_dir), self._cache_dir)
+            if self.backend == 'torch-int8':
+                model = quantize_torch(model)
+                print("[SBERTEmbedder] Using int8 dynamic quantization")
+            elif torch.cuda.is_available():
+                # Move to GPU if available
+                model = model.to('cuda')
+            self._model = model
+        return self._model
+
+    def _onnx_encoder(self):
+        """
+        The ONNX Runtime encoder, exporting the model on first use if needed.
+        """
+        if self._onnx is None:
+            from config.settings import ONNX_EXPORT_DIR
+            from scripts.model.onnx_backend import OnnxEncoder, ensure_export, export_fingerprint
+
+            export_root = Path(ONNX_EXPORT_DIR)
+            fallback = export_root / self._model_fp / 'fallback.json'
+            if fallback.exists():
+                # the local model failed to load when it was exported
+                self._set_fingerprint(json.loads(fallback.read_text())['model_fp'], self._cache_dir)
+
+            load = lambda: self._load_model(self._chosen_dir)[0]
+            if export_fingerprint(export_root / self._model_fp) != self._model_fp:
+                # exporting needs the torch model, which may fall back to the HF model:
+                # export and cache its embeddings under its own fingerprint
+                model, loaded_dir = self._load_model(self._chosen_dir)
+                load = lambda: model
+                loaded_fp = model_fingerprint(loaded_dir)
+                if loaded_fp != self._model_fp:
+                    fallback.parent.mkdir(parents=True, exist_ok=True)
+                    fallback.write_text(json.dumps({'model_fp': loaded_fp}))
+                    self._set_fingerprint(loaded_fp, self._cache_dir)
+
+            onnx_path = ensure_export(export_root / self._model_fp, self.backend, load, self._model_fp)
+            self._onnx = OnnxEncoder(onnx_path)
+            print(f"[SBERTEmbedder] Using ONNX Runtime backend: {onnx_path}")
+        return self._onnx
+
+    def load(self) -> "SBERTEmbedder":
+        """
+        Load the model now rather than on first use (for long-lived processes).
+        """
+        if self.backend.startswith('onnx'):
+            self._onnx_encoder()
+        else:
+            self.model
+        return self
+
+    @staticmethod
+    def _load_model(chosen_dir: Path):
+        """
+        Load the local model from `chosen_dir`, or the default HF model.
+
+        returns: (SentenceTransformer, local dir it was loaded from or None)
+        """
+        from sentence_transformers import SentenceTransformer
+
         if chosen_dir.exists() and (chosen_dir / 'config.json').exists():
             try:
-                self.model = SentenceTransformer(str(chosen_dir))
+                model = SentenceTransformer(str(chosen_dir))
                 print(f"[SBERTEmbedder] Loaded local model from {chosen_dir}")
+                return model, chosen_dir
             except Exception as e:
                 print(f"[SBERTEmbedder] Failed to load local model: {e}")
                 print("[SBERTEmbedder] Falling back to default HF model")
-                self.model = SentenceTransformer('all-MiniLM-L6-v2')
         else:
             print("[SBERTEmbedder] Local model not found or missing config.json. Using default HF model")
-            self.model = SentenceTransformer('all-MiniLM-L6-v2')
+        return SentenceTransformer(DEFAULT_HF_MODEL), None
 
-        # Move to GPU if available
-        if torch.cuda.is_available():
-            self.model = self.model.to('cuda')
+    def encode(self, texts: list[str], batch_size: int = 64):
+        """
+        Encode texts into a float32 numpy matrix (len(texts), dim). With the
+        cache enabled only texts never seen before reach the model.
+        """
+        def _encode(batch):
+            if self.backend.startswith('onnx'):
+                encoder = self._onnx_encoder()
+                if self.cache is not cache:
+                    raise _CacheSwitched()
+                return encoder.encode(batch, batch_size=batch_size)
+            model = self.model
+            if self.cache is not cache:
+                raise _CacheSwitched()
+            return model.encode(
+                batch,
+                batch_size=batch_size,
+                convert_to_numpy=True,
+                show_progress_bar=False
+            )
+
+        cache = self.cache
+        if cache is None:
+            return _encode(list(texts))
+        try:
+            return cache.encode(texts, _encode)
+        except _CacheSwitched:
+            # the local model failed to load; redo the lookup in the fallback model's cache
+            return self.encode(texts, batch_size)
+
+    def cache_stats(self) -> dict:
+        """
+        Hit/miss counters of the embedding cache (empty if disabled).
+        """
+        if self.cache is None:
+            return {}
+        return {**self.cache.stats, "hit_rate": self.cache.hit_rate, "entries": len(self.cache)}
 
     def encode_terms(self, terms: list[str]):
         """
@@ -42,11 +249,9 @@ class SBERTEmbedder:
 
         returns: Tensor shape (len(terms), dim)
         """
-        return self.model.encode(
-            terms,
-            convert_to_tensor=True,
-            show_progress_bar=False
-        )
+        import torch
+        embeds = torch.from_numpy(self.encode(terms))
+        return embeds if self.backend.startswith('onnx') else embeds.to(self.model.device)
 
     def semantic_match(
         self,
@@ -60,8 +265,53 @@ class SBERTEmbedder:
 
         returns: (best_term, cosine_score)
         """
-        cand_embed = self.model.encode(label, convert_to_tensor=True)
+        import torch
+        from sentence_transformers import util
+
+        cand_embed = torch.from_numpy(self.encode([label])[0]).to(std_embeds.device)
         cos_scores = util.cos_sim(cand_embed, std_embeds)[0]
         best_idx = int(torch.argmax(cos_scores))
         best_score = float(cos_scores[best_idx])
         return terms_list[best_idx], best_score
+
+    def semantic_match_batch(
+        self,
+        labels: list[str],
+        std_embeds,
+        terms_list: list[str],
+        top_k: int = 1,
+        batch_size: int = 256
+    ) -> list[list[tuple[str, float]]]:
+        """
+        Batched semantic_match: encode `labels` in chunks of `batch_size` and
+        score each chunk against all standard terms with one matrix multiply
+        (numpy/BLAS on CPU, no per-label forward pass or cos_sim call).
+
+        returns: for each label, its top_k (term, cosine_score) pairs, best first
+        """
+        std = std_embeds.detach().cpu().numpy() if hasattr(std_embeds, 'detach') else np.asarray(std_embeds)
+        std = std.astype(np.float32, copy=False)
+        std = std / np.maximum(np.linalg.norm(std, axis=1, keepdims=True), 1e-12)
+        k = max(1, min(top_k, len(terms_list)))
+
+        results = []
+        for start in range(0, len(labels), batch_size):
+            emb = self.encode(labels[start:start + batch_size], batch_size=batch_size)
+            emb = emb / np.maximum(np.linalg.norm(emb, axis=1, keepdims=True), 1e-12)
+            scores = emb @ std.T
+
+            if k == 1:
+                # argmax keeps the first best term on ties, like semantic_match
+                top = scores.argmax(axis=1)[:, None]
+            elif k < scores.shape[1]:
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            else:
+                top = np.tile(np.arange(scores.shape[1]), (len(scores), 1))
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind='stable')
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+            for idx_row, score_row in zip(top, top_scores):
+                results.append([(terms_list[i], float(sc)) for i, sc in zip(idx_row, score_row)])
+        return results
@@ -2,8 +2,14 @@
 
 import json
 from pathlib import Path
+import numpy as np
 import pandas as pd
-from rapidfuzz import fuzz
+from rapidfuzz import fuzz, process
+
+def _strip_namespace(tag) -> str:
+    """'us-gaap:Revenues' -> 'Revenues' (unqualified tags pass through)."""
+    return str(tag).split(':', 1)[-1]
+
 
 class TagMatchEngine:
     """
@@ -12,7 +18,12 @@ class TagMatchEngine:
     time series entries for reporting periods.
     """
 
-    def __init__(self, mapping_path: str):
+    def __init__(self, mapping_path: str, fuzzy_threshold: int = 80, workers: int = -1):
+        """
+        - mapping_path: standard_to_usgaap_mapping.json
+        - fuzzy_threshold: minimum fuzz.ratio (0-100) for the fuzzy fallbacks
+        - workers: threads used for fuzzy score matrices (-1 = all cores)
+        """
         mapping_file = Path(mapping_path)
         if not mapping_file.exists():
             raise FileNotFoundError(f"Mapping file not found: {mapping_path}")
@@ -27,12 +38,78 @@ class TagMatchEngine:
             for std_term, tags in section.items():
                 self.mapping[std_term] = tags
 
+        self.fuzzy_threshold = fuzzy_threshold
+        self.workers = workers
+
+        # Fuzzy choice lists: every mapped tag (one contiguous column slice
+        # per standard term) and every standard term's lowercase name
+        self._tag_choices = []
+        self._tag_slices = {}
+        for std_term, tags in self.mapping.items():
+            start = len(self._tag_choices)
+            self._tag_choices += [tag.replace(':', ' ') for tag in tags]
+            self._tag_slices[std_term] = slice(start, len(self._tag_choices))
+        self._label_choices = [std_term.lower() for std_term in self.mapping]
+        self._label_cols = {std_term: i for i, std_term in enumerate(self.mapping)}
+        self._tag_choice_terms = np.zeros(len(self._tag_choices), dtype=np.int64)
+        for term_pos, std_term in enumerate(self.mapping):
+            self._tag_choice_terms[self._tag_slices[std_term]] = term_pos
+
+        # Inverted index for match_all: unqualified tag -> positions of the
+        # standard terms it maps to (a tag may serve several terms)
+        self._terms = list(self.mapping)
+        self.tag_index = {}
+        for term_pos, tags in enumerate(self.mapping.values()):
+            for tag in dict.fromkeys(_strip_namespace(t) for t in tags):
+                self.tag_index.setdefault(tag, []).append(term_pos)
+
+    def _score_unique(self, df: pd.DataFrame, column: str, choices: list):
+        """
+        Score every distinct value of `column` against all `choices` in one
+        batched fuzz.ratio matrix (scores below the threshold become 0).
+
+        Returns (scores, first_rows): scores[i, j] for the i-th distinct value
+        in order of first appearance, and the row position where it first occurs.
+        """
+        values = df[column] if column in df.columns else pd.Series('', index=df.index)
+        codes, uniques = pd.factorize(values.astype(str), use_na_sentinel=False)
+        _, first_rows = np.unique(codes, return_index=True)
+        scores = process.cdist(
+            list(uniques),
+            choices,
+            scorer=fuzz.ratio,
+            score_cutoff=self.fuzzy_threshold,
+            dtype=np.float64,
+            workers=self.workers,
+        )
+        return scores, first_rows
+
+    @staticmethod
+    def _best_row(df: pd.DataFrame, scores: np.ndarray, first_rows: np.ndarray):
+        """
+        Pick the earliest row holding the highest score, as a row-by-row scan
+        with a strict '>' would. Returns (best_score, row) or (0, None).
+        """
+        if scores.size == 0:
+            return 0, None
+        per_value = scores.max(axis=1)
+        best = int(np.argmax(per_value))
+        best_score = per_value[best]
+        if best_score <= 0:
+            return 0, None
+        return best_score, df.iloc[int(first_rows[best])]
+
     def match(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         Match cleaned DataFrame rows to each standard term.
         Returns a DataFrame with one row per standard term: the best match.
+
+        The fuzzy fallbacks score distinct tag_clean/label_clean values once
+        (batched across all terms), so their cost scales with the number of
+        unique tags and labels rather than the number of rows.
         """
         results = []
+        tag_scores = label_scores = None
 
         for std_term, tags in self.mapping.items():
             # 1) Direct tag match
@@ -55,16 +132,11 @@ class TagMatchEngine:
                 continue
 
             # 2) Fuzzy match on 'tag_clean'
-            best_score = 0
-            best_row = None
-            for _, row in df.iterrows():
-                for tag in tags:
-                    score = fuzz.ratio(row.get('tag_clean', ''), tag.replace(':', ' '))
-                    if score > best_score:
-                        best_score = score
-                        best_row = row
-
-            if best_score >= 80 and best_row is not None:
+            if tag_scores is None:
+                tag_scores, tag_first = self._score_unique(df, 'tag_clean', self._tag_choices)
+            best_score, best_row = self._best_row(df, tag_scores[:, self._tag_slices[std_term]], tag_first)
+
+            if best_score >= self.fuzzy_threshold and best_row is not None:
                 results.append({
                     'standard_term': std_term,
                     'value': best_row['value'],
@@ -80,15 +152,12 @@ class TagMatchEngine:
                 continue
 
             # 3) Fuzzy match on 'label_clean'
-            best_score = 0
-            best_row = None
-            for _, row in df.iterrows():
-                score = fuzz.ratio(row.get('label_clean', ''), std_term.lower())
-                if score > best_score:
-                    best_score = score
-                    best_row = row
-
-            if best_score >= 80 and best_row is not None:
+            if label_scores is None:
+                label_scores, label_first = self._score_unique(df, 'label_clean', self._label_choices)
+            col = self._label_cols[std_term]
+            best_score, best_row = self._best_row(df, label_scores[:, col:col + 1], label_first)
+
+            if best_score >= self.fuzzy_threshold and best_row is not None:
                 results.append({
                     'standard_term': std_term,
                     'value': best_row['value'],
@@ -118,24 +187,81 @@ class TagMatchEngine:
 
         return pd.DataFrame(results)
 
+    def match_pairs(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Resolve every row of a cleaned (tag, tag_clean, label_clean) frame to
+        one standard term: direct tag lookup, else the best fuzzy tag score,
+        else the best fuzzy label score (same threshold as match()).
+
+        Returns a frame aligned with df's index: standard_term (None if
+        unmatched), match_method ('direct', 'fuzzy_tag', 'fuzzy_label' or
+        'none') and confidence (0-1).
+        """
+        n = len(df)
+        terms = np.full(n, None, dtype=object)
+        methods = np.full(n, 'none', dtype=object)
+        confidence = np.zeros(n)
+        term_names = np.asarray(self._terms, dtype=object)
+
+        # 1) Direct tag match (first term the tag is mapped to)
+        for i, tag in enumerate(df['tag']):
+            positions = self.tag_index.get(_strip_namespace(tag))
+            if positions:
+                terms[i], methods[i], confidence[i] = self._terms[positions[0]], 'direct', 1.0
+
+        # 2) Fuzzy tag, then 3) fuzzy label, on the rows still unmatched
+        for column, choices, choice_terms, method in (
+            ('tag_clean', self._tag_choices, self._tag_choice_terms, 'fuzzy_tag'),
+            ('label_clean', self._label_choices, np.arange(len(self._terms)), 'fuzzy_label'),
+        ):
+            todo = np.flatnonzero(methods == 'none')
+            if todo.size == 0 or not choices or column not in df.columns:
+                continue
+            codes, uniques = pd.factorize(df[column].iloc[todo].astype(str), use_na_sentinel=False)
+            scores = process.cdist(
+                list(uniques),
+                choices,
+                scorer=fuzz.ratio,
+                score_cutoff=self.fuzzy_threshold,
+                dtype=np.float64,
+                workers=self.workers,
+            )
+            best = scores.argmax(axis=1)
+            best_score = scores[np.arange(len(uniques)), best]
+            ok = (best_score[codes] > 0) & (best_score[codes] >= self.fuzzy_threshold)
+            rows = todo[ok]
+            terms[rows] = term_names[choice_terms[best[codes[ok]]]]
+            methods[rows] = method
+            confidence[rows] = best_score[codes[ok]] / 100
+
+        return pd.DataFrame({'standard_term': terms, 'match_method': methods, 'confidence': confidence},
+                            index=df.index)
+
     def match_all(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         Preserve all matched rows for each standard term, emitting one entry per period.
         Returns a DataFrame with original metadata plus 'standard_term'.
+
+        Implemented as one hash join of the frame's (factorized) tags against
+        the tag → standard_term index built in __init__. Tags match with or
+        without the 'us-gaap:' prefix, and a tag mapped to several terms
+        yields one row per term. Rows are ordered by term (mapping order),
+        then by their position in `df`.
         """
-        records = []
-        for std_term, tags in self.mapping.items():
-            # Select rows where the tag matches any of the mapped US GAAP tags
-            df_term = df[df['tag'].isin(tags)].copy()
-            if df_term.empty:
-                continue
-            # Assign the standard term to each row
-            df_term['standard_term'] = std_term
-            records.append(df_term)
-        # Combine all records, or return empty DataFrame
-        if records:
-            return pd.concat(records, ignore_index=True)
-        else:
-            # Return empty frame with columns including standard_term
-            cols = list(df.columns) + ['standard_term']
-            return pd.DataFrame(columns=cols)
\ No newline at end of file
+        codes, uniques = pd.factorize(df['tag'])
+
+        # Explode each distinct tag into the terms it belongs to
+        tag_codes, term_pos = [], []
+        for code, tag in enumerate(uniques):
+            for pos in self.tag_index.get(_strip_namespace(tag), ()):
+                tag_codes.append(code)
+                term_pos.append(pos)
+
+        left = pd.DataFrame({'_code': codes, '_row': np.arange(len(df))})
+        right = pd.DataFrame({'_code': np.asarray(tag_codes, dtype=codes.dtype),
+                              '_term': np.asarray(term_pos, dtype=np.int64)})
+        joined = left.merge(right, on='_code', how='inner').sort_values(['_term', '_row'], kind='stable')
+
+        out = df.iloc[joined['_row'].to_numpy()].reset_index(drop=True)
+        out['standard_term'] = np.asarray(self._terms, dtype=object)[joined['_term'].to_numpy()]
+        return out
@@ -0,0 +1,372 @@
+# scripts/model/vector_index.py
+
+"""
+Approximate nearest-neighbour (ANN) index over the mapping vocabulary.
+
+The index holds embeddings of every standard term, every mapped US-GAAP tag
+(as words: 'CostOfRevenue' -> 'cost of revenue') and every tag label seen in
+the intermediate fact store. Each entry carries the standard term it maps to
+(None for labels of unmapped tags), so a nearest-neighbour lookup on a new
+label resolves directly to a standard term.
+
+It is an IVF-flat index: spherical k-means splits the vectors into n_lists
+clusters stored contiguously, and a query only scans the `nprobe` clusters
+whose centroids are closest. Built offline, loaded with np.load(mmap_mode='r'),
+and extended in place: add() appends to a small delta segment that is scanned
+exactly until the next rebuild.
+
+The index also records a digest of the mapping's standard terms. A term
+renamed or removed after the build makes the index stale: callers compare
+index.mapping_digest with mapping_digest() of their mapping and ignore the
+index until it is rebuilt. Tags added to existing terms do not change the
+digest (extend_mapping inserts them with add()).
+
+Layout of <index_dir>/:
+  - meta.json                  dim, n_lists, model fingerprint, mapping digest
+  - centroids.npy              (n_lists, dim) float32
+  - vectors.npy                (n, dim) float32, rows grouped by list
+  - offsets.npy                (n_lists + 1,) int64, list i = rows offsets[i]:offsets[i+1]
+  - items.jsonl                one metadata dict per row of vectors.npy
+  - delta.f32 / delta.jsonl    rows added since the last build
+
+Usage:
+  python scripts/model/vector_index.py build [--n-lists N]
+  python scripts/model/vector_index.py query "<label>" [-k 5]
+"""
+
+import sys
+from pathlib import Path
+# Ensure project root is on sys.path so we can import our modules
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import argparse
+import hashlib
+import json
+import re
+import time
+from typing import List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-writer use only
+    fcntl = None
+
+from config.settings import MAPPING_PATH, VECTOR_INDEX_DIR
+
+
+def _normalize_rows(x: np.ndarray) -> np.ndarray:
+    x = np.asarray(x, dtype=np.float32)
+    if x.ndim == 1:
+        x = x[None, :]
+    return x / np.maximum(np.linalg.norm(x, axis=1, keepdims=True), 1e-12)
+
+
+def humanize_tag(tag: str) -> str:
+    """
+    'us-gaap:CostOfGoodsAndServicesSold' -> 'cost of goods and services sold'
+    """
+    bare = tag.split(':', 1)[-1]
+    return " ".join(re.findall(r"[A-Z]+(?=[A-Z][a-z]|\b|\d)|[A-Z]?[a-z]+|\d+", bare)).lower()
+
+
+def mapping_digest(mapping_data: dict) -> str:
+    """
+    Digest of the mapping's (section, standard term) pairs, in order.
+    """
+    terms = [[section, term] for section, section_terms in mapping_data.items() for term in section_terms]
+    return hashlib.sha256(json.dumps(terms).encode("utf-8")).hexdigest()[:16]
+
+
+def _spherical_kmeans(x: np.ndarray, n_lists: int, iters: int = 10, seed: int = 0,
+                      chunk: int = 8_192):
+    """
+    Cluster unit vectors by cosine similarity. Returns (centroids, assignment).
+    """
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), n_lists, replace=False)].copy()
+    assign = np.zeros(len(x), dtype=np.int64)
+    lists = np.arange(n_lists)
+    for _ in range(iters):
+        sums = np.zeros_like(centroids)
+        for start in range(0, len(x), chunk):
+            block = x[start:start + chunk]
+            assign[start:start + chunk] = np.argmax(block @ centroids.T, axis=1)
+            # per-cluster sums as a (one-hot)^T @ block matrix product
+            one_hot = (assign[start:start + chunk, None] == lists).astype(np.float32)
+            sums += one_hot.T @ block
+        nonempty = np.bincount(assign, minlength=n_lists) > 0
+        centroids[nonempty] = _normalize_rows(sums[nonempty])
+    return centroids, assign
+
+
+class VectorIndex:
+    """
+    IVF-flat cosine index with memory-mapped storage and incremental inserts
+    (see module docstring for the on-disk layout).
+    """
+
+    def __init__(self, index_dir):
+        self.dir = Path(index_dir)
+        meta = json.loads((self.dir / "meta.json").read_text())
+        self.dim = meta["dim"]
+        self.fingerprint = meta.get("fingerprint")
+        self.mapping_digest = meta.get("mapping_digest")
+        self.centroids = np.load(self.dir / "centroids.npy")
+        self.vectors = np.load(self.dir / "vectors.npy", mmap_mode="r")
+        self.offsets = np.load(self.dir / "offsets.npy")
+        with (self.dir / "items.jsonl").open(encoding="utf-8") as f:
+            self.items = [json.loads(line) for line in f]
+
+        self._delta_items = []
+        self._delta = np.empty((0, self.dim), dtype=np.float32)
+        self._delta_offset = 0
+        self._refresh_delta()
+
+    # ── build / load ─────────────────────────────────────────────────────
+    @classmethod
+    def build(cls, index_dir, vectors: np.ndarray, items: List[dict],
+              n_lists: int = None, fingerprint: str = None,
+              mapping_digest: str = None,
+              iters: int = 10, seed: int = 0) -> "VectorIndex":
+        """
+        Build an index from scratch, replacing any index in `index_dir`.
+        n_lists defaults to ~sqrt(n) clusters; fingerprint and mapping_digest
+        identify the model and the mapping the vectors came from.
+        """
+        x = _normalize_rows(vectors)
+        if len(x) != len(items):
+            raise ValueError("build expects one item per vector")
+        if len(x) == 0:
+            raise ValueError("Cannot build an index without vectors")
+        n_lists = int(n_lists or max(1, round(np.sqrt(len(x)))))
+        n_lists = min(n_lists, len(x))
+
+        centroids, assign = _spherical_kmeans(x, n_lists, iters=iters, seed=seed)
+        order = np.argsort(assign, kind="stable")
+        offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assign, minlength=n_lists))
+
+        out = Path(index_dir)
+        out.mkdir(parents=True, exist_ok=True)
+        np.save(out / "centroids.npy", centroids.astype(np.float32))
+        np.save(out / "vectors.npy", x[order])
+        np.save(out / "offsets.npy", offsets)
+        with (out / "items.jsonl").open("w", encoding="utf-8") as f:
+            for i in order:
+                f.write(json.dumps(items[i]) + "\n")
+        for name in ("delta.f32", "delta.jsonl"):
+            (out / name).unlink(missing_ok=True)
+        (out / "meta.json").write_text(json.dumps({
+            "dim": int(x.shape[1]),
+            "n_lists": n_lists,
+            "size": len(x),
+            "fingerprint": fingerprint,
+            "mapping_digest": mapping_digest,
+        }))
+        return cls(out)
+
+    @classmethod
+    def load(cls, index_dir=VECTOR_INDEX_DIR) -> Optional["VectorIndex"]:
+        """
+        Open a built index, or return None if `index_dir` holds none.
+        """
+        if not (Path(index_dir) / "meta.json").exists():
+            return None
+        return cls(index_dir)
+
+    def __len__(self) -> int:
+        return len(self.items) + len(self._delta_items)
+
+    # ── incremental inserts ──────────────────────────────────────────────
+    def _refresh_delta(self) -> None:
+        """
+        Load delta rows appended since the last look (possibly by another process).
+        """
+        items_path = self.dir / "delta.jsonl"
+        if not items_path.exists():
+            return
+        with items_path.open(encoding="utf-8") as f:
+            f.seek(self._delta_offset)
+            new_items = []
+            while True:
+                line = f.readline()
+                if not line.endswith("\n"):
+                    break
+                new_items.append(json.loads(line))
+                self._delta_offset = f.tell()
+        if not new_items:
+            return
+        n_total = len(self._delta_items) + len(new_items)
+        data = np.fromfile(self.dir / "delta.f32", dtype=np.float32, count=n_total * self.dim)
+        self._delta = data.reshape(n_total, self.dim)
+        self._delta_items.extend(new_items)
+
+    def add(self, vectors: np.ndarray, items: List[dict]) -> None:
+        """
+        Insert new entries. They are searched exactly (not clustered) until
+        the index is rebuilt.
+        """
+        x = _normalize_rows(vectors)
+        if len(x) != len(items):
+            raise ValueError("add expects one item per vector")
+        if len(x) == 0:
+            return
+        if x.shape[1] != self.dim:
+            raise ValueError(f"Vector dim {x.shape[1]} != index dim {self.dim}")
+
+        with (self.dir / ".lock").open("w") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            self._refresh_delta()
+            with (self.dir / "delta.f32").open("ab") as f:
+                f.truncate(len(self._delta_items) * self.dim * 4)
+                f.write(x.tobytes())
+            with (self.dir / "delta.jsonl").open("a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(item) + "\n" for item in items))
+            self._refresh_delta()
+
+    # ── search ───────────────────────────────────────────────────────────
+    def search(self, queries: np.ndarray, k: int = 5, nprobe: int = 8) -> List[List[tuple]]:
+        """
+        Top-k neighbours by cosine similarity for each query vector.
+
+        returns: per query, a list of (item, score) pairs, best first
+        """
+        q = _normalize_rows(queries)
+        self._refresh_delta()
+        n_lists = len(self.centroids)
+        nprobe = max(1, min(nprobe, n_lists))
+
+        centroid_scores = q @ self.centroids.T
+        if nprobe < n_lists:
+            probes = np.argpartition(-centroid_scores, nprobe - 1, axis=1)[:, :nprobe]
+        else:
+            probes = np.tile(np.arange(n_lists), (len(q), 1))
+        delta_scores = q @ self._delta.T if len(self._delta_items) else None
+
+        results = []
+        for qi in range(len(q)):
+            ids, blocks = [], []
+            for lst in probes[qi]:
+                a, b = int(self.offsets[lst]), int(self.offsets[lst + 1])
+                if b > a:
+                    ids.append(np.arange(a, b))
+                    blocks.append(self.vectors[a:b])
+            ids = np.concatenate(ids) if ids else np.empty(0, dtype=np.int64)
+            scores = np.concatenate(blocks) @ q[qi] if blocks else np.empty(0, dtype=np.float32)
+            if delta_scores is not None:
+                ids = np.concatenate([ids, len(self.items) + np.arange(len(self._delta_items))])
+                scores = np.concatenate([scores, delta_scores[qi]])
+
+            top = min(k, len(scores))
+            if top == 0:
+                results.append([])
+                continue
+            best = np.argpartition(-scores, top - 1)[:top]
+            best = best[np.argsort(-scores[best], kind="stable")]
+            results.append([(self._item(int(ids[i])), float(scores[i])) for i in best])
+        return results
+
+    def _item(self, row: int) -> dict:
+        if row < len(self.items):
+            return self.items[row]
+        return self._delta_items[row - len(self.items)]
+
+    def nearest_terms(self, queries: np.ndarray, k: int = 5, nprobe: int = 8) -> List[tuple]:
+        """
+        For each query, the standard term of its closest neighbour that maps
+        to one, with that neighbour's score; (None, 0.0) if none of the top-k do.
+        """
+        out = []
+        for hits in self.search(queries, k=k, nprobe=nprobe):
+            best = next(((item["standard_term"], score) for item, score in hits
+                         if item.get("standard_term")), (None, 0.0))
+            out.append(best)
+        return out
+
+
+def vocabulary(mapping_path=MAPPING_PATH, include_seen_labels: bool = True) -> List[dict]:
+    """
+    Entries to index: standard terms, mapped tags (as words) and, if the
+    Parquet fact store is available, every distinct label seen so far.
+    """
+    mapping_data = json.loads(Path(mapping_path).read_text())
+    items, seen = [], set()
+    tag_to_term = {}
+
+    def _add(text, standard_term, kind, tag=None):
+        key = (text, standard_term)
+        if text and key not in seen:
+            seen.add(key)
+            items.append({"text": text, "standard_term": standard_term, "kind": kind, "tag": tag})
+
+    for section in mapping_data.values():
+        for std_term, tags in section.items():
+            _add(std_term, std_term, "term")
+            for tag in tags:
+                bare = tag.split(':', 1)[-1]
+                tag_to_term.setdefault(bare, std_term)
+                _add(humanize_tag(tag), std_term, "tag", bare)
+
+    if include_seen_labels:
+        try:
+            from scripts.store.intermediate_store import scan_facts
+            labels = scan_facts(columns=["tag", "label"]).astype(str).drop_duplicates()
+        except (ImportError, FileNotFoundError, OSError) as e:
+            print(f"[vector_index] Skipping seen labels: {e}")
+        else:
+            for tag, label in labels.itertuples(index=False):
+                _add(label, tag_to_term.get(tag), "label", tag)
+    return items
+
+
+def build_index(embedder=None, mapping_path=MAPPING_PATH, index_dir=VECTOR_INDEX_DIR,
+                n_lists: int = None, include_seen_labels: bool = True) -> VectorIndex:
+    """
+    Embed the mapping vocabulary and build the on-disk index (offline step).
+    """
+    if embedder is None:
+        from scripts.model.sbert_embedder import SBERTEmbedder
+        embedder = SBERTEmbedder()
+    items = vocabulary(mapping_path, include_seen_labels)
+    vectors = embedder.encode([item["text"] for item in items])
+    return VectorIndex.build(index_dir, vectors, items, n_lists=n_lists,
+                             fingerprint=getattr(embedder, "fingerprint", None),
+                             mapping_digest=mapping_digest(json.loads(Path(mapping_path).read_text())))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build or query the ANN index of the mapping vocabulary.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="Embed the vocabulary and (re)build the index")
+    b.add_argument("--n-lists", type=int, default=None, help="IVF clusters (default ~sqrt(n))")
+    b.add_argument("--no-labels", action="store_true", help="Skip labels from the fact store")
+    q = sub.add_parser("query", help="Nearest neighbours of a label")
+    q.add_argument("text")
+    q.add_argument("-k", type=int, default=5)
+    q.add_argument("--nprobe", type=int, default=8)
+    args = parser.parse_args()
+
+    if args.cmd == "build":
+        index = build_index(n_lists=args.n_lists, include_seen_labels=not args.no_labels)
+        print(f"Index built at {index.dir}: {len(index)} entries, {len(index.centroids)} lists")
+        return
+
+    index = VectorIndex.load()
+    if index is None:
+        print(f"❌ No index at {VECTOR_INDEX_DIR}; run 'build' first")
+        sys.exit(1)
+    from scripts.model.sbert_embedder import SBERTEmbedder
+    vec = SBERTEmbedder().encode([args.text])
+    start = time.perf_counter()
+    hits = index.search(vec, k=args.k, nprobe=args.nprobe)[0]
+    elapsed = (time.perf_counter() - start) * 1000
+    for item, score in hits:
+        print(f"{score:.3f}  {item['text']:<60} → {item['standard_term']}  ({item['kind']})")
+    print(f"Search took {elapsed:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,7 +8,14 @@ This script orchestrates the full end-to-end flow:
 1. Extraction:   scripts/extract/parse_sec_json.py
 2. Cleaning:     scripts/clean/preprocess_terms.py
 3. Matching:     scripts/model/tag_match_engine.py
-4. Saving:       scripts/store/save_results.py
+4. Saving:       scripts/store/save_results.py (Excel, or Parquet/CSV with
+                 ``--output-format``)
+5. Panel:        scripts/store/panel_store.py (cross-company dataset)
+
+Run a single company with ``--cik``, or a batch with ``--ciks``, ``--glob``
+or ``--manifest``; batches fan out over a process pool (``--workers``).
+With ``--zip`` the raw facts are read straight from the SEC's bulk
+companyfacts.zip instead of data/raw (``--glob`` then matches member names).
 """
 
 # scripts/pipeline.py
@@ -20,77 +27,413 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
 # 2) Now you can safely import anything from scripts/
-from scripts.store.log_qc_results import report_missing
-
 import argparse
+import logging
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+
+from config.settings import (
+    RAW_DIR, PROCESSED_DIR, MAPPING_PATH, INTERMEDIATE_FORMAT, OUTPUT_FORMAT, METRICS_PATH
+)
+from scripts.store.build_manifest import BuildManifest, stage_keys
+
+# pandas, rapidfuzz, pyarrow and openpyxl are imported by the stage modules on
+# first use (see run_pipeline), so `--help` and argument errors return at once
+
+logger = logging.getLogger("pipeline")
 
-from config.settings import RAW_DIR, INTERMEDIATE_DIR, PROCESSED_DIR, MAPPING_PATH
-from scripts.extract.parse_sec_json import load_sec_json, extract_usd_facts
-from scripts.clean.preprocess_terms import clean_dataframe
-from scripts.model.tag_match_engine import TagMatchEngine
-from scripts.store.save_results_estimated import save_results_estimated as save_results
+
+def configure_logging(level: str = "INFO") -> None:
+    """
+    Send pipeline progress to stderr at `level` (DEBUG adds the extractor
+    dumps and per-stage timings). Also used as the batch workers' initializer.
+    """
+    logging.basicConfig(level=getattr(logging, level.upper()), format="%(message)s", force=True)
 
 
-def run_pipeline(cik: str) -> None:
+@lru_cache(maxsize=None)
+def _get_engine(mapping_path: str):
+    """
+    Build the TagMatchEngine once per process so batch workers reuse it
+    across every CIK they handle.
+    """
+    from scripts.model.tag_match_engine import TagMatchEngine
+    return TagMatchEngine(mapping_path)
+
+
+def run_pipeline(cik: str,
+                 intermediate_format: str = INTERMEDIATE_FORMAT,
+                 force: bool = False,
+                 output_format: str = OUTPUT_FORMAT,
+                 panel: bool = True,
+                 metrics_path: str = METRICS_PATH,
+                 trace_memory: bool = False,
+                 raw_zip: str = None) -> None:
     """
     Execute the full ETL pipeline for a given company CIK code.
 
     Steps:
     1. Extract JSON → DataFrame
-    2. Save intermediate CSV
+    2. Save intermediate facts (Parquet partition or CSV)
     3. Clean text fields
     4. Match to standard terms
-    5. Save final Excel results
+    5. Save final Excel results (or a Parquet/CSV table, see output_format)
+    6. Append the CIK to the cross-company panel (unless panel=False)
+
+    Runs are incremental: stages whose inputs (raw JSON, mapping, code) are
+    unchanged since the last build recorded in the CIK's manifest are
+    skipped. Pass force=True to rebuild everything.
+
+    Every run, failed or not, appends one JSON line of per-stage timings,
+    rows in/out and memory to metrics_path (None disables it; see
+    scripts/utils/stage_metrics.py). trace_memory adds tracemalloc deltas.
+
+    With raw_zip, the raw facts come from that companyfacts.zip archive
+    (member <cik>.json, read in place) instead of RAW_DIR/<cik>.json.
+    """
+    from scripts.utils.stage_metrics import StageRecorder
+
+    recorder = StageRecorder(cik, trace_memory=trace_memory)
+    error = None
+    try:
+        _run_stages(cik, recorder, intermediate_format, force, output_format, panel, raw_zip)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        if metrics_path:
+            rec = recorder.write(metrics_path, error=error)
+            logger.debug("[%s] Stage metrics: %s", cik, ", ".join(
+                f"{s['stage']} {s['seconds']:.2f}s" for s in rec["stages"]))
+
+
+def _run_stages(cik: str, recorder, intermediate_format: str, force: bool,
+                output_format: str, panel: bool, raw_zip: str = None) -> None:
     """
+    The pipeline stages proper (see run_pipeline), timed through `recorder`.
+    """
+    from scripts.extract.parse_sec_json import extract_usd_facts_from_file, extract_usd_facts_from_zip
+    from scripts.extract.companyfacts_zip import member_digest
+    from scripts.clean.preprocess_terms import clean_dataframe
+    from scripts.store.intermediate_store import (
+        write_intermediate, read_intermediate, intermediate_path, resolve_format
+    )
+    from scripts.store.log_qc_results import report_missing, qc_report_path
+    from scripts.store.save_results import output_path as results_path
+    from scripts.store.save_results_estimated import save_results_estimated as save_results, estimated_quarters
+    from scripts.store.panel_store import write_panel
+
     # Build paths from config
     raw_file = RAW_DIR / f"{cik}.json"
-    INTERMEDIATE_DIR.mkdir(parents=True, exist_ok=True)
-    intermediate_csv = INTERMEDIATE_DIR / f"{cik}_flat.csv"
     PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
-    output_path = PROCESSED_DIR / f"{cik}_results.xlsx"
+    output_path = results_path(cik, PROCESSED_DIR, output_format)
+    intermediate_format = resolve_format(intermediate_format)
 
-    # Step 1: Extract
-    print(f"[{cik}] Extracting facts from JSON...")
-    sec_data = load_sec_json(str(raw_file))
-    df_extracted = extract_usd_facts(sec_data)
-    df_extracted.to_csv(intermediate_csv, index=False)
-    print("[DEBUG] After extract_usd_facts:")
-    print("  columns:", df_extracted.columns.tolist())
-    print("[DEBUG] Sample `end` values from extractor:")
-    print(df_extracted['end'].dropna().unique()[:10])
+    # Work out which stages are stale
+    with recorder.stage("manifest"):
+        manifest = BuildManifest(cik)
+        if force:
+            manifest.invalidate()
+        # a zip member is fingerprinted by the CRC-32 and size in the index
+        raw_digest = member_digest(raw_zip, cik) if raw_zip else manifest.input_digest("raw", raw_file)
+        keys = stage_keys(
+            raw_digest,
+            manifest.input_digest("mapping", MAPPING_PATH),
+            intermediate_format,
+            output_path.suffix[1:],
+        )
+    run_extract = not manifest.is_fresh("extract", keys["extract"])
+    run_qc = not manifest.is_fresh("qc", keys["qc"])
+    run_save = not manifest.is_fresh("save", keys["save"])
+    run_panel = panel and not manifest.is_fresh("panel", keys["panel"])
+    for name, stale in [("extract", run_extract), ("qc", run_qc), ("save", run_save), ("panel", run_panel)]:
+        if not stale:
+            recorder.skip(name)
+
+    if not (run_extract or run_qc or run_save or run_panel):
+        logger.info("[%s] Up to date, nothing to do. Results at %s", cik, output_path)
+        return
 
-    # Step 2: Clean
-    print(f"[{cik}] Cleaning extracted data...")
-    df_clean = clean_dataframe(df_extracted)
-    
+    # Step 1: Extract
+    if run_extract:
+        logger.info("[%s] Extracting facts from %s...", cik, raw_zip or "JSON")
+        with recorder.stage("extract") as st:
+            if raw_zip:
+                df_extracted = extract_usd_facts_from_zip(raw_zip, cik)
+            else:
+                df_extracted = extract_usd_facts_from_file(str(raw_file))
+            written = write_intermediate(df_extracted, cik, intermediate_format)
+            st["rows_out"] = len(df_extracted)
+        manifest.record("extract", keys["extract"], [written])
+        logger.debug("[%s] Extracted columns: %s", cik, df_extracted.columns.tolist())
+        logger.debug("[%s] Sample `end` values: %s", cik, df_extracted['end'].dropna().unique()[:10])
+    else:
+        logger.info("[%s] Raw facts unchanged, loading %s", cik, intermediate_path(cik, intermediate_format))
+        with recorder.stage("load") as st:
+            df_extracted = read_intermediate(cik, fmt=intermediate_format)
+            st["rows_out"] = len(df_extracted)
 
+    # Steps 2–3 only feed the QC report and the results
+    if run_qc or run_save:
+        # Step 2: Clean
+        logger.info("[%s] Cleaning extracted data...", cik)
+        with recorder.stage("clean", rows_in=len(df_extracted)) as st:
+            df_clean = clean_dataframe(df_extracted)
+            st["rows_out"] = len(df_clean)
 
-    # Step 3: Match
-    print(f"[{cik}] Matching tags to standard terms...")
-    engine = TagMatchEngine(str(MAPPING_PATH))
-    df_matched = engine.match_all(df_clean)
-    report_missing(df_matched, str(MAPPING_PATH), cik)
+        # Step 3: Match
+        logger.info("[%s] Matching tags to standard terms...", cik)
+        with recorder.stage("match", rows_in=len(df_clean)) as st:
+            engine = _get_engine(str(MAPPING_PATH))
+            df_matched = engine.match_all(df_clean)
+            st["rows_out"] = len(df_matched)
 
+    if run_qc:
+        with recorder.stage("qc", rows_in=len(df_matched)) as st:
+            st["rows_out"] = len(report_missing(df_matched, str(MAPPING_PATH), cik))
+        manifest.record("qc", keys["qc"], [qc_report_path(cik)])
 
-    
     # Step 4: Save
-    print(f"[{cik}] Saving results to Excel...")
-    save_results(df_matched, str(MAPPING_PATH), str(output_path))
-    print(f"[{cik}] Pipeline complete. Results at {output_path}")
-    
+    if run_save:
+        logger.info("[%s] Saving results to %s...", cik, output_path.suffix[1:])
+        with recorder.stage("save", rows_in=len(df_extracted)) as st:
+            tidy = save_results(df_matched, str(MAPPING_PATH), str(output_path), facts=df_extracted,
+                                output_format=output_path.suffix[1:])
+            st["rows_out"] = len(tidy)
+        manifest.record("save", keys["save"], [output_path])
+
+    # Step 5: Panel, from the save stage's tidy frame, or derived alone when
+    # the results are up to date
+    if run_panel:
+        logger.info("[%s] Appending to the cross-company panel...", cik)
+        with recorder.stage("panel") as st:
+            if not run_save:
+                tidy = estimated_quarters(str(MAPPING_PATH), df_extracted)
+            st["rows_in"] = len(tidy)
+            written = write_panel(cik, tidy)
+            st["files"] = len(written)
+        manifest.record("panel", keys["panel"], written)
+    logger.info("[%s] Pipeline complete. Results at %s", cik, output_path)
 
 
+def resolve_ciks(ciks: list = None, pattern: str = None, manifest: str = None,
+                 raw_zip: str = None) -> list:
+    """
+    Build the ordered, de-duplicated list of CIKs for a batch run.
+
+    - ciks: explicit CIK codes
+    - pattern: glob evaluated inside RAW_DIR (e.g. "CIK*.json"), or over the
+      member names of raw_zip when given
+    - manifest: text file with one CIK per line (extra CSV columns, blank
+      lines, '#' comments and a 'cik' header are ignored)
+    """
+    resolved = list(ciks or [])
+
+    if pattern and raw_zip:
+        from scripts.extract.companyfacts_zip import list_ciks
+        resolved += list_ciks(raw_zip, pattern)
+    elif pattern:
+        resolved += [p.stem for p in sorted(RAW_DIR.glob(pattern)) if p.suffix == ".json"]
+
+    if manifest:
+        for line in Path(manifest).read_text().splitlines():
+            cik = line.split(",", 1)[0].strip()
+            if not cik or cik.startswith("#") or cik.lower() == "cik":
+                continue
+            resolved.append(Path(cik).stem)
+
+    return list(dict.fromkeys(resolved))
+
+
+def _run_one(cik: str, pipeline_kwargs: dict = None) -> dict:
+    """
+    Run the pipeline for one CIK inside a worker, never letting an exception
+    escape so one bad filer cannot take down the batch.
+    """
+    start = time.perf_counter()
+    try:
+        run_pipeline(cik, **(pipeline_kwargs or {}))
+        return {"cik": cik, "ok": True, "seconds": time.perf_counter() - start, "error": None}
+    except Exception as e:
+        return {
+            "cik": cik,
+            "ok": False,
+            "seconds": time.perf_counter() - start,
+            "error": f"{type(e).__name__}: {e}",
+            "traceback": traceback.format_exc(),
+        }
+
+
+def run_batch(ciks: list, workers: int = None, qc_summary: bool = False,
+              frames_index: bool = False, log_level: str = "INFO", **pipeline_kwargs) -> dict:
+    """
+    Execute the pipeline for many CIKs over a process pool.
+    Extra keyword arguments are forwarded to run_pipeline. With
+    qc_summary=True the per-CIK QC reports are rolled up afterwards
+    (see log_qc_results.summarize_qc); with frames_index=True the
+    cross-company frames index is rebuilt (see frames_index.py).
+
+    Each worker imports pandas/rapidfuzz and builds the matching engine once,
+    then handles many CIKs. Failures are isolated per CIK and reported in the
+    returned summary:
+      - total, succeeded, failed: counts
+      - elapsed: wall-clock seconds for the whole batch
+      - throughput: CIKs per minute
+      - failures: list of {cik, error, traceback}
+    """
+    workers = max(1, min(workers or os.cpu_count() or 1, len(ciks) or 1))
+    results = []
+    start = time.perf_counter()
+
+    if workers == 1:
+        for cik in ciks:
+            results.append(_run_one(cik, pipeline_kwargs))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=configure_logging,
+                                 initargs=(log_level,)) as pool:
+            futures = {pool.submit(_run_one, cik, pipeline_kwargs): cik for cik in ciks}
+            for fut in as_completed(futures):
+                try:
+                    results.append(fut.result())
+                except Exception as e:
+                    # Worker process died (e.g. OOM kill) before returning
+                    results.append({"cik": futures[fut], "ok": False, "seconds": 0.0,
+                                    "error": f"{type(e).__name__}: {e}", "traceback": None})
+
+    elapsed = time.perf_counter() - start
+    failures = [r for r in results if not r["ok"]]
+    summary = {
+        "total": len(results),
+        "succeeded": len(results) - len(failures),
+        "failed": len(failures),
+        "workers": workers,
+        "elapsed": elapsed,
+        "throughput": (len(results) / elapsed * 60) if elapsed > 0 else 0.0,
+        "failures": failures,
+    }
+
+    print(f"\nBatch complete: {summary['succeeded']}/{summary['total']} CIKs succeeded "
+          f"in {elapsed:.1f}s with {workers} worker(s) "
+          f"({summary['throughput']:.1f} CIKs/min)")
+    for r in sorted(failures, key=lambda r: r["cik"]):
+        print(f"  ❌ {r['cik']}: {r['error']}")
+
+    if qc_summary:
+        from scripts.store.log_qc_results import summarize_qc
+        summarize_qc(ciks)
+
+    if frames_index:
+        from scripts.store.frames_index import build_frames_index
+        build_frames_index()
+
+    return summary
+
 
 def main() -> None:
-    parser = argparse.ArgumentParser(description="Run ETL pipeline for a given CIK code.")
-    parser.add_argument(
+    parser = argparse.ArgumentParser(description="Run ETL pipeline for one or many CIK codes.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument(
         "--cik",
-        required=True,
         help="CIK code without .json extension"
     )
+    source.add_argument(
+        "--ciks",
+        nargs="+",
+        help="Several CIK codes to run as a batch"
+    )
+    source.add_argument(
+        "--glob",
+        help="Glob over RAW_DIR (or the --zip members) selecting the batch, e.g. 'CIK*.json'"
+    )
+    source.add_argument(
+        "--manifest",
+        help="Text file listing one CIK per line"
+    )
+    parser.add_argument(
+        "--zip",
+        dest="raw_zip",
+        help="Read raw facts from this bulk companyfacts.zip instead of RAW_DIR"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Worker processes for batch runs (default: CPU count)"
+    )
+    parser.add_argument(
+        "--intermediate-format",
+        choices=["parquet", "csv"],
+        default=INTERMEDIATE_FORMAT,
+        help="Storage format for extracted facts (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--output-format",
+        choices=["xlsx", "parquet", "csv"],
+        default=OUTPUT_FORMAT,
+        help="Results format: the Excel workbook, or a tidy Parquet/CSV table (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--no-panel",
+        action="store_true",
+        help="Do not append results to the cross-company panel (data/panel)"
+    )
+    parser.add_argument(
+        "--qc-summary",
+        action="store_true",
+        help="After a batch run, summarize the QC reports of every CIK in it"
+    )
+    parser.add_argument(
+        "--frames-index",
+        action="store_true",
+        help="After a batch run, rebuild the cross-company frames index (data/frames)"
+    )
+    parser.add_argument(
+        "--log-level",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        default="INFO",
+        help="Progress logging level; DEBUG adds extractor dumps (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--metrics-path",
+        default=str(METRICS_PATH),
+        help="JSON-lines file receiving per-stage metrics, one line per CIK run "
+             "('' disables; default: %(default)s)"
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="Record tracemalloc allocation deltas per stage (slower)"
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Ignore the build manifest and rerun every stage"
+    )
     args = parser.parse_args()
+    configure_logging(args.log_level)
+    pipeline_kwargs = {"intermediate_format": args.intermediate_format, "force": args.force,
+                       "output_format": args.output_format, "panel": not args.no_panel,
+                       "metrics_path": args.metrics_path or None, "trace_memory": args.trace_memory,
+                       "raw_zip": args.raw_zip}
+
+    if args.cik:
+        run_pipeline(args.cik, **pipeline_kwargs)
+        return
 
-    run_pipeline(args.cik)
+    if args.raw_zip:
+        # index the archive once here rather than racing to build it in every worker
+        from scripts.extract.companyfacts_zip import member_index
+        member_index(args.raw_zip)
+    ciks = resolve_ciks(args.ciks, args.glob, args.manifest, args.raw_zip)
+    if not ciks:
+        parser.error("No CIKs selected for the batch run")
+    summary = run_batch(ciks, workers=args.workers, qc_summary=args.qc_summary,
+                        frames_index=args.frames_index, log_level=args.log_level, **pipeline_kwargs)
+    if summary["failed"]:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
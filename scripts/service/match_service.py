@@ -0,0 +1,400 @@
+# scripts/service/match_service.py
+
+"""
+Resident matching service.
+
+Keeps the TagMatchEngine, the SBERT embedder (model loaded, embedding cache
+open) and the vector index warm in one process, so callers stop paying for
+the mapping load and the model load on every run.
+
+Protocol: newline-delimited JSON over a Unix socket (default
+data/cache/match_service.sock) or TCP. One request per line, one response
+per line:
+
+  {"op": "match", "pairs": [{"tag": "...", "label": "..."}, ...], "semantic": true}
+      -> {"ok": true, "matches": [{"tag", "label", "standard_term", "method", "confidence"}, ...]}
+      (pairs may also be given as [tag, label] lists)
+  {"op": "match_cik", "cik": "CIK0000320193"}          (or "path": "<file.json>")
+      -> {"ok": true, "cik": ..., "facts": n, "matches": [...one per distinct (tag, label)...]}
+  {"op": "metrics"}   -> latency percentiles, queue depth, batch sizes, cache stats
+  {"op": "reload"}    -> re-read the mapping JSON and vector index
+
+Pairs from concurrent requests are coalesced: the batcher drains the queue
+until `max_batch` pairs or `max_wait_ms` have accumulated, then runs one
+fuzzy pass and one SBERT batch for all of them.
+
+Usage:
+  python scripts/service/match_service.py serve [--socket PATH | --port N] [--max-batch 2048] [--max-wait-ms 5]
+  python scripts/service/match_service.py match <tag> [label] [--socket PATH | --port N]
+  python scripts/service/match_service.py cik <CIK> [--socket PATH | --port N]
+  python scripts/service/match_service.py metrics [--socket PATH | --port N]
+"""
+
+import sys
+from pathlib import Path
+# Ensure project root is on sys.path so we can import our modules
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import argparse
+import asyncio
+import json
+import signal
+import socket
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import numpy as np
+
+from config.settings import MAPPING_PATH, MATCH_SERVICE_SOCKET, RAW_DIR, VECTOR_INDEX_DIR
+
+
+class ServiceMetrics:
+    """
+    Request/batch counters and a sliding window of request latencies.
+    """
+
+    def __init__(self, window: int = 10_000):
+        self.started = time.time()
+        self.latencies = deque(maxlen=window)
+        self.batch_sizes = deque(maxlen=window)
+        self.counters = {"requests": 0, "errors": 0, "pairs": 0, "batches": 0,
+                         "semantic_pairs": 0, "ciks": 0}
+
+    def observe(self, seconds: float) -> None:
+        self.counters["requests"] += 1
+        self.latencies.append(seconds)
+
+    def snapshot(self) -> dict:
+        lat = np.asarray(self.latencies) * 1000 if self.latencies else np.zeros(1)
+        sizes = np.asarray(self.batch_sizes) if self.batch_sizes else np.zeros(1)
+        return {
+            **self.counters,
+            "uptime_s": round(time.time() - self.started, 1),
+            "latency_ms": {
+                "p50": round(float(np.percentile(lat, 50)), 3),
+                "p95": round(float(np.percentile(lat, 95)), 3),
+                "p99": round(float(np.percentile(lat, 99)), 3),
+                "max": round(float(lat.max()), 3),
+            },
+            "batch_pairs": {"mean": round(float(sizes.mean()), 1), "max": int(sizes.max())},
+        }
+
+
+class MatchService:
+    """
+    Warm matching state plus the request-coalescing batcher.
+
+    - mapping_path: mapping JSON for the TagMatchEngine
+    - semantic_thresh: SBERT cosine needed to accept a semantic match
+    - max_batch: most pairs matched in one batch
+    - max_wait_ms: how long the batcher waits for more requests to coalesce
+    """
+
+    def __init__(self, mapping_path=MAPPING_PATH, semantic_thresh: float = 0.75,
+                 max_batch: int = 2048, max_wait_ms: float = 5.0,
+                 index_dir=VECTOR_INDEX_DIR):
+        self.mapping_path = str(mapping_path)
+        self.index_dir = index_dir
+        self.semantic_thresh = semantic_thresh
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.metrics = ServiceMetrics()
+
+        # one thread owns the engine/model; extraction runs beside it
+        self._match_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="match")
+        self._io_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="extract")
+        self._queue = None
+        self._pending_pairs = 0
+        self._load()
+
+    # ── warm state ───────────────────────────────────────────────────────
+    def _load(self) -> None:
+        from scripts.model.sbert_embedder import SBERTEmbedder
+        from scripts.model.tag_match_engine import TagMatchEngine
+        from scripts.model.vector_index import VectorIndex, mapping_digest
+
+        start = time.perf_counter()
+        self.engine = TagMatchEngine(self.mapping_path)
+        if not hasattr(self, "embedder"):
+            self.embedder = SBERTEmbedder().load()
+        self.index = VectorIndex.load(self.index_dir) if self.index_dir else None
+        digest = mapping_digest(json.loads(Path(self.mapping_path).read_text()))
+        if self.index is not None and self.index.fingerprint != self.embedder.fingerprint:
+            print("[match_service] Ignoring vector index built with another model")
+            self.index = None
+        elif self.index is not None and self.index.mapping_digest != digest:
+            print("[match_service] Ignoring vector index built from other standard terms")
+            self.index = None
+        self.terms = list(self.engine.mapping)
+        self.term_embeds = self.embedder.encode(self.terms)
+        print(f"[match_service] Loaded {len(self.terms)} terms, "
+              f"{len(self.index) if self.index is not None else 0} index entries "
+              f"in {time.perf_counter() - start:.2f}s")
+
+    # ── batch matching (runs on the match thread) ────────────────────────
+    def _match_batch(self, tags: List[str], labels: List[str], semantic: np.ndarray) -> list:
+        import pandas as pd
+        from scripts.clean.preprocess_terms import clean_dataframe
+
+        df = clean_dataframe(pd.DataFrame({"tag": tags, "label": labels}))
+        res = self.engine.match_pairs(df)
+        terms = res["standard_term"].to_numpy(dtype=object, copy=True)
+        methods = res["match_method"].to_numpy(dtype=object, copy=True)
+        confidence = res["confidence"].to_numpy(dtype=float, copy=True)
+
+        todo = np.flatnonzero((methods == "none") & semantic & (df["label_clean"].to_numpy() != ""))
+        if todo.size:
+            texts = df["label_clean"].to_numpy()[todo].tolist()
+            if self.index is not None:
+                hits = self.index.nearest_terms(self.embedder.encode(texts), k=5)
+            else:
+                hits = [h[0] for h in self.embedder.semantic_match_batch(texts, self.term_embeds, self.terms)]
+            for row, (term, score) in zip(todo, hits):
+                if term in self.engine.mapping and score >= self.semantic_thresh:
+                    terms[row], methods[row], confidence[row] = term, "semantic", score
+            self.metrics.counters["semantic_pairs"] += len(todo)
+
+        return [{"tag": t, "label": l, "standard_term": term, "method": m, "confidence": round(float(c), 4)}
+                for t, l, term, m, c in zip(tags, labels, terms, methods, confidence)]
+
+    async def _batcher(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            size = len(batch[0][0])
+            deadline = loop.time() + self.max_wait
+            while size < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                size += len(item[0])
+            self._pending_pairs -= size
+
+            # a failing batch fails its own requests, never the batcher
+            try:
+                tags, labels, semantic = [], [], []
+                for pairs, sem, _ in batch:
+                    tags += [tag for tag, _ in pairs]
+                    labels += [label for _, label in pairs]
+                    semantic += [sem] * len(pairs)
+                matches = await loop.run_in_executor(
+                    self._match_pool, self._match_batch, tags, labels, np.asarray(semantic, dtype=bool))
+            except Exception as e:
+                for _, _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+
+            self.metrics.counters["batches"] += 1
+            self.metrics.batch_sizes.append(size)
+            start = 0
+            for pairs, _, fut in batch:
+                if not fut.done():
+                    fut.set_result(matches[start:start + len(pairs)])
+                start += len(pairs)
+
+    @staticmethod
+    def _normalize_pairs(pairs) -> list:
+        """
+        (tag, label) tuples from request pairs, given either as
+        {"tag": ..., "label": ...} objects or as [tag, label] lists.
+        Raises ValueError on anything else.
+        """
+        if not isinstance(pairs, (list, tuple)):
+            raise ValueError(f"'pairs' must be a list, got {type(pairs).__name__}")
+        out = []
+        for i, p in enumerate(pairs):
+            if isinstance(p, dict):
+                tag, label = p.get("tag"), p.get("label")
+            elif isinstance(p, (list, tuple)) and len(p) == 2:
+                tag, label = p
+            else:
+                raise ValueError(f"pair {i} must be {{'tag', 'label'}} or [tag, label], got {p!r}")
+            out.append((str(tag or ""), str(label or "")))
+        return out
+
+    async def match(self, pairs: list, semantic: bool = True) -> list:
+        """
+        Queue pairs for the next batch and wait for their matches.
+        """
+        pairs = self._normalize_pairs(pairs)
+        if not pairs:
+            return []
+        fut = asyncio.get_running_loop().create_future()
+        self._pending_pairs += len(pairs)
+        self.metrics.counters["pairs"] += len(pairs)
+        await self._queue.put((pairs, semantic, fut))
+        return await fut
+
+    async def match_cik(self, cik: str = None, path: str = None, semantic: bool = True) -> dict:
+        """
+        Extract a company facts file and match each distinct (tag, label).
+        """
+        from scripts.extract.parse_sec_json import extract_usd_facts_from_file
+
+        path = Path(path) if path else Path(RAW_DIR) / f"{cik}.json"
+        if not path.exists():
+            raise FileNotFoundError(f"Raw JSON not found: {path}")
+        loop = asyncio.get_running_loop()
+        df = await loop.run_in_executor(self._io_pool, extract_usd_facts_from_file, str(path))
+        distinct = df[["tag", "label"]].astype(str).drop_duplicates()
+        pairs = list(distinct.itertuples(index=False, name=None))
+        self.metrics.counters["ciks"] += 1
+        return {"cik": cik or path.stem, "facts": len(df), "matches": await self.match(pairs, semantic)}
+
+    # ── request handling ─────────────────────────────────────────────────
+    async def handle(self, request: dict) -> dict:
+        op = request.get("op")
+        if op == "match":
+            return {"ok": True, "matches": await self.match(request.get("pairs", []),
+                                                             request.get("semantic", True))}
+        if op == "match_cik":
+            return {"ok": True, **await self.match_cik(request.get("cik"), request.get("path"),
+                                                       request.get("semantic", True))}
+        if op == "metrics":
+            stats = self.metrics.snapshot()
+            stats["queue_depth"] = {"requests": self._queue.qsize(), "pairs": self._pending_pairs}
+            stats["embedding_cache"] = self.embedder.cache_stats()
+            return {"ok": True, "metrics": stats}
+        if op == "reload":
+            await asyncio.get_running_loop().run_in_executor(self._match_pool, self._load)
+            return {"ok": True, "terms": len(self.terms)}
+        raise ValueError(f"Unknown op '{op}'")
+
+    async def _serve_connection(self, reader, writer) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                start = time.perf_counter()
+                try:
+                    response = await self.handle(json.loads(line))
+                except Exception as e:
+                    self.metrics.counters["errors"] += 1
+                    response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+                self.metrics.observe(time.perf_counter() - start)
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, socket_path=None, host: str = "127.0.0.1", port: int = None) -> None:
+        """
+        Listen on a Unix socket (default) or on host:port until cancelled.
+        """
+        self._queue = asyncio.Queue()
+        batcher = asyncio.create_task(self._batcher())
+        if port is not None:
+            server = await asyncio.start_server(self._serve_connection, host, port, limit=1 << 26)
+            where = f"{host}:{port}"
+        else:
+            socket_path = Path(socket_path or MATCH_SERVICE_SOCKET)
+            socket_path.parent.mkdir(parents=True, exist_ok=True)
+            socket_path.unlink(missing_ok=True)
+            server = await asyncio.start_unix_server(self._serve_connection, str(socket_path), limit=1 << 26)
+            where = str(socket_path)
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, server.close)
+        print(f"✅ Match service listening on {where}")
+        try:
+            async with server:
+                await server.serve_forever()
+        except asyncio.CancelledError:
+            print("Match service stopped")
+        finally:
+            batcher.cancel()
+            if port is None:
+                Path(where).unlink(missing_ok=True)
+
+
+class MatchClient:
+    """
+    Blocking client for the match service (one connection, requests in turn).
+    """
+
+    def __init__(self, socket_path=None, host: str = "127.0.0.1", port: int = None, timeout: float = 300):
+        if port is not None:
+            self._sock = socket.create_connection((host, port), timeout=timeout)
+        else:
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._sock.settimeout(timeout)
+            self._sock.connect(str(socket_path or MATCH_SERVICE_SOCKET))
+        self._file = self._sock.makefile("rb")
+
+    def request(self, payload: dict) -> dict:
+        self._sock.sendall(json.dumps(payload).encode() + b"\n")
+        response = json.loads(self._file.readline())
+        if not response.get("ok"):
+            raise RuntimeError(response.get("error", "match service error"))
+        return response
+
+    def match(self, pairs: list, semantic: bool = True) -> list:
+        return self.request({"op": "match", "pairs": pairs, "semantic": semantic})["matches"]
+
+    def match_cik(self, cik: str = None, path: str = None, semantic: bool = True) -> dict:
+        return self.request({"op": "match_cik", "cik": cik, "path": path, "semantic": semantic})
+
+    def metrics(self) -> dict:
+        return self.request({"op": "metrics"})["metrics"]
+
+    def close(self) -> None:
+        self._file.close()
+        self._sock.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Resident tag matching service.")
+    where = argparse.ArgumentParser(add_help=False)
+    where.add_argument("--socket", default=None, help=f"Unix socket path (default: {MATCH_SERVICE_SOCKET})")
+    where.add_argument("--port", type=int, default=None, help="Use TCP on 127.0.0.1:PORT instead")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    s = sub.add_parser("serve", parents=[where], help="Run the service")
+    s.add_argument("--max-batch", type=int, default=2048, help="Most pairs per model batch")
+    s.add_argument("--max-wait-ms", type=float, default=5.0, help="Coalescing window")
+    s.add_argument("--semantic-thresh", type=float, default=0.75)
+    m = sub.add_parser("match", parents=[where], help="Match one tag/label")
+    m.add_argument("tag")
+    m.add_argument("label", nargs="?", default="")
+    c = sub.add_parser("cik", parents=[where], help="Match every tag of a company facts file")
+    c.add_argument("cik")
+    sub.add_parser("metrics", parents=[where], help="Print service metrics")
+    args = parser.parse_args()
+
+    if args.cmd == "serve":
+        service = MatchService(semantic_thresh=args.semantic_thresh,
+                               max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
+        asyncio.run(service.serve(args.socket, port=args.port))
+        return
+
+    try:
+        client = MatchClient(args.socket, port=args.port)
+    except OSError as e:
+        print(f"❌ Cannot reach the match service: {e}")
+        sys.exit(1)
+    if args.cmd == "match":
+        print(json.dumps(client.match([{"tag": args.tag, "label": args.label}])[0], indent=2))
+    elif args.cmd == "cik":
+        res = client.match_cik(args.cik)
+        matched = [m for m in res["matches"] if m["standard_term"]]
+        print(f"{res['cik']}: {res['facts']} facts, {len(matched)}/{len(res['matches'])} distinct tags matched")
+        for m in matched:
+            print(f"  {m['tag']:<60} → {m['standard_term']} ({m['method']}, {m['confidence']:.2f})")
+    else:
+        print(json.dumps(client.metrics(), indent=2))
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+# scripts/store/build_manifest.py
+
+"""
+Per-CIK build manifest for incremental pipeline runs.
+
+Every stage gets a key: a hash of its inputs' content, of the previous
+stage's key, and of the source code of the modules that implement it:
+
+    extract = H(raw JSON, intermediate format, extract code)
+    clean   = H(extract, clean code)
+    match   = H(clean, mapping JSON, match code)
+    qc      = H(match, QC code)
+    save    = H(match, output format, save code)
+    panel   = H(save, panel code)
+
+A stage is skipped when its recorded key is unchanged and its outputs still
+exist. Editing the mapping therefore re-runs matching, QC and saving while
+extraction is served from the intermediate store.
+
+Manifests live in data/intermediate/manifests/{cik}.json, one file per CIK,
+so parallel batch workers never write the same file.
+"""
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, Iterable
+
+from config.settings import BASE_DIR, INTERMEDIATE_DIR
+
+
+MANIFEST_DIR = Path(INTERMEDIATE_DIR) / "manifests"
+
+STAGES = ("extract", "clean", "match", "qc", "save", "panel")
+
+# Source files whose content defines each stage's code version
+STAGE_CODE = {
+    "extract": ["scripts/extract/parse_sec_json.py", "scripts/extract/companyfacts_zip.py",
+                "scripts/store/intermediate_store.py"],
+    "clean":   ["scripts/clean/preprocess_terms.py"],
+    "match":   ["scripts/model/tag_match_engine.py"],
+    "qc":      ["scripts/store/log_qc_results.py"],
+    "save":    ["scripts/store/save_results.py",
+                "scripts/store/save_results_estimated.py",
+                "scripts/store/quarterly.py"],
+    "panel":   ["scripts/store/panel_store.py"],
+}
+
+_CHUNK = 1 << 20
+_code_versions: Dict[str, str] = {}
+
+
+def _hash(*parts: str) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(str(part).encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def file_digest(path) -> str:
+    """
+    SHA-256 of a file's content, read in 1 MB chunks.
+    """
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def code_version(stage: str) -> str:
+    """
+    Hash of the source files implementing a stage (cached per process).
+    """
+    if stage not in _code_versions:
+        digests = [file_digest(Path(BASE_DIR) / rel) for rel in STAGE_CODE[stage]]
+        _code_versions[stage] = _hash(stage, *digests)
+    return _code_versions[stage]
+
+
+def stage_keys(raw_digest: str, mapping_digest: str, intermediate_format: str,
+               output_format: str = "xlsx") -> Dict[str, str]:
+    """
+    Chain the per-stage keys from the input digests (see module docstring).
+    """
+    keys = {}
+    keys["extract"] = _hash(raw_digest, intermediate_format, code_version("extract"))
+    keys["clean"] = _hash(keys["extract"], code_version("clean"))
+    keys["match"] = _hash(keys["clean"], mapping_digest, code_version("match"))
+    keys["qc"] = _hash(keys["match"], code_version("qc"))
+    keys["save"] = _hash(keys["match"], output_format, code_version("save"))
+    keys["panel"] = _hash(keys["save"], code_version("panel"))
+    return keys
+
+
+class BuildManifest:
+    """
+    Stage keys and outputs recorded for one CIK's last successful build.
+    """
+
+    def __init__(self, cik: str, manifest_dir: Path = MANIFEST_DIR):
+        self.cik = cik
+        self.path = Path(manifest_dir) / f"{cik}.json"
+        try:
+            self.data = json.loads(self.path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.data = {}
+        self.data.setdefault("cik", cik)
+        self.data.setdefault("inputs", {})
+        self.data.setdefault("stages", {})
+
+    def input_digest(self, name: str, path) -> str:
+        """
+        Content hash of an input file. The digest recorded last time is reused
+        when the file's size and mtime are unchanged, so unchanged raw files
+        are not re-read on every run.
+        """
+        st = os.stat(path)
+        rec = self.data["inputs"].get(name)
+        if (rec and rec.get("path") == str(path)
+                and rec.get("size") == st.st_size and rec.get("mtime_ns") == st.st_mtime_ns):
+            return rec["sha256"]
+        digest = file_digest(path)
+        self.data["inputs"][name] = {
+            "path": str(path),
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "sha256": digest,
+        }
+        return digest
+
+    def is_fresh(self, stage: str, key: str) -> bool:
+        """
+        True if `stage` last completed with the same key and its outputs exist.
+        """
+        rec = self.data["stages"].get(stage)
+        if not rec or rec.get("key") != key:
+            return False
+        return all(Path(p).exists() for p in rec.get("outputs", []))
+
+    def record(self, stage: str, key: str, outputs: Iterable = ()) -> None:
+        """
+        Mark `stage` complete and persist the manifest immediately, so a crash
+        in a later stage keeps the work already done.
+        """
+        self.data["stages"][stage] = {
+            "key": key,
+            "outputs": [str(p) for p in outputs],
+            "completed_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        self.save()
+
+    def invalidate(self) -> None:
+        self.data["stages"] = {}
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f".{self.path.name}.tmp")
+        tmp.write_text(json.dumps(self.data, indent=2))
+        tmp.replace(self.path)
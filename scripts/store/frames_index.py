@@ -0,0 +1,302 @@
+# scripts/store/frames_index.py
+
+"""
+Frames index: cross-company lookups of one tag (or standard term) and one
+period, answered from a few sorted Parquet files instead of every CIK's
+facts.
+
+Two inverted indexes are built from what the pipeline already stored:
+
+  tag/bucket=<nn>.parquet   raw facts of every CIK (intermediate store),
+                            keyed by (tag, end). Tags are spread over
+                            N_BUCKETS files by CRC-32 of the tag, and each
+                            file is sorted by (tag, end, cik, filed).
+  term/fy=<fy>.parquet      derived values of the panel, keyed by
+                            (standard_term, fy, fp), one file per fiscal
+                            year sorted by (standard_term, fp, cik).
+
+Row groups are small, so a lookup opens one file and, through the
+row-group min/max statistics of the sort keys, reads only the row groups
+holding its key. The index is rebuilt as a whole (`build`, or
+`pipeline.py --frames-index` after a batch); index.json records when and
+from how many CIKs.
+
+Facts carry no start date, so at one period end a 10-Q's quarter and
+year-to-date values look alike; pass form="10-K" for annual values.
+
+Usage:
+  python scripts/store/frames_index.py build [--buckets 64]
+  python scripts/store/frames_index.py tag Revenues 2023-12-31 [--form 10-K] [--all-filings]
+  python scripts/store/frames_index.py term "Net sales" --fy 2023 [--fp FY] [--section income_statement]
+"""
+
+import sys
+from pathlib import Path
+# Ensure project root is on sys.path so we can import our modules
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import argparse
+import json
+import shutil
+import time
+import zlib
+from typing import List
+
+import pandas as pd
+
+from config.settings import FRAMES_DIR, FACTS_DATASET_DIR, INTERMEDIATE_DIR, PANEL_DIR
+from scripts.store.intermediate_store import _import_pyarrow, read_intermediate
+
+
+N_BUCKETS = 64
+ROW_GROUP_SIZE = 4_096
+# CIKs read per pass while bucketing the facts
+CIK_BATCH = 200
+
+TAG_COLUMNS = ["tag", "end", "cik", "value", "fy", "fp", "form", "filed"]
+TERM_COLUMNS = ["standard_term", "fp", "cik", "section", "value", "tag", "form", "filed"]
+FPS = ("FY", "Q1", "Q2", "Q3", "Q4")
+
+
+def _tag_schema(pa):
+    return pa.schema([
+        ("tag", pa.string()), ("end", pa.timestamp("ns")), ("cik", pa.string()),
+        ("value", pa.float64()), ("fy", pa.int16()), ("fp", pa.string()),
+        ("form", pa.string()), ("filed", pa.timestamp("ns")),
+    ])
+
+
+def _bare(tag: str) -> str:
+    return str(tag).split(":", 1)[-1]
+
+
+def tag_bucket(tag: str, n_buckets: int = N_BUCKETS) -> int:
+    """
+    Bucket file holding `tag` (stable across processes, unlike hash()).
+    """
+    return zlib.crc32(_bare(tag).encode()) % n_buckets
+
+
+def indexed_ciks() -> List[str]:
+    """
+    CIKs with intermediate facts, in either store format.
+    """
+    ciks = [p.name.split("=", 1)[1] for p in Path(FACTS_DATASET_DIR).glob("cik=*")
+            if (p / "part-0.parquet").exists()]
+    ciks += [p.name[:-len("_flat.csv")] for p in Path(INTERMEDIATE_DIR).glob("*_flat.csv")]
+    return sorted(set(ciks))
+
+
+def _load_meta(frames_dir: Path) -> dict:
+    path = frames_dir / "index.json"
+    if not path.exists():
+        raise FileNotFoundError(f"No frames index at {frames_dir}; run `frames_index.py build` first")
+    return json.loads(path.read_text())
+
+
+def _tag_rows(cik: str) -> pd.DataFrame:
+    df = read_intermediate(cik, columns=["tag", "end", "value", "fy", "fp", "form", "filed"])
+    df = df[df["end"].notna() & df["value"].notna()]
+    return df.assign(
+        tag=df["tag"].astype(str).map(_bare),
+        cik=cik,
+        fp=df["fp"].astype(str),
+        form=df["form"].astype(str),
+    )[TAG_COLUMNS]
+
+
+def _build_tag_index(ciks: List[str], out_dir: Path, n_buckets: int, pa) -> int:
+    """
+    Two-pass bucket sort: append each batch of CIKs to per-bucket spill
+    files, then sort each bucket on its own, so memory stays bounded by one
+    batch or one bucket rather than the whole corpus.
+    """
+    schema = _tag_schema(pa)
+    spill_dir = out_dir / "_spill"
+    spill_dir.mkdir(parents=True)
+    writers = {}
+    rows = 0
+    try:
+        for i in range(0, len(ciks), CIK_BATCH):
+            batch = pd.concat([_tag_rows(cik) for cik in ciks[i:i + CIK_BATCH]], ignore_index=True)
+            rows += len(batch)
+            buckets = batch["tag"].map(lambda t: zlib.crc32(t.encode()) % n_buckets)
+            for b, part in batch.groupby(buckets, sort=False):
+                if b not in writers:
+                    writers[b] = pa.parquet.ParquetWriter(spill_dir / f"{b:02d}.parquet", schema)
+                writers[b].write_table(pa.Table.from_pandas(part, schema=schema, preserve_index=False))
+    finally:
+        for w in writers.values():
+            w.close()
+
+    (out_dir / "tag").mkdir()
+    for b in sorted(writers):
+        table = pa.parquet.read_table(spill_dir / f"{b:02d}.parquet")
+        # spill order is CIK order then file order, so sorting is stable in those
+        table = table.sort_by([("tag", "ascending"), ("end", "ascending"),
+                               ("cik", "ascending"), ("filed", "ascending")])
+        pa.parquet.write_table(table, out_dir / "tag" / f"bucket={b:02d}.parquet",
+                               row_group_size=ROW_GROUP_SIZE, compression="zstd")
+    shutil.rmtree(spill_dir)
+    return rows
+
+
+def _build_term_index(out_dir: Path, panel_dir: Path, pa) -> int:
+    from scripts.store.panel_store import scan_panel
+
+    (out_dir / "term").mkdir()
+    fys = sorted({int(p.name.split("=", 1)[1]) for p in panel_dir.glob("section=*/fy=*")})
+    rows = 0
+    for fy in fys:
+        df = scan_panel(["cik", "section", "standard_term", "period", "value", "tag", "form", "filed"],
+                        [("fy", "=", fy)], panel_dir)
+        df = df.assign(fp=df["period"].replace({"10K": "FY"}))[TERM_COLUMNS]
+        df = df.sort_values(["standard_term", "fp", "cik", "section"], kind="stable")
+        pa.parquet.write_table(pa.Table.from_pandas(df, preserve_index=False),
+                               out_dir / "term" / f"fy={fy}.parquet",
+                               row_group_size=ROW_GROUP_SIZE, compression="zstd")
+        rows += len(df)
+    return rows
+
+
+def build_frames_index(frames_dir=FRAMES_DIR, panel_dir=PANEL_DIR, n_buckets: int = N_BUCKETS) -> dict:
+    """
+    (Re)build both indexes from the intermediate facts of every processed
+    CIK and from the panel. The new index is assembled next to the old one
+    and swapped in at the end, so queries never see a partial build.
+    Returns the metadata written to index.json.
+    """
+    pa = _import_pyarrow()
+    frames_dir, panel_dir = Path(frames_dir), Path(panel_dir)
+    start = time.perf_counter()
+    ciks = indexed_ciks()
+
+    build_dir = frames_dir.with_name(f".{frames_dir.name}.building")
+    shutil.rmtree(build_dir, ignore_errors=True)
+    build_dir.mkdir(parents=True)
+    meta = {
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "ciks": len(ciks),
+        "buckets": n_buckets,
+        "tag_rows": _build_tag_index(ciks, build_dir, n_buckets, pa),
+        "term_rows": _build_term_index(build_dir, panel_dir, pa),
+    }
+    (build_dir / "index.json").write_text(json.dumps(meta, indent=2))
+
+    old_dir = frames_dir.with_name(f".{frames_dir.name}.old")
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if frames_dir.exists():
+        frames_dir.replace(old_dir)
+    build_dir.replace(frames_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+    print(f"✅ Frames index: {meta['tag_rows']:,} facts and {meta['term_rows']:,} derived values "
+          f"from {len(ciks):,} CIKs in {time.perf_counter() - start:.1f}s → {frames_dir}")
+    return meta
+
+
+def tag_frame(tag: str,
+              end: str,
+              form: str = None,
+              latest: bool = True,
+              frames_dir=FRAMES_DIR) -> pd.DataFrame:
+    """
+    Value of `tag` at period end `end` for every indexed company, e.g.
+    tag_frame("Revenues", "2023-12-31", form="10-K").
+
+    - tag: us-gaap tag, with or without the namespace prefix
+    - form: restrict to facts reported on this form
+    - latest: keep one fact per CIK, the latest filed (ties: first in file
+      order); False returns every filing's fact
+    Returns cik, value, fy, fp, form, filed, sorted by CIK.
+    """
+    pa = _import_pyarrow()
+    frames_dir = Path(frames_dir)
+    meta = _load_meta(frames_dir)
+    tag = _bare(tag)
+    path = frames_dir / "tag" / f"bucket={tag_bucket(tag, meta['buckets']):02d}.parquet"
+    columns = ["cik", "value", "fy", "fp", "form", "filed"]
+    if not path.exists():
+        return pd.DataFrame(columns=columns)
+
+    filters = [("tag", "=", tag), ("end", "=", pd.Timestamp(end))]
+    if form:
+        filters.append(("form", "=", form))
+    df = pa.parquet.read_table(path, columns=columns, filters=filters, memory_map=True).to_pandas()
+    df["fy"] = df["fy"].astype("Int16")
+    if latest and not df.empty:
+        df = df[df["filed"] == df.groupby("cik")["filed"].transform("max")]
+        df = df.drop_duplicates("cik", keep="first")
+    return df.reset_index(drop=True)
+
+
+def term_frame(standard_term: str,
+               fy: int,
+               fp: str = "FY",
+               section: str = None,
+               frames_dir=FRAMES_DIR) -> pd.DataFrame:
+    """
+    Derived value of one standard term for every company in one fiscal year
+    and period (FY or Q1–Q4), e.g. term_frame("Net sales", 2023, "Q2").
+    Returns cik, value, tag, form, filed (plus section when not given, as
+    term names repeat across sections), sorted by CIK.
+    """
+    pa = _import_pyarrow()
+    frames_dir = Path(frames_dir)
+    _load_meta(frames_dir)
+    fp = "FY" if fp == "10K" else fp
+    if fp not in FPS:
+        raise ValueError(f"Unknown fiscal period '{fp}', expected one of {FPS}")
+    columns = ["cik", "value", "tag", "form", "filed"]
+    if not section:
+        columns.insert(1, "section")
+    path = frames_dir / "term" / f"fy={int(fy)}.parquet"
+    if not path.exists():
+        return pd.DataFrame(columns=columns)
+
+    filters = [("standard_term", "=", standard_term), ("fp", "=", fp)]
+    if section:
+        filters.append(("section", "=", section))
+    df = pa.parquet.read_table(path, columns=columns, filters=filters, memory_map=True).to_pandas()
+    return df.reset_index(drop=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Cross-company frames index.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="Rebuild the index from the intermediate facts and the panel")
+    b.add_argument("--buckets", type=int, default=N_BUCKETS)
+    t = sub.add_parser("tag", help="One tag at one period end across companies")
+    t.add_argument("tag")
+    t.add_argument("end", help="Period end, YYYY-MM-DD")
+    t.add_argument("--form", default=None, help="e.g. 10-K")
+    t.add_argument("--all-filings", action="store_true",
+                   help="Every filing's fact instead of the latest per company")
+    s = sub.add_parser("term", help="One standard term for a fiscal year and period across companies")
+    s.add_argument("standard_term")
+    s.add_argument("--fy", type=int, required=True)
+    s.add_argument("--fp", default="FY", choices=FPS)
+    s.add_argument("--section", default=None)
+    args = parser.parse_args()
+
+    if args.cmd == "build":
+        build_frames_index(n_buckets=args.buckets)
+        return
+
+    start = time.perf_counter()
+    if args.cmd == "tag":
+        df = tag_frame(args.tag, args.end, args.form, latest=not args.all_filings)
+        what = f"{args.tag} at {args.end}"
+    else:
+        df = term_frame(args.standard_term, args.fy, args.fp, args.section)
+        what = f"'{args.standard_term}' FY{args.fy} {args.fp}"
+    elapsed = time.perf_counter() - start
+    if df.empty:
+        print(f"No indexed values for {what}")
+        return
+    print(df.to_string(index=False))
+    print(f"\n{df['cik'].nunique()} companies ({elapsed * 1000:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
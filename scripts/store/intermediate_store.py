@@ -0,0 +1,181 @@
+# scripts/store/intermediate_store.py
+
+"""
+Intermediate fact store.
+
+Extracted facts are written once per CIK either as CSV ({cik}_flat.csv, the
+historical format) or as Parquet. Parquet files are laid out as one Hive
+partition per CIK:
+
+    data/intermediate/facts/cik=<CIK>/part-0.parquet
+
+so every per-CIK file is also part of a single dataset covering all CIKs.
+Reads support column projection and predicate pushdown (row-group
+statistics) on tag, form and fy, and Parquet files are memory-mapped
+instead of parsed.
+
+Filters use the pyarrow list-of-tuples form, e.g.
+    [("tag", "in", ["Revenues", "NetIncomeLoss"]), ("form", "=", "10-K"), ("fy", ">=", 2020)]
+"""
+
+from pathlib import Path
+from typing import List, Optional
+import pandas as pd
+
+from config.settings import INTERMEDIATE_DIR, INTERMEDIATE_FORMAT, FACTS_DATASET_DIR
+from scripts.extract.parse_sec_json import apply_fact_schema
+
+
+FORMATS = ("parquet", "csv")
+
+# Rows per Parquet row group: small enough that min/max statistics on the
+# (tag-grouped) rows let readers skip most of a file for a tag filter.
+ROW_GROUP_SIZE = 16_384
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError(
+            "The Parquet intermediate store requires 'pyarrow' (pip install pyarrow)"
+        ) from e
+    return pyarrow
+
+
+def resolve_format(fmt: str = None) -> str:
+    """
+    Return the intermediate format to use, falling back to CSV when Parquet
+    is requested but pyarrow is not installed.
+    """
+    fmt = (fmt or INTERMEDIATE_FORMAT).lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown intermediate format '{fmt}', expected one of {FORMATS}")
+    if fmt == "parquet":
+        try:
+            _import_pyarrow()
+        except ImportError:
+            print("[intermediate_store] pyarrow not installed; writing CSV instead")
+            return "csv"
+    return fmt
+
+
+def intermediate_path(cik: str, fmt: str = None) -> Path:
+    """
+    Location of the intermediate facts for one CIK in the given format.
+    """
+    if (fmt or INTERMEDIATE_FORMAT) == "csv":
+        return Path(INTERMEDIATE_DIR) / f"{cik}_flat.csv"
+    return Path(FACTS_DATASET_DIR) / f"cik={cik}" / "part-0.parquet"
+
+
+def write_intermediate(df: pd.DataFrame, cik: str, fmt: str = None) -> Path:
+    """
+    Persist the extracted facts for one CIK, replacing any previous version.
+    Returns the path written.
+    """
+    fmt = resolve_format(fmt)
+    path = intermediate_path(cik, fmt)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    if fmt == "csv":
+        df.to_csv(path, index=False)
+        return path
+
+    pa = _import_pyarrow()
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    # write to a hidden temp file first so dataset scans never see a partial file
+    tmp = path.with_name(f".{path.name}.tmp")
+    pa.parquet.write_table(table, tmp, row_group_size=ROW_GROUP_SIZE, compression="zstd")
+    tmp.replace(path)
+    return path
+
+
+def _apply_filters(df: pd.DataFrame, filters: Optional[list]) -> pd.DataFrame:
+    """
+    Evaluate pyarrow-style (column, op, value) filters on a DataFrame.
+    """
+    if not filters:
+        return df
+    mask = pd.Series(True, index=df.index)
+    for col, op, value in filters:
+        s = df[col]
+        if op in ("=", "=="):
+            mask &= s == value
+        elif op == "!=":
+            mask &= s != value
+        elif op == "<":
+            mask &= s < value
+        elif op == "<=":
+            mask &= s <= value
+        elif op == ">":
+            mask &= s > value
+        elif op == ">=":
+            mask &= s >= value
+        elif op == "in":
+            mask &= s.isin(value)
+        elif op == "not in":
+            mask &= ~s.isin(value)
+        else:
+            raise ValueError(f"Unsupported filter operator '{op}'")
+    return df[mask.fillna(False).astype(bool)]
+
+
+def read_intermediate(cik: str,
+                      columns: List[str] = None,
+                      filters: list = None,
+                      fmt: str = None) -> pd.DataFrame:
+    """
+    Load the intermediate facts for one CIK.
+
+    - columns: optional projection (only these columns are read)
+    - filters: optional pyarrow-style predicates, pushed down for Parquet
+    - fmt: 'parquet' or 'csv'; defaults to whichever exists (Parquet first)
+    """
+    if fmt is None:
+        fmt = "parquet" if intermediate_path(cik, "parquet").exists() else "csv"
+    path = intermediate_path(cik, fmt)
+    if not path.exists():
+        raise FileNotFoundError(f"No intermediate facts for {cik} at {path}")
+
+    if fmt == "csv":
+        usecols = None
+        if columns is not None:
+            needed = set(columns) | {f[0] for f in (filters or [])}
+            usecols = lambda c: c in needed
+        df = apply_fact_schema(pd.read_csv(path, usecols=usecols))
+        df = _apply_filters(df, filters)
+        return df[columns].reset_index(drop=True) if columns is not None else df.reset_index(drop=True)
+
+    pa = _import_pyarrow()
+    table = pa.parquet.read_table(path, columns=columns, filters=filters, memory_map=True)
+    return table.to_pandas()
+
+
+def scan_facts(columns: List[str] = None,
+               filters: list = None,
+               ciks: List[str] = None) -> pd.DataFrame:
+    """
+    Query the partitioned Parquet dataset across every CIK at once.
+    The partition key is returned as a 'cik' column.
+
+    - columns: optional projection (may include 'cik')
+    - filters: optional pyarrow-style predicates on tag, form, fy, ...
+    - ciks: restrict to these CIK partitions
+    """
+    pa = _import_pyarrow()
+    ds = pa.dataset
+    dataset = ds.dataset(
+        str(FACTS_DATASET_DIR),
+        format="parquet",
+        partitioning=ds.partitioning(pa.schema([("cik", pa.string())]), flavor="hive"),
+    )
+
+    filters = list(filters or [])
+    if ciks:
+        filters.append(("cik", "in", list(ciks)))
+    expr = pa.parquet.filters_to_expression(filters) if filters else None
+
+    return dataset.to_table(columns=columns, filter=expr).to_pandas()
@@ -1,13 +1,34 @@
 # scripts/store/log_qc_results.py
 
+"""
+Per-CIK QC reports of missing periods, and an all-CIKs summary for batch runs.
+
+Usage:
+  python scripts/store/log_qc_results.py summary [CIK ...]
+"""
+
+import sys
+from pathlib import Path
+# Ensure project root is on sys.path so we can import our modules
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import argparse
 import json
+from typing import List
+
 import pandas as pd
-from pathlib import Path
 
-from config.settings import MAPPING_PATH, PROCESSED_DIR
+from config.settings import MAPPING_PATH, PROCESSED_DIR, QC_DIR
+
 
+def qc_report_path(cik: str, qc_dir=QC_DIR) -> Path:
+    """
+    Location of the QC report for one CIK.
+    """
+    return Path(qc_dir) / f"{cik}_qc_report.csv"
 
-def report_missing(df_all: pd.DataFrame, mapping_path: str, cik: str) -> None:
+
+def report_missing(df_all: pd.DataFrame, mapping_path: str, cik: str, qc_dir=QC_DIR) -> pd.DataFrame:
     """
     Generate a QC report of missing periods per standard term.
 
@@ -15,9 +36,17 @@ def report_missing(df_all: pd.DataFrame, mapping_path: str, cik: str) -> None:
         ['standard_term', 'value', 'filed']
     - mapping_path: path to the JSON mapping file
     - cik: the company identifier used for naming the report file
+    - qc_dir: directory receiving the report (default: data/qc_reports)
+
+    A period is a filing date (day) on which the term has at least one fact;
+    it is matched when one of those facts has a non-zero value, missing
+    otherwise. All terms are resolved in one groupby over (standard_term,
+    filed) and df_all is left untouched.
 
-    This writes `data/processed/{cik}_qc_report.csv` listing:
+    This writes `data/qc_reports/{cik}_qc_report.csv` listing:
       standard_term, section, total_periods, matched_periods, missing_periods
+    (missing periods newest first, e.g. "Nov 01 2024;May 03 2024").
+    Returns the report frame.
     """
     # Load mapping to know each term's section
     mapping_file = Path(mapping_path)
@@ -29,44 +58,97 @@ def report_missing(df_all: pd.DataFrame, mapping_path: str, cik: str) -> None:
         for term in terms.keys():
             term_to_section[term] = section
 
-    # Ensure 'filed_date' column exists, derived from 'filed'
-    if 'filed_date' not in df_all.columns:
-        df_all['filed_date'] = pd.to_datetime(
-            df_all['filed'], errors='coerce'
-        ).dt.strftime('%b %d %Y')
-
-    records = []
-    for term, section in term_to_section.items():
-        df_term = df_all[df_all['standard_term'] == term]
-        # All unique filing dates
-        unique_dates = df_term['filed_date'].dropna().unique()
-        # Sort dates descending
-        all_periods = sorted(
-            unique_dates,
-            key=lambda x: pd.to_datetime(x, format='%b %d %Y'),
-            reverse=True
-        )
-        # Periods where value != 0
-        matched = df_term[df_term['value'] != 0]['filed_date'].dropna().unique()
-        matched_periods = sorted(
-            matched,
-            key=lambda x: pd.to_datetime(x, format='%b %d %Y'),
-            reverse=True
-        )
-        # Missing periods
-        missing = [d for d in all_periods if d not in matched_periods]
-
-        records.append({
-            'standard_term': term,
-            'section': section,
-            'total_periods': len(all_periods),
-            'matched_periods': len(matched_periods),
-            'missing_periods': ";".join(missing)
-        })
-    df_report = pd.DataFrame(records)
-        # Create a separate QC reports directory
-    qc_dir = Path(PROCESSED_DIR).parent / "qc_reports"
-    qc_dir.mkdir(parents=True, exist_ok=True)
-    report_path = qc_dir / f"{cik}_qc_report.csv"
+    # One row per (term, filing day): does any fact carry a non-zero value?
+    facts = pd.DataFrame({
+        'standard_term': df_all['standard_term'].astype(object).to_numpy(),
+        'filed': pd.to_datetime(df_all['filed'], errors='coerce').dt.normalize().to_numpy(),
+        'matched': df_all['value'].ne(0).to_numpy(),
+    }).dropna(subset=['standard_term', 'filed'])
+    periods = facts.groupby(['standard_term', 'filed'], sort=False)['matched'].any().reset_index()
+
+    counts = periods.groupby('standard_term')['matched'].agg(['size', 'sum'])
+    missing = periods[~periods['matched']].sort_values('filed', ascending=False)
+    missing_labels = (missing['filed'].dt.strftime('%b %d %Y')
+                      .groupby(missing['standard_term'], sort=False).agg(";".join))
+
+    terms = pd.Index(list(term_to_section), name='standard_term')
+    df_report = pd.DataFrame({
+        'standard_term': terms,
+        'section': list(term_to_section.values()),
+        'total_periods': counts['size'].reindex(terms, fill_value=0).to_numpy(),
+        'matched_periods': counts['sum'].reindex(terms, fill_value=0).to_numpy(),
+        'missing_periods': missing_labels.reindex(terms, fill_value="").to_numpy(),
+    })
+
+    report_path = qc_report_path(cik, qc_dir)
+    report_path.parent.mkdir(parents=True, exist_ok=True)
     df_report.to_csv(report_path, index=False)
     print(f"QC report written to {report_path}")
+    return df_report
+
+
+def summarize_qc(ciks: List[str] = None, qc_dir=QC_DIR) -> pd.DataFrame:
+    """
+    Roll the per-CIK QC reports up into two batch-level tables:
+
+      qc_summary.csv       one row per CIK: terms, terms_found (any period),
+                           terms_complete (no missing period), total/matched
+                           periods and coverage (matched / total periods)
+      qc_term_summary.csv  one row per standard term: companies that report
+                           it, those of them with missing periods, and coverage
+
+    - ciks: restrict to these CIKs (default: every report in qc_dir)
+    Returns the per-CIK table.
+    """
+    qc_dir = Path(qc_dir)
+    if ciks is None:
+        paths = sorted(qc_dir.glob("*_qc_report.csv"))
+    else:
+        paths = [qc_dir / f"{cik}_qc_report.csv" for cik in ciks]
+        paths = [p for p in paths if p.exists()]
+    if not paths:
+        print(f"No QC reports found in {qc_dir}")
+        return pd.DataFrame()
+
+    reports = pd.concat(
+        [pd.read_csv(p, keep_default_na=False).assign(cik=p.name[:-len("_qc_report.csv")]) for p in paths],
+        ignore_index=True,
+    )
+    reports['found'] = reports['total_periods'] > 0
+    reports['complete'] = reports['found'] & (reports['matched_periods'] == reports['total_periods'])
+    reports['incomplete'] = reports['found'] & ~reports['complete']
+
+    by_cik = reports.groupby('cik', sort=True).agg(
+        terms=('standard_term', 'size'),
+        terms_found=('found', 'sum'),
+        terms_complete=('complete', 'sum'),
+        total_periods=('total_periods', 'sum'),
+        matched_periods=('matched_periods', 'sum'),
+    )
+    by_cik['coverage'] = (by_cik['matched_periods'] / by_cik['total_periods'].where(by_cik['total_periods'] > 0)).round(4)
+
+    by_term = reports.groupby(['section', 'standard_term'], sort=False).agg(
+        companies=('found', 'sum'),
+        companies_incomplete=('incomplete', 'sum'),
+        total_periods=('total_periods', 'sum'),
+        matched_periods=('matched_periods', 'sum'),
+    )
+    by_term['coverage'] = (by_term['matched_periods'] / by_term['total_periods'].where(by_term['total_periods'] > 0)).round(4)
+
+    by_cik.to_csv(qc_dir / "qc_summary.csv")
+    by_term.to_csv(qc_dir / "qc_term_summary.csv")
+
+    print(f"QC summary over {len(by_cik)} CIKs: "
+          f"{by_cik['terms_found'].sum() / by_cik['terms'].sum():.1%} of terms found, "
+          f"{by_cik['matched_periods'].sum() / max(by_cik['total_periods'].sum(), 1):.1%} of periods matched")
+    print(f"QC summaries written to {qc_dir / 'qc_summary.csv'} and {qc_dir / 'qc_term_summary.csv'}")
+    return by_cik.reset_index()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="QC reports of missing periods.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    summary = sub.add_parser("summary", help="All-CIKs summary of the per-CIK QC reports")
+    summary.add_argument("ciks", nargs="*", help="Restrict to these CIKs (default: all reports)")
+    args = parser.parse_args()
+    summarize_qc(args.ciks or None)
@@ -0,0 +1,158 @@
+# scripts/store/panel_store.py
+
+"""
+Cross-company panel: every CIK's derived values in one long-format Parquet
+dataset, so comparing companies never means opening thousands of workbooks.
+
+Rows are (cik, section, standard_term, fy, period, value, tag, form, filed),
+with value in USD, tag/form/filed naming the source fact (form "derived"
+for Q4) and only values that exist. The dataset is Hive-partitioned by
+section and fiscal year, with one file per CIK in each partition:
+
+    data/panel/section=<section>/fy=<fy>/<CIK>.parquet
+
+Appending a CIK rewrites only its own files, so pipeline workers add
+companies as they finish without coordinating, and re-running a CIK
+replaces its rows. A cross-sectional query ("Net sales for every company in
+FY2023") reads a single partition directory.
+
+Usage:
+  python scripts/store/panel_store.py query "Net sales" --fy 2023 [--period 10K] [--section income_statement]
+  python scripts/store/panel_store.py stats
+"""
+
+import sys
+from pathlib import Path
+# Ensure project root is on sys.path so we can import our modules
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import argparse
+from typing import List
+
+import pandas as pd
+
+from config.settings import PANEL_DIR
+from scripts.store.intermediate_store import _import_pyarrow
+
+
+PANEL_COLUMNS = ["cik", "section", "standard_term", "fy", "period", "value", "tag", "form", "filed"]
+
+
+def _partitioning(pa):
+    return pa.dataset.partitioning(
+        pa.schema([("section", pa.string()), ("fy", pa.int32())]), flavor="hive")
+
+
+def panel_rows(cik: str, tidy: pd.DataFrame) -> pd.DataFrame:
+    """
+    Panel rows for one CIK from derive_quarters(..., provenance=True) output:
+    rows without a value are dropped, and so is Q4 when there is no 10-K
+    value to derive it from.
+    """
+    rows = tidy[tidy["value"].notna() & ~((tidy["period"] == "Q4") & tidy["tag"].isna())]
+    rows = rows.assign(cik=cik, fy=rows["fy"].astype("int32"))
+    return rows[PANEL_COLUMNS].reset_index(drop=True)
+
+
+def write_panel(cik: str, tidy: pd.DataFrame, panel_dir=PANEL_DIR) -> List[Path]:
+    """
+    Append (or replace) one CIK in the panel. Each (section, fy) partition
+    gets a {cik}.parquet file, written to a hidden temp name first so
+    concurrent readers never see a partial file. Files left from a previous
+    run in partitions the CIK no longer has are removed afterwards.
+    Returns the paths written.
+    """
+    pa = _import_pyarrow()
+    panel_dir = Path(panel_dir)
+    rows = panel_rows(cik, tidy)
+
+    written = []
+    for (section, fy), part in rows.groupby(["section", "fy"], sort=True):
+        path = panel_dir / f"section={section}" / f"fy={fy}" / f"{cik}.parquet"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        table = pa.Table.from_pandas(part.drop(columns=["section", "fy"]), preserve_index=False)
+        tmp = path.with_name(f".{path.name}.tmp")
+        pa.parquet.write_table(table, tmp, compression="zstd")
+        tmp.replace(path)
+        written.append(path)
+
+    keep = set(written)
+    for stale in panel_dir.glob(f"section=*/fy=*/{cik}.parquet"):
+        if stale not in keep:
+            stale.unlink()
+    return written
+
+
+def scan_panel(columns: List[str] = None,
+               filters: list = None,
+               panel_dir=PANEL_DIR) -> pd.DataFrame:
+    """
+    Query the panel across every CIK. Filters on section and fy prune whole
+    partition directories; other predicates (standard_term, period, cik, ...)
+    are pushed down to the files.
+
+    - columns: optional projection (any of PANEL_COLUMNS)
+    - filters: optional pyarrow-style predicates, e.g. [("fy", "=", 2023)]
+    """
+    pa = _import_pyarrow()
+    panel_dir = Path(panel_dir)
+    if not panel_dir.exists():
+        return pd.DataFrame(columns=columns or PANEL_COLUMNS)
+
+    dataset = pa.dataset.dataset(str(panel_dir), format="parquet", partitioning=_partitioning(pa))
+    expr = pa.parquet.filters_to_expression(filters) if filters else None
+    df = dataset.to_table(columns=columns or PANEL_COLUMNS, filter=expr).to_pandas()
+    return df.reset_index(drop=True)
+
+
+def cross_section(standard_term: str,
+                  fy: int,
+                  period: str = "10K",
+                  section: str = None,
+                  panel_dir=PANEL_DIR) -> pd.DataFrame:
+    """
+    One term for every company in one fiscal year and period, e.g.
+    cross_section("Net sales", 2023). Returns cik, value, tag, form, filed
+    (plus section when not given, as term names repeat across sections),
+    sorted by CIK.
+    """
+    filters = [("fy", "=", int(fy)), ("standard_term", "=", standard_term), ("period", "=", period)]
+    columns = ["cik", "value", "tag", "form", "filed"]
+    if section:
+        filters.append(("section", "=", section))
+    else:
+        columns.insert(1, "section")
+    df = scan_panel(columns, filters, panel_dir)
+    return df.sort_values(columns[:2]).reset_index(drop=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Query the cross-company panel.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    q = sub.add_parser("query", help="One term for every company in a fiscal year")
+    q.add_argument("standard_term")
+    q.add_argument("--fy", type=int, required=True)
+    q.add_argument("--period", default="10K", choices=["10K", "Q1", "Q2", "Q3", "Q4"])
+    q.add_argument("--section", default=None)
+    sub.add_parser("stats", help="Rows, companies and fiscal years in the panel")
+    args = parser.parse_args()
+
+    if args.cmd == "query":
+        df = cross_section(args.standard_term, args.fy, args.period, args.section)
+        if df.empty:
+            print(f"No panel rows for '{args.standard_term}' FY{args.fy} {args.period}")
+            return
+        print(df.to_string(index=False))
+        print(f"\n{df['cik'].nunique()} companies")
+    else:
+        df = scan_panel(["cik", "section", "fy"])
+        if df.empty:
+            print(f"Panel at {PANEL_DIR} is empty")
+            return
+        print(f"{len(df):,} rows, {df['cik'].nunique():,} companies, "
+              f"FY {df['fy'].min()}–{df['fy'].max()}")
+        print(df.groupby("section").size().rename("rows").to_string())
+
+
+if __name__ == "__main__":
+    main()
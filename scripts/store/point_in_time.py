@@ -0,0 +1,258 @@
+# scripts/store/point_in_time.py
+
+"""
+Point-in-time (as-of filing date) view of the fact frame.
+
+Every fact is one version of the value of a key (cik, tag, end, basis),
+published on its filing date; a later filing that reports the same key
+(a comparative, a restatement, an amendment) supersedes it from its own
+filed date on. The value visible at an as-of date D is the one from the
+latest filing with filed <= D.
+
+The basis stands in for the period length, which facts do not carry (no
+start date): a 10-K's annual figure and a 10-Q's quarter ending on the
+same day are different facts, so flows are keyed by the base form with
+amendments folded in (10-K/A supersedes 10-K, 10-Q/A supersedes 10-Q).
+Instants (balance-sheet tags, by default those of the mapping's
+balance_sheet section) have basis "instant" and are superseded by any
+later filing. The filing's actual form is kept as an output column.
+Within one filing, the first fact in file order wins, as in
+FactIndex.value_at.
+
+AsOfIndex sorts the versions once by (key, filed) and packs both into one
+int64 per row, so resolving any set of keys at any number of as-of dates is
+a single np.searchsorted over the cross product — no rescanning per date.
+
+  - as_of(dates, ...):  long frame of visible values per as-of date
+  - versions(...):      every version with its validity interval
+                        [filed, valid_to) and whether it revised the value
+
+facts_as_of(facts, date) returns the fact frame as it stood on that date, so
+the usual stages (match, derive_quarters, save_results) reproduce what was
+known then.
+
+Usage:
+  python scripts/store/point_in_time.py as-of <CIK> <tag> --dates 2019-01-01 2020-01-01 [--end 2018-09-29] [--form 10-K]
+  python scripts/store/point_in_time.py history <CIK> <tag> [--end 2018-09-29]
+"""
+
+import sys
+from pathlib import Path
+# Ensure project root is on sys.path so we can import our modules
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import argparse
+import json
+from typing import Iterable, List
+
+import numpy as np
+import pandas as pd
+
+from config.settings import MAPPING_PATH
+
+KEY = ["cik", "tag", "end", "basis"]
+INSTANT = "instant"
+
+# low bits of the packed (key, filed day) sort key; 2**24 days is ~45,000 years
+_DAY_BITS = 24
+_NS_PER_DAY = 86_400 * 10**9
+
+
+def _days(values) -> np.ndarray:
+    """
+    Whole days since the epoch of datetime-like values (int64).
+    """
+    return pd.to_datetime(pd.Series(values)).to_numpy("datetime64[ns]").astype("int64") // _NS_PER_DAY
+
+
+def _base_form(form) -> str:
+    return str(form).replace("/A", "")
+
+
+def balance_sheet_tags(mapping_path=MAPPING_PATH) -> List[str]:
+    """
+    Unqualified tags of the mapping's balance_sheet section (instants).
+    """
+    mapping = json.loads(Path(mapping_path).read_text())
+    return list(dict.fromkeys(str(t).split(":", 1)[-1]
+                              for tags in mapping.get("balance_sheet", {}).values() for t in tags))
+
+
+def facts_as_of(facts: pd.DataFrame, as_of) -> pd.DataFrame:
+    """
+    The fact frame as it stood at `as_of`: only facts filed on or before
+    that date. Downstream stages keep the latest-filed fact per period, so
+    running them on this frame reproduces the values known at the date.
+    """
+    return facts[facts["filed"] <= pd.Timestamp(as_of)].reset_index(drop=True)
+
+
+class AsOfIndex:
+    """
+    As-of index over a fact frame (one CIK's extract, or many CIKs with a
+    'cik' column, e.g. intermediate_store.scan_facts()).
+
+    - facts: frame with tag, end, form, filed, value (and cik)
+    - cik: CIK for a single-company frame without a 'cik' column
+    - instant_tags: tags whose values are instants, keyed regardless of
+      form (default: balance_sheet_tags())
+    Facts without an end or filed date are not indexed.
+    """
+
+    def __init__(self, facts: pd.DataFrame, cik: str = None, instant_tags: Iterable[str] = None):
+        if "cik" not in facts.columns:
+            if cik is None:
+                raise ValueError("facts have no 'cik' column; pass cik=")
+            facts = facts.assign(cik=cik)
+        instant_tags = set(balance_sheet_tags() if instant_tags is None
+                           else (str(t).split(":", 1)[-1] for t in instant_tags))
+        df = facts[["cik", "tag", "end", "form", "filed", "value"]]
+        df = df[df["end"].notna() & df["filed"].notna()]
+        tag = df["tag"].astype(str).str.split(":", n=1).str[-1]
+        form = df["form"].astype(str)
+        df = df.assign(
+            tag=tag,
+            form=form,
+            basis=form.str.replace("/A", "", regex=False).where(~tag.isin(instant_tags), INSTANT),
+            _pos=np.arange(len(df)),
+        )
+        # file order breaks ties, then one version per (key, filing day)
+        df = df.sort_values(KEY + ["filed", "_pos"])
+        day = df["filed"].to_numpy("datetime64[ns]").astype("int64") // _NS_PER_DAY
+        key_id = df.groupby(KEY, sort=False, observed=True, dropna=False).ngroup().to_numpy()
+        first = np.ones(len(df), dtype=bool)
+        first[1:] = (key_id[1:] != key_id[:-1]) | (day[1:] != day[:-1])
+        df, day, key_id = df[first], day[first], key_id[first]
+
+        self._day0 = int(day.min()) - 1 if len(day) else 0
+        if len(day) and int(day.max()) - self._day0 >= 1 << _DAY_BITS:
+            raise ValueError("filed dates span too many days to pack")
+        self._packed = (key_id.astype("int64") << _DAY_BITS) | (day - self._day0)
+        self._row_key = key_id
+        self._values = df["value"].to_numpy("float64")
+        self._filed = df["filed"].to_numpy("datetime64[ns]")
+        self._forms = df["form"].to_numpy(dtype=object)
+        # one row per key, in key_id order
+        starts = np.flatnonzero(np.r_[True, key_id[1:] != key_id[:-1]]) if len(df) else np.array([], int)
+        self.keys = df.iloc[starts][KEY].reset_index(drop=True)
+
+    @classmethod
+    def from_intermediate(cls, ciks: List[str] = None, tags: Iterable[str] = None) -> "AsOfIndex":
+        """
+        Index the intermediate Parquet dataset across CIKs (optionally only
+        these CIKs and tags, pushed down to the scan).
+        """
+        from scripts.store.intermediate_store import scan_facts
+
+        filters = [("tag", "in", sorted(set(tags)))] if tags is not None else None
+        facts = scan_facts(columns=["cik", "tag", "end", "form", "filed", "value"],
+                           filters=filters, ciks=ciks)
+        return cls(facts)
+
+    def __len__(self) -> int:
+        return len(self._packed)
+
+    def _select(self, ciks=None, tags=None, ends=None, form=None) -> np.ndarray:
+        """
+        key_ids of the keys matching the given restrictions.
+        """
+        mask = np.ones(len(self.keys), dtype=bool)
+        if ciks is not None:
+            mask &= self.keys["cik"].isin([ciks] if isinstance(ciks, str) else list(ciks)).to_numpy()
+        if tags is not None:
+            tags = [tags] if isinstance(tags, str) else list(tags)
+            mask &= self.keys["tag"].isin([str(t).split(":", 1)[-1] for t in tags]).to_numpy()
+        if ends is not None:
+            ends = [ends] if isinstance(ends, str) else list(ends)
+            mask &= self.keys["end"].isin(pd.to_datetime(ends)).to_numpy()
+        if form is not None:
+            # amendments count as their base form; instants are form-independent
+            mask &= self.keys["basis"].isin([_base_form(form), INSTANT]).to_numpy()
+        return np.flatnonzero(mask)
+
+    def as_of(self, dates, ciks=None, tags=None, ends=None, form: str = None) -> pd.DataFrame:
+        """
+        Values visible at each as-of date, for every key matching the
+        restrictions (ciks, tags, ends: one value or a list; form: e.g.
+        "10-K", which also covers 10-K/A and instants). Keys not yet reported
+        at a date are left out.
+
+        returns: frame (as_of, cik, tag, end, basis, value, form, filed),
+        where form and filed are those of the filing that supplied the value
+        """
+        dates = pd.to_datetime(pd.Series(np.atleast_1d(dates))).drop_duplicates().sort_values()
+        key_ids = self._select(ciks, tags, ends, form)
+        offsets = _days(dates) - self._day0
+        # before the earliest filing nothing is visible; clip so packing stays in range
+        known = offsets > 0
+        offsets = np.clip(offsets, 0, (1 << _DAY_BITS) - 1)
+
+        # date-major grid: the result comes out ordered by as_of, then key
+        query = ((key_ids.astype("int64")[None, :] << _DAY_BITS) | offsets[:, None]).ravel()
+        query_key = np.tile(key_ids, len(offsets))
+        row = np.searchsorted(self._packed, query, side="right") - 1
+        hit = row >= 0
+        hit[hit] = self._row_key[row[hit]] == query_key[hit]
+        hit &= np.repeat(known, len(key_ids))
+
+        out = self.keys.iloc[query_key[hit]].reset_index(drop=True)
+        out.insert(0, "as_of", np.repeat(dates.to_numpy(), len(key_ids))[hit])
+        out["value"] = self._values[row[hit]]
+        out["form"] = self._forms[row[hit]]
+        out["filed"] = self._filed[row[hit]]
+        return out
+
+    def versions(self, ciks=None, tags=None, ends=None, form: str = None) -> pd.DataFrame:
+        """
+        Every version of the matching keys: value, filed, valid_to (next
+        version's filed date, NaT while current) and revised (the value
+        differs from the version it superseded).
+        """
+        key_ids = self._select(ciks, tags, ends, form)
+        rows = np.flatnonzero(np.isin(self._row_key, key_ids))
+        key = self._row_key[rows]
+        same_next = np.r_[key[1:] == key[:-1], False]
+        same_prev = np.r_[False, key[1:] == key[:-1]]
+        values = self._values[rows]
+        filed = self._filed[rows]
+
+        out = self.keys.iloc[key].reset_index(drop=True)
+        out["value"] = values
+        out["form"] = self._forms[rows]
+        out["filed"] = filed
+        out["valid_to"] = np.where(same_next, np.r_[filed[1:], filed[:1]], np.datetime64("NaT"))
+        out["revised"] = same_prev & (values != np.r_[values[:1], values[:-1]])
+        return out
+
+
+def main() -> None:
+    from scripts.store.quarterly import load_facts
+
+    parser = argparse.ArgumentParser(description="Point-in-time fact values.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    a = sub.add_parser("as-of", help="Values of a tag visible at as-of dates")
+    a.add_argument("cik")
+    a.add_argument("tag")
+    a.add_argument("--dates", nargs="+", required=True, help="As-of dates, YYYY-MM-DD")
+    a.add_argument("--end", default=None, help="Only this period end")
+    a.add_argument("--form", default=None, help="e.g. 10-K (amendments included)")
+    h = sub.add_parser("history", help="Every filed version of a tag's values")
+    h.add_argument("cik")
+    h.add_argument("tag")
+    h.add_argument("--end", default=None, help="Only this period end")
+    h.add_argument("--form", default=None, help="e.g. 10-K (amendments included)")
+    args = parser.parse_args()
+
+    index = AsOfIndex(load_facts(args.cik, [args.tag]), cik=args.cik)
+    if args.cmd == "as-of":
+        df = index.as_of(args.dates, tags=args.tag, ends=args.end, form=args.form).drop(columns=["cik", "tag"])
+    else:
+        df = index.versions(tags=args.tag, ends=args.end, form=args.form).drop(columns=["cik", "tag"])
+    if df.empty:
+        print(f"No facts for {args.tag} in {args.cik}")
+        return
+    print(df.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+# scripts/store/quarterly.py
+
+"""
+Vectorized fiscal-quarter derivation over the typed fact frame.
+
+For every standard term (per mapping section) and every fiscal year FY whose
+previous year FY-1 also has a fiscal-year end:
+
+  - 10K: the 10-K value reported for the period ending at FY's end. When
+         several of the term's tags carry one, the tag listed last in the
+         mapping wins; within a tag, the last fact in file order.
+  - Q1–Q3: the minimum 10-Q value per fiscal period over facts ending strictly
+         between the FY-1 end and the FY end (quarter-only figures are smaller
+         than the year-to-date ones filed alongside them).
+  - Q4:  10K − (Q1 + Q2 + Q3), missing values counting as 0.
+
+Two options change these rules:
+
+  - window_start="previous": the window opens at the latest earlier fiscal-year
+         end in fy_map, so a year after a gap (no FY-1 10-K) still gets one
+  - precedence="first": the tag listed first in the mapping wins the 10K,
+         and within a tag the first fact in file order
+
+With provenance=True every value also carries the fact it came from (tag,
+form, filed). Q4 is attributed to its 10-K fact with form "derived".
+
+Every 10-Q fact is assigned to its fiscal-year window with one cross join
+against the (FY-1 end, FY end) table, and all terms and years are resolved
+with a handful of merge/groupby operations instead of per-term loops.
+"""
+
+from typing import Dict, Iterable, List
+
+import numpy as np
+import pandas as pd
+
+from config.settings import RAW_DIR
+
+
+PERIODS = ("10K", "Q1", "Q2", "Q3", "Q4")
+QUARTERS = ("Q1", "Q2", "Q3")
+
+_FACT_COLUMNS = ["tag", "value", "fy", "fp", "form", "filed", "end"]
+PROVENANCE = ["tag", "form", "filed"]
+
+
+def _bare(tag) -> str:
+    return str(tag).split(":", 1)[-1]
+
+
+def mapped_tags(mapping: dict) -> List[str]:
+    """
+    Distinct unqualified tags across every section of the mapping JSON.
+    """
+    return list(dict.fromkeys(_bare(t) for section in mapping.values()
+                              for tags in section.values() for t in tags))
+
+
+def load_facts(cik: str, tags: Iterable[str] = None) -> pd.DataFrame:
+    """
+    Typed facts for one CIK, from the intermediate store when it exists
+    (restricted to `tags` by predicate pushdown), else extracted from
+    data/raw/{cik}.json.
+    """
+    from scripts.store.intermediate_store import read_intermediate
+
+    tags = sorted({_bare(t) for t in tags}) if tags is not None else None
+    try:
+        return read_intermediate(cik, columns=_FACT_COLUMNS,
+                                 filters=[("tag", "in", tags)] if tags is not None else None)
+    except FileNotFoundError:
+        from scripts.extract.parse_sec_json import extract_usd_facts_from_file
+        df = extract_usd_facts_from_file(str(RAW_DIR / f"{cik}.json"))
+        if tags is not None:
+            df = df[df["tag"].isin(tags)].reset_index(drop=True)
+        return df
+
+
+def fiscal_year_ends(facts: pd.DataFrame,
+                     tags: Iterable[str] = None,
+                     require_val: bool = False,
+                     include_in_progress: bool = False) -> Dict[int, pd.Timestamp]:
+    """
+    Fiscal year → latest 10-K period end, over `tags` (default: all facts).
+
+    - require_val: only count facts that carry a value
+    - include_in_progress: also add the latest fiscal year seen on a 10-Q
+      (with a value) at its latest 10-Q period end, if it has no 10-K yet
+    """
+    if tags is not None:
+        facts = facts[facts["tag"].isin({_bare(t) for t in tags})]
+    dated = facts[facts["fy"].fillna(0).ne(0) & facts["end"].notna()]
+
+    annual = dated[dated["form"] == "10-K"]
+    if require_val:
+        annual = annual[annual["value"].notna()]
+    fy_map = annual.groupby(annual["fy"].astype(int))["end"].max().to_dict()
+
+    if include_in_progress:
+        quarterly = dated[(dated["form"] == "10-Q") & dated["value"].notna()]
+        if not quarterly.empty:
+            fy = int(quarterly["fy"].max())
+            if fy not in fy_map:
+                fy_map[fy] = quarterly.loc[quarterly["fy"] == fy, "end"].max()
+
+    return dict(sorted(fy_map.items()))
+
+
+def _term_tags(mapping: dict, precedence: str = "last") -> pd.DataFrame:
+    """
+    One row per (section, term, tag) with the tag's precedence: its last
+    position in the term's tag list (precedence="first": its first position).
+    """
+    rows = []
+    for section, terms in mapping.items():
+        for term, tags in terms.items():
+            ranks = {}
+            for rank, tag in enumerate(tags):
+                if precedence == "last" or _bare(tag) not in ranks:
+                    ranks[_bare(tag)] = rank
+            rows += [(section, term, tag, rank) for tag, rank in ranks.items()]
+    return pd.DataFrame(rows, columns=["section", "standard_term", "tag", "_rank"])
+
+
+def derive_quarters(facts: pd.DataFrame, mapping: dict, fy_map: Dict[int, object],
+                    provenance: bool = False,
+                    window_start: str = "fy-1",
+                    precedence: str = "last") -> pd.DataFrame:
+    """
+    Derive 10K, Q1–Q3 and Q4 values for every term and fiscal year (see module
+    docstring).
+
+    - facts: typed fact frame (tag, value, form, fp, end) in file order, e.g.
+             the extractor output or the intermediate store
+    - mapping: mapping JSON (section → standard term → tags)
+    - fy_map: fiscal year → FY period end (see fiscal_year_ends)
+    - provenance: add the source fact's tag, form and filed columns (facts
+                  must then have a 'filed' column)
+    - window_start: "fy-1" (quarters of FY lie after the FY-1 end) or
+                  "previous" (after the latest earlier FY end in fy_map)
+    - precedence: "last" (last listed tag, last fact wins the 10K) or "first"
+                  (first listed tag, first fact)
+
+    returns: tidy frame (section, standard_term, fy, period, value), one row per
+             term × fiscal year × period, ordered like the mapping. value is
+             NaN where no fact exists, and for years without a previous FY end.
+    """
+    if window_start not in ("fy-1", "previous"):
+        raise ValueError(f"window_start must be 'fy-1' or 'previous', not {window_start!r}")
+    if precedence not in ("last", "first"):
+        raise ValueError(f"precedence must be 'last' or 'first', not {precedence!r}")
+    years = sorted(fy_map)
+    if window_start == "previous":
+        prev_ends = [None] + [fy_map[fy] for fy in years[:-1]]
+    else:
+        prev_ends = [fy_map.get(fy - 1) for fy in years]
+    windows = pd.DataFrame({
+        "fy": np.asarray(years, dtype=np.int64),
+        "prev_end": pd.to_datetime(pd.Series(prev_ends, dtype=object)).astype("datetime64[ns]"),
+        "this_end": pd.to_datetime(pd.Series([fy_map[fy] for fy in years], dtype=object)).astype("datetime64[ns]"),
+    }).dropna(subset=["prev_end"])
+
+    term_tags = _term_tags(mapping, precedence)
+    f = pd.DataFrame({
+        "tag": facts["tag"].astype(str).to_numpy(),
+        "value": facts["value"].to_numpy(dtype=np.float64, na_value=np.nan),
+        "form": facts["form"].astype(object).to_numpy(),
+        "fp": facts["fp"].astype(object).to_numpy(),
+        "end": pd.to_datetime(facts["end"]).astype("datetime64[ns]").to_numpy(),
+        "_pos": np.arange(len(facts)),
+    })
+    if provenance:
+        f["filed"] = pd.to_datetime(facts["filed"]).astype("datetime64[ns]").to_numpy()
+    f = f[f["tag"].isin(set(term_tags["tag"]))]
+    keys = ["section", "standard_term", "fy"]
+
+    # 10K: facts at the FY end, highest-precedence tag, last (or first) fact in file order
+    annual = f[f["form"] == "10-K"].merge(windows[["fy", "this_end"]], left_on="end", right_on="this_end")
+    annual = annual.merge(term_tags, on="tag").sort_values(keys + ["_rank", "_pos"], kind="stable")
+    annual = annual.drop_duplicates(keys, keep=precedence).set_index(keys)
+    totals = annual["value"].rename("10K")
+
+    # Q1–Q3: 10-Q facts inside the (previous FY end, FY end) window, minimum per period
+    q = f[(f["form"] == "10-Q") & f["fp"].isin(QUARTERS) & f["value"].notna() & f["end"].notna()]
+    q = q.drop(columns="form").merge(windows, how="cross")
+    q = q[(q["end"] > q["prev_end"]) & (q["end"] < q["this_end"])]
+    q = q.merge(term_tags[["section", "standard_term", "tag"]], on="tag")
+    # minimum per period; ties go to the first fact in file order
+    q = q.sort_values(["value", "_pos"], kind="stable").drop_duplicates(keys + ["fp"]).set_index(keys + ["fp"])
+    quarters = q["value"].unstack("fp")
+
+    # Full grid in mapping order, one column per period
+    grid = pd.MultiIndex.from_tuples(
+        [(s, t, fy) for s, terms in mapping.items() for t in terms for fy in years], names=keys)
+    wide = pd.DataFrame(index=grid)
+    wide["10K"] = totals.reindex(grid)
+    for fp in QUARTERS:
+        wide[fp] = quarters[fp].reindex(grid) if fp in quarters.columns else np.nan
+    has_window = wide.index.get_level_values("fy").isin(windows["fy"])
+    filled = wide[["10K", *QUARTERS]].fillna(0)
+    wide["Q4"] = np.where(has_window, filled["10K"] - (filled["Q1"] + filled["Q2"] + filled["Q3"]), np.nan)
+
+    wide = wide[list(PERIODS)].rename_axis(columns="period")
+    tidy = wide.stack().rename("value").reset_index()
+    if not provenance:
+        return tidy
+
+    source = pd.concat([
+        annual[["tag", "form", "filed"]].assign(period="10K"),
+        annual[["tag", "filed"]].assign(form="derived", period="Q4"),
+        q[["tag", "filed"]].assign(form="10-Q").reset_index("fp").rename(columns={"fp": "period"}),
+    ]).reset_index()
+    tidy = tidy.merge(source, on=keys + ["period"], how="left")
+    tidy.loc[tidy["value"].isna(), PROVENANCE] = None
+    return tidy
@@ -1,82 +1,150 @@
+# scripts/store/save_results.py
+
 import json
 from pathlib import Path
+import numpy as np
 import pandas as pd
-from openpyxl.utils import get_column_letter
+
+from config.settings import OUTPUT_FORMAT
+from scripts.store.quarterly import PERIODS, derive_quarters, fiscal_year_ends, load_facts, mapped_tags
+
+
+OUTPUT_FORMATS = ("xlsx", "parquet", "csv")
 
 
-def _compute_term_quarters(raw_facts: dict, tags: list, prev_end: str, this_end: str):
+def output_path(cik: str, out_dir, fmt: str = None) -> Path:
     """
-    For a given set of GAAP tags, compute Q1–Q3 (min of all 10-Qs between prev_end and this_end)
-    and the FY total (10-K at this_end). Returns (q_vals, total_val, q4_val).
+    Results file for one CIK: {cik}_results.xlsx, .parquet or .csv.
     """
-    # Find FY-end total
-    total_val = 0
-    for tag in tags:
-        fact = raw_facts.get(tag) or raw_facts.get(tag.split(':', 1)[-1])
-        if not fact:
-            continue
-        for e in fact.get('units', {}).get('USD', []):
-            if e.get('form') == '10-K' and e.get('end') == this_end:
-                total_val = e.get('val') or 0
-
-    # Bucket Q1–Q3
-    buckets = {'Q1': [], 'Q2': [], 'Q3': []}
-    for tag in tags:
-        fact = raw_facts.get(tag) or raw_facts.get(tag.split(':', 1)[-1])
-        if not fact:
-            continue
-        for e in fact.get('units', {}).get('USD', []):
-            fp = e.get('fp')
-            if e.get('form') == '10-Q' and fp in buckets:
-                end = e.get('end')
-                val = e.get('val')
-                if end and val is not None and prev_end < end < this_end:
-                    buckets[fp].append(val)
-
-    q_vals = {q: (min(vals) if vals else 0) for q, vals in buckets.items()}
-    q4 = total_val - sum(q_vals.values())
-    return q_vals, total_val, q4
+    fmt = (fmt or OUTPUT_FORMAT).lower()
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format '{fmt}', expected one of {OUTPUT_FORMATS}")
+    return Path(out_dir) / f"{cik}_results.{fmt}"
+
+
+def _column_widths(df_sheet: pd.DataFrame, header_rows: list) -> list:
+    """
+    Auto-fit widths for the index column and every data column, computed from
+    the frame instead of re-reading the cells: the longest text per column
+    (zeros count as empty, like blank cells) plus 2.
+    """
+    values = df_sheet.to_numpy(dtype=np.float64)
+    lens = np.char.str_len(values.astype(str))
+    lens[values == 0] = 0
+    data = lens.max(axis=0, initial=0)
+    for labels in header_rows:
+        data = np.maximum(data, [len(label) for label in labels])
+    index = max((len(str(term)) for term in df_sheet.index), default=0)
+    return [index + 2, *(int(w) + 2 for w in data)]
+
+
+def write_workbook(sheets: list, out_path) -> None:
+    """
+    Stream (sheet_name, frame) pairs into a constant-memory workbook: two
+    header rows (FY labels, sub-periods), then one row per term, with column
+    widths set up front. Rows go straight to disk, so memory stays flat
+    whatever the number of terms and years.
+
+    Uses xlsxwriter when installed (about twice as fast), else a write-only
+    openpyxl workbook.
+    """
+    tmp = Path(out_path).with_name(f".{Path(out_path).name}.tmp")
+    try:
+        import xlsxwriter
+    except ImportError:
+        xlsxwriter = None
+
+    if xlsxwriter is not None:
+        wb = xlsxwriter.Workbook(str(tmp), {"constant_memory": True})
+    else:
+        from openpyxl import Workbook
+        from openpyxl.utils import get_column_letter
+        wb = Workbook(write_only=True)
+
+    for sheet_name, df_sheet in sheets:
+        fy_labels = [f"FY {col.split('-', 1)[0]}" for col in df_sheet.columns]
+        sub_labels = [col.split("-", 1)[1] for col in df_sheet.columns]
+        widths = _column_widths(df_sheet, [fy_labels, sub_labels])
+        rows = zip(df_sheet.index, df_sheet.to_numpy(dtype=np.float64).tolist())
+
+        if xlsxwriter is not None:
+            ws = wb.add_worksheet(sheet_name)
+            for idx, width in enumerate(widths):
+                ws.set_column(idx, idx, width)
+            ws.write_row(0, 1, fy_labels)
+            ws.write_row(1, 1, sub_labels)
+            for r, (term, row) in enumerate(rows, start=2):
+                ws.write_string(r, 0, str(term))
+                ws.write_row(r, 1, row)
+        else:
+            ws = wb.create_sheet(sheet_name)
+            for idx, width in enumerate(widths, start=1):
+                ws.column_dimensions[get_column_letter(idx)].width = width
+            ws.append([None, *fy_labels])
+            ws.append([None, *sub_labels])
+            for term, row in rows:
+                ws.append([term, *row])
+
+    if xlsxwriter is not None:
+        wb.close()
+    else:
+        wb.save(tmp)
+    tmp.replace(out_path)
+
+
+def write_table(tidy: pd.DataFrame, cik: str, out_path, fmt: str) -> None:
+    """
+    Machine-readable results: the tidy (cik, section, standard_term, fy,
+    period, value, tag, form, filed) frame as Parquet or CSV. Values are in
+    USD, not millions, and missing values stay empty instead of 0.
+    """
+    table = tidy[["section", "standard_term", "fy", "period", "value", "tag", "form", "filed"]]
+    table.insert(0, "cik", cik)
+    tmp = Path(out_path).with_name(f".{Path(out_path).name}.tmp")
+    if fmt == "parquet":
+        from scripts.store.intermediate_store import _import_pyarrow
+        _import_pyarrow()
+        table.to_parquet(tmp, index=False, compression="zstd")
+    else:
+        table.to_csv(tmp, index=False)
+    tmp.replace(out_path)
 
 
 def save_results(df_matched: pd.DataFrame,
                  mapping_path: str,
                  out_path: str,
-                 fy_map_override: dict = None) -> None:
+                 fy_map_override: dict = None,
+                 facts: pd.DataFrame = None,
+                 output_format: str = "xlsx") -> pd.DataFrame:
     """
     Writes three sheets—Income, Balance, Cashflow—with FY columns side-by-side.
     Each FY produces columns: <FY>-10K, <FY>-Q1, <FY>-Q2, <FY>-Q3, <FY>-Q4 (values in millions).
     Fiscal years are in descending order (latest first).
+
+    Quarterly values come from scripts/store/quarterly.derive_quarters over
+    `facts`, the CIK's typed fact frame (e.g. the extractor output). If not
+    given, the mapped tags' facts are read from the intermediate store.
+
+    output_format "parquet" or "csv" skips the workbook and writes the tidy
+    table instead (see write_table).
+
+    Returns the tidy frame with provenance (derive_quarters(..., provenance=True)).
     """
     # Infer CIK from output filename
     cik = Path(out_path).stem.split('_')[0]
 
-    # Load mapping and raw facts
+    # Load mapping and the facts of every mapped tag
     mapping = json.load(Path(mapping_path).open())
-    raw = json.loads(Path(f"data/raw/{cik}.json").read_text())
-    raw_facts = raw.get('facts', {}).get('us-gaap', {})
-    
-    # 1) Gather all 10-K records (fy, end) and map to latest end per FY
+    all_tags = mapped_tags(mapping)
+    if facts is None:
+        facts = load_facts(cik, all_tags)
+
+    # 1) Latest 10-K period end per FY across every mapped tag
     # ─── override if provided ─────────────────────────────────────────────
     if fy_map_override is not None:
         fy_map = fy_map_override
     else:
-        # 1) Gather all 10-K records
-        k_recs = []
-        for section in mapping.values():
-            for tags in section.values():
-                for tag in tags:
-                    fact = raw_facts.get(tag) or raw_facts.get(tag.split(":",1)[-1])
-                    if not fact:
-                        continue
-                    for e in fact.get("units", {}).get("USD", []):
-                        if e.get("form") == "10-K" and e.get("fy") and e.get("end"):
-                            k_recs.append((int(e["fy"]), e["end"], e.get("val") or 0))
-
-        # 2) Build fy_map from those records
-        fy_map = {}
-        for fy, end, _ in k_recs:
-            if fy not in fy_map or end > fy_map[fy]:
-                fy_map[fy] = end
+        fy_map = fiscal_year_ends(facts, all_tags)
 
     # Descending years: latest first
     years = sorted(fy_map.keys(), reverse=True)
@@ -84,75 +152,33 @@ def save_results(df_matched: pd.DataFrame,
         raise ValueError(f"No fiscal years found for {cik}")
 
     # Prepare the column order: for each FY (desc), 10-K, Q1, Q2, Q3, Q4
-    all_cols = []
-    for fy in years:
-        all_cols += [f"{fy}-10K", f"{fy}-Q1", f"{fy}-Q2", f"{fy}-Q3", f"{fy}-Q4"]
+    all_cols = [f"{fy}-{period}" for fy in years for period in PERIODS]
+
+    # 2) Build each statement sheet from the tidy (term, fy, period, value) frame
+    tidy = derive_quarters(facts, mapping, fy_map, provenance=True)
+    if output_format != "xlsx":
+        write_table(tidy, cik, out_path, output_format)
+        print(f"Results saved to {out_path}")
+        return tidy
 
-    # 2) Build each statement sheet
+    tidy = tidy.assign(column=tidy["fy"].astype(str) + "-" + tidy["period"])
     sheets = []
     for sheet_name, section_key in [
         ("Income Statement",   "income_statement"),
         ("Balance Sheet",      "balance_sheet"),
         ("Cashflow Statement", "cashflow_statement")
     ]:
-        rows = []
-        for std_term, tags in mapping.get(section_key, {}).items():
-            rec = {"standard_term": std_term}
-            for fy in years:
-                prev_end = fy_map.get(fy - 1)
-                this_end = fy_map[fy]
-                if prev_end is None:
-                    # no prior FY: all zeros
-                    rec[f"{fy}-10K"] = 0
-                    rec[f"{fy}-Q1"]  = 0
-                    rec[f"{fy}-Q2"]  = 0
-                    rec[f"{fy}-Q3"]  = 0
-                    rec[f"{fy}-Q4"]  = 0
-                else:
-                    q_vals, total, q4 = _compute_term_quarters(raw_facts, tags, prev_end, this_end)
-                    rec[f"{fy}-10K"] = total or 0
-                    rec[f"{fy}-Q1"]  = q_vals.get("Q1", 0)
-                    rec[f"{fy}-Q2"]  = q_vals.get("Q2", 0)
-                    rec[f"{fy}-Q3"]  = q_vals.get("Q3", 0)
-                    rec[f"{fy}-Q4"]  = q4
-            rows.append(rec)
-
-        df_sheet = pd.DataFrame(rows).set_index("standard_term") / 1e6
-        df_sheet = df_sheet[all_cols]
+        terms = list(mapping.get(section_key, {}))
+        df_sheet = (
+            tidy[tidy["section"] == section_key]
+            .pivot(index="standard_term", columns="column", values="value")
+            .reindex(index=terms, columns=all_cols)
+            .fillna(0)
+        ) / 1e6
         sheets.append((sheet_name, df_sheet))
 
     # 3) Write to Excel with three sheets
-    with pd.ExcelWriter(out_path, engine="openpyxl") as writer:
-        for sheet_name, df_sheet in sheets:
-            df_sheet.to_excel(
-                writer,
-                sheet_name=sheet_name,
-                startrow=2,
-                startcol=0,
-                header=False
-            )
-            ws = writer.sheets[sheet_name]
-
-            # Row 1: FY labels (desc order)
-            for idx, col in enumerate(df_sheet.columns, start=2):
-                fy_label = col.split("-", 1)[0]
-                ws.cell(row=1, column=idx, value=f"FY {fy_label}")
-
-            # Row 2: sub-period labels
-            for idx, col in enumerate(df_sheet.columns, start=2):
-                sub = col.split("-", 1)[1]
-                ws.cell(row=2, column=idx, value=sub)
-
-            # Auto-adjust column widths
-            total_rows = 3 + len(df_sheet)
-            total_cols = 1 + len(df_sheet.columns)
-            for col_idx in range(1, total_cols + 1):
-                max_len = max(
-                    len(str(ws.cell(row=r, column=col_idx).value or ""))
-                    for r in range(1, total_rows + 1)
-                )
-                ws.column_dimensions[get_column_letter(col_idx)].width = max_len + 2
+    write_workbook(sheets, out_path)
 
     print(f"Results saved to {out_path}")
-        
-    
\ No newline at end of file
+    return tidy
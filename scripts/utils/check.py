@@ -1,9 +1,13 @@
 # scripts/utils/check.py
 
 import sys
-import json
 from pathlib import Path
 
+# Ensure project root is on sys.path so we can import our modules
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from scripts.extract.fact_index import FactIndex
+
 
 def check_value(cik: str, tag: str, date: str):
     """
@@ -17,58 +21,32 @@ def check_value(cik: str, tag: str, date: str):
         print(f"❌ Cannot find raw JSON at {path}")
         sys.exit(1)
 
-    data = json.loads(path.read_text())
-    facts = data.get("facts", {}).get("us-gaap", {})
+    index = FactIndex.from_file(path)
 
     # Special search across all tags
     if tag == '*':
         print(f"🔍 Searching all tags for date '{date}'...\n")
-        found = False
-        for t, fact in facts.items():
-            usd = fact.get("units", {}).get("USD")
-            if isinstance(usd, list):
-                for entry in usd:
-                    if entry.get('end') == date:
-                        val = entry.get('val')
-                        print(f"Tag: {t}  Value: {val}")
-                        found = True
-            elif isinstance(usd, dict):
-                if date in usd:
-                    print(f"Tag: {t}  Value: {usd[date]}")
-                    found = True
-        if not found:
+        facts = index.at_end(date)
+        for fact in facts:
+            print(f"Tag: {fact.tag}  Value: {fact.val}")
+        if not facts:
             print(f"❌ No tag contains date '{date}'")
         sys.exit(0)
 
     # Validate specific tag
-    if tag not in facts:
+    if tag not in index:
         print(f"❌ Tag '{tag}' not found under facts → us-gaap.")
         print("Available tags:")
-        for t in sorted(facts.keys()):
+        for t in sorted(index.tags()):
             print(f"  - {t}")
         sys.exit(1)
 
-    usd = facts[tag].get("units", {}).get("USD")
-    val = None
-
-    # If USD is a list of entries, find the matching 'end'
-    if isinstance(usd, list):
-        for entry in usd:
-            if entry.get('end') == date:
-                val = entry.get('val')
-                break
-    # If USD is a dict mapping dates to values
-    elif isinstance(usd, dict):
-        val = usd.get(date)
+    val = index.value_at(tag, date)
 
     if val is None:
         print(f"❌ No entry for date '{date}' under tag '{tag}'.")
         print("Check available dates for this tag:")
-        dates = []
-        if isinstance(usd, list):
-            dates = [e.get('end') for e in usd if 'end' in e]
-        elif isinstance(usd, dict):
-            dates = list(usd.keys())
+        dates = [f.end for f in index.facts(tag) if f.end is not None]
         for d in sorted(dates):
             print(f"  - {d}")
         sys.exit(1)
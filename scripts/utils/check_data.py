@@ -1,10 +1,14 @@
 import json, sys
 from pathlib import Path
 
+# Ensure project root is on sys.path so we can import our modules
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from scripts.extract.fact_index import FactIndex
+
 
 def inspect_net_sales(cik: str, year: int):
-   sec   = json.loads(Path(f"data/raw/{cik}.json").read_text())
-   facts = sec.get("facts", {}).get("us-gaap", {})
+   index = FactIndex.from_file(f"data/raw/{cik}.json")
    mapping = json.loads(Path("config/standard_to_usgaap_mapping.json").read_text())
    tags = mapping["income_statement"]["Net sales"]
 
@@ -16,16 +20,13 @@ def inspect_net_sales(cik: str, year: int):
 
 
    for tag in tags:
-       fact = facts.get(tag) or facts.get(tag.split(":",1)[-1])
-       if not fact:
-           continue
-       for e in fact.get("units", {}).get("USD", []):
-           if e.get("fy") != year or e.get("val") is None:
+       for e in index.facts(tag, fy=year):
+           if e.val is None:
                continue
-           form  = e.get("form","")
-           end   = e.get("end","")
-           filed = e.get("filed","")
-           val   = e["val"]
+           form  = e.form or ""
+           end   = e.end or ""
+           filed = e.filed or ""
+           val   = e.val
            m     = val / 1e6
            b     = val / 1e9
            print(f"{tag:<40} {end:<12} {form:<6} {filed:<10} {val:15,}  {m:10,.2f}  {b:10,.2f}")
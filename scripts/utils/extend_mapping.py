@@ -1,23 +1,175 @@
 # scripts/utils/extend_mapping.py
 
+"""
+Discover new US GAAP tag variants and append them to the mapping JSON.
+
+Two modes:
+  - one CIK: candidates are the unmapped tags of data/raw/{cik}.json
+  - corpus:  candidates are the deduplicated unmapped (tag, label) pairs of
+             every raw file, scored in one batched pass and written as a
+             single mapping update and report
+
+Usage:
+  python scripts/utils/extend_mapping.py <CIK> [--fuzzy 80] [--semantic 0.75] [--batch-size 256]
+  python scripts/utils/extend_mapping.py --corpus [--glob 'CIK*.json'] [--fuzzy 80] [--semantic 0.75] [--dry-run]
+"""
+
 import sys
 from pathlib import Path
 # Ensure project root is on sys.path so we can import our modules
 sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
 
+import argparse
 import json
-from rapidfuzz import fuzz
-import pandas as pd
 
-from scripts.extract.parse_sec_json import load_sec_json, extract_usd_facts
-from scripts.clean.preprocess_terms import clean_dataframe
-from scripts.model.sbert_embedder import SBERTEmbedder
-from config.settings import MAPPING_PATH
+from config.settings import MAPPING_PATH, QC_DIR, RAW_DIR, VECTOR_INDEX_DIR
+
+
+def _bare(tag) -> str:
+    return str(tag).split(":", 1)[-1]
+
+
+def _load_mapping(mapping_path):
+    mapping_file = Path(mapping_path or MAPPING_PATH)
+    if not mapping_file.exists():
+        raise FileNotFoundError(f"Mapping JSON not found: {mapping_file}")
+    return mapping_file, json.loads(mapping_file.read_text())
+
+
+def _score_candidates(candidates,
+                      mapping_data: dict,
+                      fuzzy_thresh: int,
+                      semantic_thresh: float,
+                      batch_size: int,
+                      index_dir):
+    """
+    Score candidate tags and append the accepted ones to mapping_data.
+
+    - candidates: frame of (tag, tag_clean, label_clean) rows, in the order
+                  additions should be made; tags already in the mapping and
+                  repeated tags are skipped (set lookups)
+    - the fuzzy pass scores every tag_clean against every standard term in
+      one rapidfuzz cdist matrix; rows below fuzzy_thresh with a label go to
+      one batched semantic pass (ANN index if one was built with the same
+      model, else SBERT against the standard terms)
+
+    returns: (additions, sbert, index, scored) where additions are report
+             rows (standard_term, raw_tag, method, fuzzy_score, semantic_score,
+             plus "_row", the position in `scored`, the candidates that were
+             actually scored)
+    """
+    # Heavy imports live here so the CLI starts instantly
+    import numpy as np
+    from rapidfuzz import fuzz, process
+
+    from scripts.model.sbert_embedder import SBERTEmbedder
+    from scripts.model.vector_index import VectorIndex, mapping_digest
+
+    # Build standard term → section map
+    std_to_section = {}
+    for section, terms in mapping_data.items():
+        for std in terms:
+            std_to_section[std] = section
+    std_terms = list(std_to_section.keys())
+
+    # Skip tags already in the mapping (or earlier in the candidates)
+    mapped = {_bare(t) for terms in mapping_data.values() for tags in terms.values() for t in tags}
+    keep = []
+    for pos, tag in enumerate(candidates["tag"].astype(str)):
+        if tag not in mapped:
+            mapped.add(tag)
+            keep.append(pos)
+    candidates = candidates.iloc[keep]
+
+    # Prepare SBERT for semantic matching (the model itself loads lazily,
+    # only if some label reaches the semantic fallback and misses the cache)
+    sbert = SBERTEmbedder(model_dir=None)
+    index = VectorIndex.load(index_dir) if index_dir else None
+    if index is not None and index.fingerprint != sbert.fingerprint:
+        print("[extend_mapping] Ignoring vector index built with another model; rebuild it")
+        index = None
+    elif index is not None and index.mapping_digest != mapping_digest(mapping_data):
+        print("[extend_mapping] Ignoring vector index built from other standard terms; rebuild it")
+        index = None
+
+    # Pass 1: fuzzy-tag matching, every tag against every term in one matrix;
+    # rows that miss the fuzzy threshold are queued for one semantic pass
+    tag_clean = candidates["tag_clean"].astype(str).tolist()
+    if tag_clean and std_terms:
+        scores = process.cdist(tag_clean, [std.lower() for std in std_terms],
+                               scorer=fuzz.ratio, dtype=np.float64, workers=-1)
+        best = scores.argmax(axis=1)
+        best_scores = scores[np.arange(len(tag_clean)), best]
+    else:
+        best = best_scores = np.zeros(len(tag_clean))
+
+    decisions = []
+    pending_labels = []
+    for i, (raw_tag, label_clean) in enumerate(zip(candidates["tag"].astype(str), candidates["label_clean"])):
+        if best_scores[i] >= fuzzy_thresh and best_scores[i] > 0:
+            decisions.append((i, raw_tag, "fuzzy_tag", std_terms[best[i]], float(best_scores[i])))
+        elif isinstance(label_clean, str) and label_clean:
+            decisions.append((i, raw_tag, "semantic", len(pending_labels), None))
+            pending_labels.append(label_clean)
+
+    # 2) Semantic fallback on label_clean, all pending labels in one batch:
+    #    nearest mapped neighbour in the ANN index, else brute force over terms
+    semantic = []
+    if index is not None and pending_labels:
+        label_embeds = sbert.encode(pending_labels, batch_size=batch_size)
+        semantic = [[hit] for hit in index.nearest_terms(label_embeds, k=5)]
+    elif pending_labels:
+        std_embeds = sbert.encode(std_terms)
+        semantic = sbert.semantic_match_batch(pending_labels, std_embeds, std_terms, top_k=1, batch_size=batch_size)
+
+    # Pass 2: apply additions in the candidates' order
+    additions = []
+    for i, raw_tag, method, target, score in decisions:
+        if method == "fuzzy_tag":
+            std_match, fuzzy_score, sem_score = target, score, None
+        else:
+            std_match, sem_score = semantic[target][0]
+            fuzzy_score = None
+            # a term the mapping no longer has is no match
+            if std_match not in std_to_section or sem_score < semantic_thresh:
+                continue
+        mapping_data[std_to_section[std_match]][std_match].append(raw_tag)
+        additions.append({
+            "standard_term":  std_match,
+            "raw_tag":        raw_tag,
+            "method":         method,
+            "fuzzy_score":    fuzzy_score,
+            "semantic_score": sem_score,
+            "_row":           i,
+        })
+
+    stats = sbert.cache_stats()
+    if stats:
+        print(f"Embedding cache: {stats['memory_hits'] + stats['disk_hits']} hits, "
+              f"{stats['misses']} misses ({stats['hit_rate']:.0%} hit rate, {stats['entries']} cached)")
+    return additions, sbert, index, candidates
+
+
+def _index_additions(index, sbert, additions) -> None:
+    """
+    Keep the vector index in step with the mapping.
+    """
+    from scripts.model.vector_index import humanize_tag
+
+    if index is None or not additions:
+        return
+    new_items = [{"text": humanize_tag(a["raw_tag"]), "standard_term": a["standard_term"],
+                  "kind": "tag", "tag": a["raw_tag"]} for a in additions]
+    index.add(sbert.encode([item["text"] for item in new_items]), new_items)
+    print(f"Inserted {len(new_items)} tags into the vector index ({len(index)} entries)")
+
 
 def auto_extend_mapping(cik: str,
                         mapping_path: str = None,
                         fuzzy_thresh: int = 80,
-                        semantic_thresh: float = 0.75) -> None:
+                        semantic_thresh: float = 0.75,
+                        batch_size: int = 256,
+                        index_dir: str = VECTOR_INDEX_DIR) -> None:
     """
     Automatically discover and append new US GAAP tag variants to your mapping JSON
     using fuzzy and semantic matching. Generates a report of additions with scores.
@@ -26,80 +178,31 @@ def auto_extend_mapping(cik: str,
     - mapping_path: Path to standard_to_usgaap_mapping.json (defaults to config)
     - fuzzy_thresh: threshold for fuzzy tag matching (0-100)
     - semantic_thresh: SBERT cosine threshold for semantic label matching (0-1)
+    - batch_size: labels per SBERT forward pass in the semantic fallback
+    - index_dir: ANN index of the mapping vocabulary; when one built with the
+                 same model exists, labels are matched against it instead of
+                 the standard terms alone, and added tags are inserted into it
     """
-    # Determine mapping file
-    mapping_file = Path(mapping_path or MAPPING_PATH)
-    if not mapping_file.exists():
-        raise FileNotFoundError(f"Mapping JSON not found: {mapping_file}")
-    mapping_data = json.loads(mapping_file.read_text())
+    import pandas as pd
+
+    from scripts.extract.parse_sec_json import extract_usd_facts_from_file
+    from scripts.clean.preprocess_terms import clean_dataframe
+
+    mapping_file, mapping_data = _load_mapping(mapping_path)
 
     # Load and clean company data
     raw_path = Path("data") / "raw" / f"{cik}.json"
     if not raw_path.exists():
         raise FileNotFoundError(f"Raw JSON not found: {raw_path}")
-    sec_data = load_sec_json(str(raw_path))
-    df_extracted = extract_usd_facts(sec_data)
+    df_extracted = extract_usd_facts_from_file(str(raw_path))
     df = clean_dataframe(df_extracted)
 
     # Unique tags and labels
     unique_tags = df[["tag", "tag_clean", "label_clean"]].drop_duplicates()
 
-    # Build standard term → section map
-    std_to_section = {}
-    for section, terms in mapping_data.items():
-        for std in terms:
-            std_to_section[std] = section
-    std_terms = list(std_to_section.keys())
-
-    # Prepare SBERT for semantic matching
-    sbert = SBERTEmbedder(model_dir=None)
-    std_embeds = sbert.encode_terms(std_terms)
-
-    additions = []
-
-    # Iterate through each unique raw tag
-    for _, row in unique_tags.iterrows():
-        raw_tag     = row["tag"]
-        tag_clean   = row["tag_clean"]
-        label_clean = row["label_clean"]
-
-        # Skip tags already in mapping
-        if any(raw_tag in tags for tags in mapping_data.values()):
-            continue
-
-        # 1) Fuzzy-tag matching
-        best_score = 0
-        best_std   = None
-        for std in std_terms:
-            score = fuzz.ratio(tag_clean, std.lower())
-            if score > best_score:
-                best_score, best_std = score, std
-
-        if best_score >= fuzzy_thresh:
-            sect = std_to_section[best_std]
-            mapping_data[sect][best_std].append(raw_tag)
-            additions.append({
-                "standard_term": best_std,
-                "raw_tag":       raw_tag,
-                "method":        "fuzzy_tag",
-                "fuzzy_score":   best_score,
-                "semantic_score": None
-            })
-            continue
-
-        # 2) Semantic fallback on label_clean
-        if label_clean:
-            std_match, sem_score = sbert.semantic_match(label_clean, std_embeds, std_terms)
-            if sem_score >= semantic_thresh:
-                sect = std_to_section[std_match]
-                mapping_data[sect][std_match].append(raw_tag)
-                additions.append({
-                    "standard_term":  std_match,
-                    "raw_tag":        raw_tag,
-                    "method":         "semantic",
-                    "fuzzy_score":    None,
-                    "semantic_score": sem_score
-                })
+    additions, sbert, index, _ = _score_candidates(
+        unique_tags, mapping_data, fuzzy_thresh, semantic_thresh, batch_size, index_dir)
+    _index_additions(index, sbert, additions)
 
     # Save the updated mapping JSON
     mapping_file.write_text(json.dumps(mapping_data, indent=4))
@@ -109,15 +212,114 @@ def auto_extend_mapping(cik: str,
     report_dir = Path("data") / "qc_reports"
     report_dir.mkdir(parents=True, exist_ok=True)
     report_path = report_dir / f"{cik}_mapping_extensions.csv"
-    pd.DataFrame(additions).to_csv(report_path, index=False)
+    pd.DataFrame(additions, columns=["standard_term", "raw_tag", "method", "fuzzy_score",
+                                     "semantic_score"]).to_csv(report_path, index=False)
     print(f"Extension report written to {report_path}")
 
+
+def corpus_candidates(paths):
+    """
+    Deduplicated (tag, label) pairs across raw companyfacts files, with the
+    number of CIKs reporting each pair, most widely reported first. Uses a
+    CIK's intermediate facts (tag and label columns only) when they exist,
+    else extracts the raw file.
+
+    returns: frame (tag, label, tag_clean, label_clean, ciks)
+    """
+    import pandas as pd
+
+    from scripts.clean.preprocess_terms import normalize_text
+    from scripts.extract.parse_sec_json import extract_usd_facts_from_file
+    from scripts.store.intermediate_store import read_intermediate
+
+    counts = {}
+    for path in paths:
+        try:
+            facts = read_intermediate(path.stem, columns=["tag", "label"])
+        except FileNotFoundError:
+            facts = extract_usd_facts_from_file(str(path))[["tag", "label"]]
+        pairs = facts.drop_duplicates()
+        labels = pairs["label"].astype(object).where(pairs["label"].notna(), "")
+        for pair in zip(pairs["tag"].astype(str), labels.astype(str)):
+            counts[pair] = counts.get(pair, 0) + 1
+
+    df = pd.DataFrame([(t, l, n) for (t, l), n in counts.items()], columns=["tag", "label", "ciks"])
+    df = df.sort_values(["ciks", "tag", "label"], ascending=[False, True, True], kind="stable")
+    df["tag_clean"] = [normalize_text(t) for t in df["tag"]]
+    df["label_clean"] = [normalize_text(l) for l in df["label"]]
+    return df.reset_index(drop=True)
+
+
+def extend_mapping_corpus(pattern: str = "*.json",
+                          mapping_path: str = None,
+                          fuzzy_thresh: int = 80,
+                          semantic_thresh: float = 0.75,
+                          batch_size: int = 256,
+                          index_dir: str = VECTOR_INDEX_DIR,
+                          dry_run: bool = False):
+    """
+    Extend the mapping from every raw file at once: collect the deduplicated
+    unmapped (tag, label) pairs across the corpus, score them in one batched
+    fuzzy + semantic pass (see _score_candidates) and write one mapping
+    update plus data/qc_reports/corpus_mapping_extensions.csv.
+
+    A tag reported under several labels is decided once, on its most widely
+    reported pair. The report adds each tag's label and CIK count.
+
+    - pattern: glob inside RAW_DIR selecting the corpus
+    - dry_run: write the report only, leaving the mapping and index untouched
+    Returns the report frame.
+    """
+    import pandas as pd
+
+    paths = [p for p in sorted(RAW_DIR.glob(pattern)) if p.suffix == ".json"]
+    if not paths:
+        raise FileNotFoundError(f"No raw JSON files match {RAW_DIR / pattern}")
+    mapping_file, mapping_data = _load_mapping(mapping_path)
+
+    candidates = corpus_candidates(paths)
+    print(f"{len(candidates):,} distinct (tag, label) pairs across {len(paths):,} CIKs")
+    additions, sbert, index, scored = _score_candidates(
+        candidates, mapping_data, fuzzy_thresh, semantic_thresh, batch_size, index_dir)
+    print(f"{len(scored):,} unmapped tags scored, {len(additions):,} accepted")
+
+    report = pd.DataFrame(additions, columns=["standard_term", "raw_tag", "method", "fuzzy_score",
+                                              "semantic_score", "_row"])
+    rows = scored.iloc[report["_row"].to_numpy()]
+    report = report.drop(columns="_row").assign(label=rows["label"].to_numpy(), ciks=rows["ciks"].to_numpy())
+
+    if not dry_run:
+        _index_additions(index, sbert, additions)
+        mapping_file.write_text(json.dumps(mapping_data, indent=4))
+        print(f"Mapping extended and saved to {mapping_file}")
+
+    report_path = Path(QC_DIR) / "corpus_mapping_extensions.csv"
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    report.to_csv(report_path, index=False)
+    print(f"Extension report written to {report_path}")
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Extend the mapping with new US GAAP tag variants.")
+    parser.add_argument("cik", nargs="?", help="Extend from data/raw/<CIK>.json")
+    parser.add_argument("--corpus", action="store_true", help="Extend from every raw file at once")
+    parser.add_argument("--glob", default="*.json", help="With --corpus: glob inside RAW_DIR (default: %(default)s)")
+    parser.add_argument("--fuzzy", type=int, default=80, help="Fuzzy tag threshold, 0-100 (default: %(default)s)")
+    parser.add_argument("--semantic", type=float, default=0.75, help="SBERT cosine threshold (default: %(default)s)")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--dry-run", action="store_true", help="With --corpus: write the report only")
+    args = parser.parse_args()
+
+    if args.corpus == (args.cik is not None):
+        parser.error("give either a CIK or --corpus")
+    if args.corpus:
+        extend_mapping_corpus(args.glob, None, fuzzy_thresh=args.fuzzy, semantic_thresh=args.semantic,
+                              batch_size=args.batch_size, dry_run=args.dry_run)
+    else:
+        auto_extend_mapping(args.cik, None, fuzzy_thresh=args.fuzzy, semantic_thresh=args.semantic,
+                            batch_size=args.batch_size)
+
+
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python scripts/utils/extend_mapping.py <CIK> [fuzzy_thresh] [semantic_thresh]")
-        sys.exit(1)
-
-    cik = sys.argv[1]
-    fuzzy = int(sys.argv[2]) if len(sys.argv) > 2 else 80
-    sem   = float(sys.argv[3]) if len(sys.argv) > 3 else 0.75
-    auto_extend_mapping(cik, None, fuzzy_thresh=fuzzy, semantic_thresh=sem)
+    main()
@@ -0,0 +1,201 @@
+# scripts/utils/stage_metrics.py
+
+"""
+Per-stage instrumentation for pipeline runs.
+
+A StageRecorder times each stage of one CIK's run and records rows in/out,
+the process's peak RSS so far, how much the stage raised that peak
+(rss_growth_mb, the only RSS figure attributable to the stage) and, with
+trace_memory=True, the tracemalloc delta and peak of Python allocations
+inside the stage. Each run becomes one JSON line:
+
+  {"cik": "...", "started_at": "...", "ok": true, "seconds": 1.92,
+   "peak_rss_mb": 412.3, "skipped": ["qc"],
+   "stages": [{"stage": "extract", "seconds": 0.41, "rows_in": null,
+               "rows_out": 20620, "peak_rss_mb": 301.2, "rss_growth_mb": 88.0,
+               "alloc_mb": 12.4, "alloc_peak_mb": 40.1}, ...]}
+
+Lines are appended with a single O_APPEND write, so batch workers can share
+one file (data/metrics/pipeline_metrics.jsonl by default).
+
+Usage:
+  python scripts/utils/stage_metrics.py summary [metrics.jsonl]
+"""
+
+import sys
+from pathlib import Path
+# Ensure project root is on sys.path so we can import our modules
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import argparse
+import json
+import os
+import resource
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from config.settings import METRICS_PATH
+
+
+def peak_rss_mb() -> float:
+    """
+    Peak resident set size of this process so far, in MB.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+class StageRecorder:
+    """
+    Collects stage records for one CIK's pipeline run.
+
+    - cik: company identifier, stored with the record
+    - trace_memory: also measure Python allocations per stage with
+                    tracemalloc (slows the run down noticeably)
+    """
+
+    def __init__(self, cik: str, trace_memory: bool = False):
+        self.cik = cik
+        self.trace_memory = trace_memory
+        self.stages = []
+        self.skipped = []
+        self.started_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self._start = time.perf_counter()
+        self._own_trace = trace_memory and not tracemalloc.is_tracing()
+        if self._own_trace:
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name: str, rows_in: int = None):
+        """
+        Time the enclosed block as stage `name`. Yields the stage record, so
+        the block can fill in rows_out (or any extra field). A stage that
+        raises is recorded with its error before the exception propagates.
+        """
+        rec = {"stage": name, "seconds": None, "rows_in": rows_in, "rows_out": None}
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            alloc_before = tracemalloc.get_traced_memory()[0]
+        rss_before = peak_rss_mb()
+        start = time.perf_counter()
+        try:
+            yield rec
+        except BaseException as e:
+            rec["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            rec["seconds"] = round(time.perf_counter() - start, 4)
+            rss_after = peak_rss_mb()
+            rec["peak_rss_mb"] = round(rss_after, 1)
+            rec["rss_growth_mb"] = round(rss_after - rss_before, 1)
+            if self.trace_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                rec["alloc_mb"] = round((current - alloc_before) / (1 << 20), 2)
+                rec["alloc_peak_mb"] = round((peak - alloc_before) / (1 << 20), 2)
+            self.stages.append(rec)
+
+    def skip(self, name: str) -> None:
+        """
+        Note a stage that was up to date and did not run.
+        """
+        self.skipped.append(name)
+
+    def record(self, error: str = None) -> dict:
+        """
+        The run's JSON-lines record (see module docstring).
+        """
+        return {
+            "cik": self.cik,
+            "started_at": self.started_at,
+            "ok": error is None,
+            "error": error,
+            "seconds": round(time.perf_counter() - self._start, 4),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            "skipped": self.skipped,
+            "stages": self.stages,
+        }
+
+    def close(self) -> None:
+        """
+        Stop tracemalloc if this recorder started it.
+        """
+        if self._own_trace:
+            tracemalloc.stop()
+            self._own_trace = False
+
+    def write(self, path=METRICS_PATH, error: str = None) -> dict:
+        """
+        Append the run's record to the JSON-lines file at `path` and close
+        the recorder. Returns the record.
+        """
+        rec = self.record(error)
+        self.close()
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        line = (json.dumps(rec, default=str) + "\n").encode()
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+        return rec
+
+
+def load_metrics(path=METRICS_PATH) -> list:
+    """
+    Read every run record from a JSON-lines metrics file.
+    """
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def summarize_metrics(path=METRICS_PATH, latest_only: bool = True):
+    """
+    Aggregate run records per stage across a batch: runs, total / mean /
+    p95 seconds, share of the total stage time, rows in/out, the largest
+    peak-RSS growth inside the stage and the largest process peak RSS. With latest_only, only each CIK's most recent record of each
+    stage counts (an up-to-date rerun does not hide the last real build).
+    Prints the table and returns it as a DataFrame.
+    """
+    import pandas as pd
+
+    runs = load_metrics(path)
+    stages = pd.DataFrame([{"cik": r["cik"], **s} for r in runs for s in r["stages"]])
+    if latest_only:
+        runs = list({r["cik"]: r for r in runs}.values())
+        if not stages.empty:
+            stages = stages.drop_duplicates(["cik", "stage"], keep="last")
+    if stages.empty:
+        print(f"No stage records in {path}")
+        return stages
+
+    g = stages.groupby("stage", sort=False)
+    table = pd.DataFrame({
+        "runs": g.size(),
+        "total_s": g["seconds"].sum(),
+        "mean_s": g["seconds"].mean(),
+        "p95_s": g["seconds"].quantile(0.95),
+        "rows_in": g["rows_in"].sum(min_count=1),
+        "rows_out": g["rows_out"].sum(min_count=1),
+        "rss_growth_mb": g["rss_growth_mb"].max() if "rss_growth_mb" in stages else float("nan"),
+        "peak_rss_mb": g["peak_rss_mb"].max(),
+    })
+    table["share"] = table["total_s"] / table["total_s"].sum()
+
+    failed = sum(1 for r in runs if not r["ok"])
+    print(f"📊 {len(runs)} runs ({failed} failed) from {path}\n")
+    print(table.to_string(float_format=lambda x: f"{x:,.3f}"))
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pipeline stage metrics.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    summary = sub.add_parser("summary", help="Per-stage aggregate over a metrics file")
+    summary.add_argument("path", nargs="?", default=str(METRICS_PATH))
+    summary.add_argument("--all-runs", action="store_true",
+                         help="Count every run, not just the latest per CIK")
+    args = parser.parse_args()
+    summarize_metrics(args.path, latest_only=not args.all_runs)
@@ -0,0 +1,82 @@
+# scripts/utils/startup_report.py
+
+"""
+Startup-time report for the project's CLIs.
+
+Runs a command under `python -X importtime`, then prints the wall-clock time
+and the slowest imports (cumulative and self time) grouped by top-level
+package, so a regression like a module-level `import torch` shows up at once.
+
+Usage:
+  python scripts/utils/startup_report.py [--top 15] <script.py> [script args...]
+
+Examples:
+  python scripts/utils/startup_report.py scripts/utils/check.py
+  python scripts/utils/startup_report.py scripts/pipeline.py --help
+"""
+
+import argparse
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def parse_importtime(stderr: str) -> list:
+    """
+    Parse `-X importtime` output into (module, self_us, cumulative_us, depth) rows.
+    """
+    rows = []
+    for line in stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            self_us, cum_us, indent, module = m.groups()
+            rows.append((module, int(self_us), int(cum_us), (len(indent) - 1) // 2))
+    return rows
+
+
+def startup_report(cmd: list, top: int = 15) -> dict:
+    """
+    Time `cmd` (a script path plus arguments) under -X importtime and print
+    the breakdown. Returns {wall_s, import_s, by_package, slowest}.
+    """
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", *cmd],
+                          capture_output=True, text=True)
+    wall = time.perf_counter() - start
+
+    rows = parse_importtime(proc.stderr)
+    import_us = sum(cum for _, _, cum, depth in rows if depth == 0)
+    by_package = defaultdict(int)
+    for module, self_us, _, _ in rows:
+        by_package[module.split(".")[0]] += self_us
+    slowest = sorted((r for r in rows if r[3] == 0), key=lambda r: -r[2])[:top]
+
+    print(f"⏱  {' '.join(cmd)}")
+    print(f"   wall {wall:.2f}s, imports {import_us / 1e6:.2f}s, exit code {proc.returncode}\n")
+    print(f"   {'package':<28} {'self ms':>9}")
+    for pkg, us in sorted(by_package.items(), key=lambda kv: -kv[1])[:top]:
+        print(f"   {pkg:<28} {us / 1000:>9.1f}")
+    print(f"\n   {'top-level import':<40} {'cumulative ms':>14}")
+    for module, _, cum, _ in slowest:
+        print(f"   {module:<40} {cum / 1000:>14.1f}")
+
+    return {
+        "wall_s": wall,
+        "import_s": import_us / 1e6,
+        "by_package": dict(by_package),
+        "slowest": [(m, cum) for m, _, cum, _ in slowest],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import-time breakdown of a CLI's startup.")
+    parser.add_argument("--top", type=int, default=15, help="Rows to show per table")
+    parser.add_argument("cmd", nargs=argparse.REMAINDER, help="Script and its arguments")
+    args = parser.parse_args()
+    if not args.cmd:
+        parser.error("Give the script to profile, e.g. scripts/utils/check.py")
+    startup_report(args.cmd, top=args.top)
@@ -0,0 +1,60 @@
+# tests/test_point_in_time.py
+
+import sys
+from pathlib import Path
+# Ensure project root is on sys.path so we can import our modules
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import pandas as pd
+
+from scripts.store.point_in_time import AsOfIndex
+
+
+def _facts(rows):
+    df = pd.DataFrame(rows, columns=["tag", "end", "form", "filed", "value"])
+    df["end"] = pd.to_datetime(df["end"])
+    df["filed"] = pd.to_datetime(df["filed"])
+    return df
+
+
+# Apple's FY2009 10-K (filed 2009-10-27) restated by the 10-K/A of 2010-01-25
+RESTATED = _facts([
+    ("us-gaap:Assets",        "2009-09-26", "10-K",   "2009-10-27", 53_851e6),
+    ("us-gaap:NetIncomeLoss", "2009-09-26", "10-K",   "2009-10-27", 5_704e6),
+    ("us-gaap:Assets",        "2009-09-26", "10-K/A", "2010-01-25", 47_501e6),
+    ("us-gaap:NetIncomeLoss", "2009-09-26", "10-K/A", "2010-01-25", 8_235e6),
+    ("us-gaap:NetIncomeLoss", "2009-12-26", "10-Q",   "2010-01-25", 3_378e6),
+])
+
+
+def _index():
+    return AsOfIndex(RESTATED, cik="CIK0000320193", instant_tags=["Assets"])
+
+
+def test_amendment_supersedes_the_form_it_amends():
+    df = _index().as_of(["2009-12-01", "2010-06-01"], tags="NetIncomeLoss",
+                        ends="2009-09-26", form="10-K")
+    assert df["value"].tolist() == [5_704e6, 8_235e6]
+    assert df["form"].tolist() == ["10-K", "10-K/A"]
+    assert (df["basis"] == "10-K").all()
+
+
+def test_restated_instant_has_one_key():
+    index = _index()
+    df = index.as_of("2010-06-01", tags="Assets", ends="2009-09-26")
+    assert len(df) == 1
+    assert df.loc[0, "value"] == 47_501e6
+    assert df.loc[0, "basis"] == "instant"
+    # a form filter does not hide instants
+    assert index.as_of("2010-06-01", tags="Assets", form="10-K")["value"].tolist() == [47_501e6]
+
+
+def test_versions_flag_the_restatement():
+    v = _index().versions(tags="Assets")
+    assert v["revised"].tolist() == [False, True]
+    assert v.loc[0, "valid_to"] == pd.Timestamp("2010-01-25")
+    assert pd.isna(v.loc[1, "valid_to"])
+
+
+def test_nothing_visible_before_the_first_filing():
+    assert _index().as_of("2009-01-01").empty